@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Benchmark the chapter 3 balance_check plugin against beancount.ops.balance.
+
+Builds years of daily spending across a few dozen bank accounts, with a
+balance assertion per account and per bank (the parent of its accounts) at
+every monthly statement, as beancount-import's balance_account_output_map
+accumulates them. Some of the assertions are wrong, so both the passing and
+the failing paths are exercised. Both checks must return equal entries and
+error messages.
+
+A last month is then added as a new statement would add it: once by
+re-checking the whole ledger and once through BalanceIndex.add().
+
+Usage (from repo root):
+    python benchmarks/bench_balance_check.py [--years 10] [--banks 20] [--repeat 3]
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'chapter-3'))
+
+from beancount.core import data  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+from beancount.ops import balance  # noqa: E402
+from beancount.parser import options  # noqa: E402
+
+from chapter3_plugins import balance_check  # noqa: E402
+
+
+def ledger(years: int, banks: int, seed: int = 42) -> data.Entries:
+    """Opens, daily transactions and monthly assertions, sorted as the loader sorts them."""
+    rng = random.Random(seed)
+    start = datetime.date(2015, 1, 1)
+    accounts = [f'Assets:UK:Bank{i:02d}:{kind}' for i in range(banks) for kind in ('Current', 'Savings')]
+    meta = data.new_metadata('<bench>', 0)
+    parents = [f'Assets:UK:Bank{i:02d}' for i in range(banks)]
+    entries = [data.Open(meta, start, account, ['GBP'], None)
+               for account in parents + accounts + ['Expenses:Spending']]
+
+    balances = dict.fromkeys(accounts, Decimal('0.00'))
+    day = start
+    end = datetime.date(start.year + years, 1, 1)
+    while day < end:
+        for _ in range(len(accounts)):
+            account = rng.choice(accounts)
+            number = Decimal(rng.randrange(-20000, 20000)) / 100
+            balances[account] += number
+            entries.append(data.Transaction(data.new_metadata('<bench>', len(entries)), day, '*', None, 'Bench',
+                                            data.EMPTY_SET, data.EMPTY_SET, [
+                data.Posting(account, Amount(number, 'GBP'), None, None, None, None),
+                data.Posting('Expenses:Spending', Amount(-number, 'GBP'), None, None, None, None),
+            ]))
+        day += datetime.timedelta(days=1)
+        if day.day == 1:
+            for bank in range(banks):
+                parent = f'Assets:UK:Bank{bank:02d}'
+                for account in (f'{parent}:Current', f'{parent}:Savings', parent):
+                    number = sum(value for name, value in balances.items() if name.startswith(account))
+                    if rng.random() < 0.01:
+                        number += Decimal('1.00')
+                    entries.append(data.Balance(data.new_metadata('<bench>', len(entries)), day, account,
+                                                Amount(number, 'GBP'), None, None))
+    entries.sort(key=data.entry_sortkey)
+    return entries
+
+
+def timed(label: str, func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    print(f'{label:<34} {min(timings) * 1000:>9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--banks', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    options_map = options.OPTIONS_DEFAULTS.copy()
+    entries = ledger(args.years, args.banks)
+    assertions = sum(1 for entry in entries if isinstance(entry, data.Balance))
+    print(f'{len(entries)} entries, {assertions} balance assertions')
+
+    expected, expected_errors = timed('beancount.ops.balance', lambda: balance.check(entries, options_map),
+                                      args.repeat)
+    checked, errors = timed('chapter3_plugins.balance_check', lambda: balance_check.check(entries, options_map),
+                            args.repeat)
+    assert checked == expected, 'balance_check flags different entries'
+    assert [error.message for error in errors] == [error.message for error in expected_errors], \
+        'balance_check reports different errors'
+    print(f'{len(errors)} failing assertions, identical errors')
+
+    # The last month arrives as a new statement
+    cutoff = entries[-1].date.replace(day=1) - datetime.timedelta(days=1)
+    cutoff = cutoff.replace(day=1)
+    old = [entry for entry in entries if entry.date < cutoff]
+    new = [entry for entry in entries if entry.date >= cutoff]
+    index = balance_check.BalanceIndex.from_entries(old, options_map)
+    timed('Re-check the whole ledger', lambda: balance_check.check(entries, options_map), args.repeat)
+    failed, _ = timed('BalanceIndex.add() of the last month', lambda: index.add(new), 1)
+    late_errors = [error.message for error in errors if error.entry.date >= cutoff]
+    assert [error.message for error in failed] == late_errors, 'incremental check disagrees'
+    print(f'{len(new)} new entries, {len(failed)} newly failing assertions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Benchmark scripts/columnar.py's PostingColumns against summing Posting namedtuples.
+
+Builds a ledger of two-posting transactions spread over a few dozen accounts
+in GBP, USD and EUR, with daily prices to GBP, and compares:
+
+  - memory held by the transactions vs by their columns
+  - SUM(position) grouped by account and month
+  - SUM(CONVERT(position, 'GBP', date)) grouped by account, each posting
+    valued at its own date
+
+Both sides must return equal sums.
+
+Usage (from repo root):
+    python benchmarks/bench_columnar.py [--transactions 500000] [--repeat 3]
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'scripts'))
+
+from beancount.core import convert, data, prices  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+from beancount.core.number import ZERO  # noqa: E402
+
+from columnar import PostingColumns, decimal_sums  # noqa: E402
+
+CURRENCIES = ('GBP', 'USD', 'EUR')
+
+
+def ledger(transactions: int, seed: int = 42) -> data.Entries:
+    """Daily prices and transactions over ten years, sorted as the loader sorts them."""
+    rng = random.Random(seed)
+    start = datetime.date(2015, 1, 1)
+    days = 3650
+    accounts = [f'Assets:Bank{i:02d}:{currency}' for i in range(20) for currency in CURRENCIES]
+    expenses = [f'Expenses:Category{i:02d}' for i in range(20)]
+    entries = []
+    for day in range(days):
+        date = start + datetime.timedelta(days=day)
+        for currency, rate in (('USD', '0.78'), ('EUR', '0.86')):
+            number = Decimal(rate) + Decimal(rng.randrange(-500, 500)) / 10000
+            entries.append(data.Price(data.new_metadata('<bench>', len(entries)), date, currency,
+                                      Amount(number, 'GBP')))
+    for i in range(transactions):
+        date = start + datetime.timedelta(days=i * days // transactions)
+        account = rng.choice(accounts)
+        currency = account.rsplit(':', 1)[1]
+        number = Decimal(rng.randrange(-100000, 100000)) / 100
+        entries.append(data.Transaction(data.new_metadata('<bench>', len(entries)), date, '*', None, 'Bench',
+                                        data.EMPTY_SET, data.EMPTY_SET, [
+            data.Posting(account, Amount(number, currency), None, None, None, None),
+            data.Posting(rng.choice(expenses), Amount(-number, currency), None, None, None, None),
+        ]))
+    entries.sort(key=data.entry_sortkey)
+    return entries
+
+
+def converted_decimal_sums(entries: data.Entries, currency: str, price_map) -> dict:
+    """Each posting converted at its date with beancount, then summed by account."""
+    sums = {}
+    for entry in entries:
+        if isinstance(entry, data.Transaction):
+            for posting in entry.postings:
+                units = convert.convert_amount(posting.units, currency, price_map, entry.date)
+                key = (posting.account, units.currency)
+                sums[key] = sums.get(key, ZERO) + units.number
+    return {key: number for key, number in sums.items() if number}
+
+
+def timed(label: str, func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    print(f'{label:<44} {min(timings) * 1000:>9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    entries = ledger(args.transactions)
+    ledger_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    columns = timed('PostingColumns.from_entries', lambda: PostingColumns.from_entries(entries), 1)
+    print(f'{len(columns)} postings: {ledger_bytes / 2**20:.0f} MB as entries, '
+          f'{columns.nbytes() / 2**20:.0f} MB as columns')
+
+    by = ('account', 'month')
+    expected = timed('Decimal sums by account, month', lambda: decimal_sums(entries, by), args.repeat)
+    sums = timed('PostingColumns.sums', lambda: columns.sums(by), args.repeat)
+    assert sums == expected, 'columnar sums differ'
+
+    price_map = prices.build_price_map(entries)
+    expected = timed('convert_amount per posting, by account',
+                     lambda: converted_decimal_sums(entries, 'GBP', price_map), 1)
+    converted = timed('PostingColumns.converted_sums',
+                      lambda: columns.converted_sums('GBP', price_map), args.repeat)
+    assert converted.keys() == expected.keys(), 'converted groups differ'
+    drift = max(abs(converted[key] - expected[key]) for key in expected)
+    print(f'{len(sums)} account-month groups equal; largest converted difference {drift}')
+
+    numbers = [posting.units.number for entry in entries if isinstance(entry, data.Transaction)
+               for posting in entry.postings]
+    assert columns.numbers() == numbers, 'round trip differs'
+    print('Every posting round-trips to its Decimal')
+
+
+if __name__ == '__main__':
+    main()
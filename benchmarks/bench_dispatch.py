@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Microbenchmark routing statement files to importers.
+
+Builds a synthetic data tree with one folder per bank, then compares asking
+every importer to identify() every file against routing through
+importers.dispatch.ImporterIndex.
+
+Usage (from repo root):
+    python benchmarks/bench_dispatch.py [--importers 50] [--files-per-importer 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'chapter-3'))
+
+from importers.dispatch import ImporterIndex  # noqa: E402
+
+
+class SyntheticImporter:
+    """Mimics HsbcCurrentImporter's hints and identify() for one bank folder."""
+
+    SUFFIX = '.csv'
+
+    def __init__(self, directory: str):
+        self.DIRECTORY = directory
+        self.calls = 0
+
+    def identify(self, filepath) -> bool:
+        self.calls += 1
+        path = Path(filepath)
+        return path.suffix == self.SUFFIX and self.DIRECTORY in str(path)
+
+
+def build_tree(root: Path, importers: int, files_per_importer: int) -> list[SyntheticImporter]:
+    """Create bank-NNNN-data/statement-*.csv files (plus some PDFs) and their importers."""
+    result = []
+    for i in range(importers):
+        directory = f'bank-{i:04d}-data'
+        header = f'Date,Description,Amount,Ref{i}'
+        folder = root / directory
+        folder.mkdir()
+        for j in range(files_per_importer):
+            suffix = '.pdf' if j % 10 == 0 else '.csv'
+            (folder / f'statement-{j}{suffix}').write_text(header + '\n2024-01-01,X,1.00\n')
+        result.append(SyntheticImporter(directory))
+    return result
+
+
+def walk(root: Path) -> list[str]:
+    return sorted(os.path.join(dirpath, name) for dirpath, _, files in os.walk(root) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--importers', type=int, default=50)
+    parser.add_argument('--files-per-importer', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        importers = build_tree(Path(tmp), args.importers, args.files_per_importer)
+        paths = walk(Path(tmp))
+
+        start = time.perf_counter()
+        exhaustive = [(path, i) for path in paths for i, imp in enumerate(importers) if imp.identify(path)]
+        exhaustive_time = time.perf_counter() - start
+        exhaustive_calls = sum(imp.calls for imp in importers)
+
+        for imp in importers:
+            imp.calls = 0
+        start = time.perf_counter()
+        routed = ImporterIndex(importers).route(paths)
+        routed_time = time.perf_counter() - start
+        routed_calls = sum(imp.calls for imp in importers)
+
+    assert sorted(exhaustive) == sorted(routed), 'routing disagrees with exhaustive identify()'
+    print(f'{len(paths)} files, {len(importers)} importers')
+    print(f"{'exhaustive':<12} {exhaustive_time * 1000:>9.1f} ms {exhaustive_calls:>10} identify() calls")
+    print(f"{'indexed':<12} {routed_time * 1000:>9.1f} ms {routed_calls:>10} identify() calls")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Benchmark finding already-recorded rows in overlapping statements.
+
+Builds ten years of HSBC current account history: a ledger holding every
+transaction up to a cutoff a fortnight before the end, and monthly CSV
+statements that each start ten days before the month (downloads overlap).
+Every statement is deduplicated in turn as beangulp's import loop does it:
+against the ledger extended with the statements before it. That runs once
+with beangulp's default Importer.deduplicate() and once with the importer's
+own, which uses importers.duplicates.DuplicateIndex.
+
+Rows dated before the cutoff are the ones already recorded; the benchmark
+reports how many of those each method finds and how many later rows it
+flags, which are the overlaps with earlier statements.
+
+Usage (from repo root):
+    python benchmarks/bench_duplicates.py [--years 10] [--per-day 6]
+"""
+
+import argparse
+import csv
+import datetime
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'chapter-3'))
+
+from beancount.core import data  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+from beangulp import Importer  # noqa: E402
+from beangulp.extract import DUPLICATE  # noqa: E402
+
+from importers.duplicates import DuplicateIndex  # noqa: E402
+from importers.hsbc import HsbcCurrentImporter  # noqa: E402
+
+ACCOUNT = 'Assets:Lalit:UK:HSBC:Current:GBP'
+
+
+def history(years: int, per_day: int, seed: int = 42) -> list[tuple[datetime.date, str, Decimal]]:
+    """(date, description, amount) rows of `years` years of current account activity."""
+    rng = random.Random(seed)
+    merchants = [f'MERCHANT {i:03d} LONDON' for i in range(300)]
+    start = datetime.date(2015, 1, 1)
+    rows = []
+    for day in range(years * 365):
+        date = start + datetime.timedelta(days=day)
+        for _ in range(rng.randint(0, per_day * 2)):
+            rows.append((date, rng.choice(merchants), -Decimal(rng.randrange(100, 20000)) / 100))
+    return rows
+
+
+def ledger(rows, cutoff: datetime.date) -> data.Entries:
+    """The recorded transactions: each row before cutoff, categorised, as beancount-import writes it."""
+    entries = []
+    for index, (date, description, amount) in enumerate(rows):
+        if date >= cutoff:
+            break
+        meta = data.new_metadata('ledger.beancount', index)
+        entries.append(data.Transaction(meta, date, '*', description.title(), '', data.EMPTY_SET, data.EMPTY_SET, [
+            data.Posting(ACCOUNT, Amount(amount, 'GBP'), None, None, None, {'source_desc': description}),
+            data.Posting('Expenses:Shopping', Amount(-amount, 'GBP'), None, None, None, None),
+        ]))
+    return entries
+
+
+def write_statements(rows, directory: Path) -> list[str]:
+    """Monthly statement CSVs, each also covering the last ten days of the previous month."""
+    months = sorted({(date.year, date.month) for date, _, _ in rows})
+    paths = []
+    for year, month in months:
+        first = datetime.date(year, month, 1)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+        begin = first - datetime.timedelta(days=10)
+        path = directory / f'statement-{year}-{month:02d}.csv'
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Date', 'Description', 'Amount'])
+            for date, description, amount in rows:
+                if begin <= date < end:
+                    writer.writerow([date.isoformat(), description, str(amount)])
+        paths.append(str(path))
+    return paths
+
+
+def import_session(deduplicate, statements: list[data.Entries], existing: data.Entries) -> list:
+    """Deduplicate statements like beangulp's import loop; return the rows flagged as duplicates."""
+    existing = list(existing)
+    for entries in statements:
+        deduplicate(entries, existing)
+        existing.extend(entries)
+    return [entry for entries in statements for entry in entries if entry.meta.pop(DUPLICATE, None)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--per-day', type=int, default=6, help='Average transactions per day')
+    args = parser.parse_args()
+
+    rows = history(args.years, args.per_day)
+    cutoff = rows[-1][0] - datetime.timedelta(days=14)
+    existing = ledger(rows, cutoff)
+    importer = HsbcCurrentImporter(ACCOUNT)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_statements(rows, Path(tmp))
+        statements = [importer.extract(path) for path in paths]
+        extracted = sum(len(entries) for entries in statements)
+        recorded = sum(1 for entries in statements for entry in entries if entry.date < cutoff)
+        print(f'{len(existing)} ledger transactions, {len(paths)} statements, {extracted} rows '
+              f'({recorded} already recorded)')
+
+        timings = {}
+        for name, deduplicate in [('beangulp deduplicate()', lambda entries, existing:
+                                   Importer.deduplicate(importer, entries, existing)),
+                                  ('DuplicateIndex', importer.deduplicate)]:
+            start = time.perf_counter()
+            flagged = import_session(deduplicate, statements, existing)
+            timings[name] = time.perf_counter() - start
+            found = sum(1 for entry in flagged if entry.date < cutoff)
+            print(f'{name:<26} {timings[name] * 1000:>9.1f} ms  '
+                  f'{found} recorded rows found, {len(flagged) - found} later rows flagged')
+        print(f'{timings["beangulp deduplicate()"] / timings["DuplicateIndex"]:.0f}x faster')
+
+
+if __name__ == '__main__':
+    main()
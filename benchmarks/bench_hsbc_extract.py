@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Benchmark HsbcCurrentImporter extraction on a large synthetic statement.
+
+Each mode runs in its own subprocess so that peak RSS is measured in isolation:
+
+    legacy  the original DictReader + strptime loop, collected into a list
+    list    HsbcCurrentImporter.extract (list-returning wrapper)
+    stream  HsbcCurrentImporter.iter_extract, consumed one row at a time
+
+Usage (from repo root):
+    python benchmarks/bench_hsbc_extract.py [--rows 500000]
+"""
+
+import argparse
+import csv
+import datetime
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ACCOUNT = 'Assets:Lalit:UK:HSBC:Current:GBP'
+MODES = ['legacy', 'list', 'stream']
+
+
+def write_statement(path: Path, rows: int, seed: int = 42):
+    """Write a statement CSV in the HSBC export format."""
+    rng = random.Random(seed)
+    payees = ['TESCO STORES 3217', 'TFL TRAVEL', 'NANDOS LONDON', 'PRET A MANGER', 'SAINSBURYS']
+    start = datetime.date(2014, 1, 1)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Description', 'Amount'])
+        for i in range(rows):
+            date = start + datetime.timedelta(days=i * 3650 // rows)
+            writer.writerow([date.isoformat(), rng.choice(payees), f'{-rng.uniform(1, 200):.2f}'])
+
+
+def legacy_extract(path: str) -> list:
+    """The pre-streaming implementation, kept here as the baseline."""
+    from beancount.core import data
+    from beancount.core.amount import Amount
+    from beancount.core.number import D
+
+    entries = []
+    with open(path, 'r') as f:
+        for row in csv.DictReader(f):
+            entries.append(data.Transaction(
+                meta=data.new_metadata(str(path), 0),
+                date=datetime.datetime.strptime(row['Date'], '%Y-%m-%d').date(),
+                flag='*',
+                payee=row['Description'],
+                narration='',
+                tags=set(),
+                links=set(),
+                postings=[data.Posting(ACCOUNT, Amount(D(row['Amount']), 'GBP'), None, None, None, None)],
+            ))
+    return entries
+
+
+def run_mode(mode: str, path: str):
+    """Run one extraction mode and print 'rows seconds peak_rss_kb'."""
+    sys.path.insert(0, str(REPO_ROOT / 'chapter-3'))
+    from importers.hsbc import HsbcCurrentImporter
+
+    importer = HsbcCurrentImporter(ACCOUNT)
+    start = time.perf_counter()
+    if mode == 'legacy':
+        rows = len(legacy_extract(path))
+    elif mode == 'list':
+        rows = len(importer.extract(path))
+    else:
+        rows = sum(1 for _ in importer.iter_extract(path))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(rows, elapsed, peak_kb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000, help='Rows in the synthetic statement')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.csv)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'statement.csv'
+        write_statement(path, args.rows)
+
+        print(f"{'mode':<8} {'rows':>10} {'rows/sec':>12} {'peak RSS':>12}")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--csv', str(path)],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            rows, elapsed, peak_kb = int(out[0]), float(out[1]), int(out[2])
+            print(f"{mode:<8} {rows:>10} {rows / elapsed:>12,.0f} {peak_kb / 1024:>9.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
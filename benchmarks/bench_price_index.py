@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark PriceIndex against beancount's stock price map lookups.
+
+Generates 10 years of daily prices for a handful of securities plus GBP/USD,
+then times building the price map and a batch of random get_price() and
+convert_position() calls with both implementations, checking they agree.
+
+Usage (from repo root):
+    python benchmarks/bench_price_index.py [--years 10] [--lookups 200000]
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'chapter-5' / 'scripts'))
+
+from beancount.core import convert, data, position, prices  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+
+import price_index  # noqa: E402
+
+SECURITIES = {'AAPL': 'USD', 'GOOG': 'USD', 'MSFT': 'USD', 'VWRL': 'GBP', 'VUSA': 'GBP'}
+
+
+def price_entries(years: int, seed: int = 42) -> data.Entries:
+    """Daily Price directives for SECURITIES and the GBP/USD rate."""
+    rng = random.Random(seed)
+    start = datetime.date(2024 - years, 1, 1)
+    levels = {symbol: 100.0 for symbol in SECURITIES}
+    fx = 1.3
+    entries = []
+    meta = data.new_metadata('<bench>', 0)
+    for day in range(years * 365):
+        date = start + datetime.timedelta(days=day)
+        for symbol, quote in SECURITIES.items():
+            levels[symbol] *= 1 + rng.gauss(0, 0.01)
+            entries.append(data.Price(meta, date, symbol, Amount(Decimal(f'{levels[symbol]:.2f}'), quote)))
+        fx *= 1 + rng.gauss(0, 0.003)
+        entries.append(data.Price(meta, date, 'GBP', Amount(Decimal(f'{fx:.4f}'), 'USD')))
+    return entries
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'{label:<34} {(time.perf_counter() - start) * 1000:>9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+
+    entries = price_entries(args.years)
+    print(f'{len(entries)} price directives over {args.years} years')
+
+    rng = random.Random(0)
+    first, last = entries[0].date, entries[-1].date
+    span = (last - first).days
+    queries = [
+        (rng.choice(list(SECURITIES)), first + datetime.timedelta(days=rng.randrange(span)))
+        for _ in range(args.lookups)
+    ]
+    positions = [
+        (position.Position(Amount(Decimal(10), symbol), None), date) for symbol, date in queries
+    ]
+
+    stock_map = timed('stock build_price_map', lambda: prices.build_price_map(entries))
+    index = timed('PriceIndex.from_entries', lambda: price_index.PriceIndex.from_entries(entries))
+
+    stock = timed('stock get_price', lambda: [
+        prices.get_price(stock_map, (symbol, SECURITIES[symbol]), date) for symbol, date in queries
+    ])
+    indexed = timed('PriceIndex get_price', lambda: [
+        price_index.get_price(index, (symbol, SECURITIES[symbol]), date) for symbol, date in queries
+    ])
+    assert stock == indexed, 'PriceIndex disagrees with stock get_price'
+
+    stock = timed('stock convert_position -> GBP', lambda: [
+        convert.convert_position(pos, 'GBP', stock_map, date) for pos, date in positions
+    ])
+    with price_index.installed():
+        indexed = timed('PriceIndex convert_position -> GBP', lambda: [
+            convert.convert_position(pos, 'GBP', index, date) for pos, date in positions
+        ])
+    assert stock == indexed, 'PriceIndex disagrees with stock convert_position'
+
+    triangulated = price_index.PriceIndex.from_entries(entries, via=('USD', 'GBP'))
+    timed('triangulated AAPL -> GBP', lambda: [
+        triangulated.lookup('AAPL', 'GBP', date) for _, date in queries
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark the in-repo rename_accounts plugin against beancount_reds_plugins'.
+
+Builds a ledger of about 1M postings in memory: monthly payslips with the
+chapter 5 breakdown (the accounts journal-net.beancount renames) among
+everyday spending across a few hundred accounts. Both plugins run over it
+with the chapter 5 configuration; their outputs must be equal.
+
+Usage (from repo root):
+    python benchmarks/bench_rename_accounts.py [--postings 1000000] [--repeat 3]
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'chapter-5'))
+
+from beancount.core import data  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+from beancount.parser import parser  # noqa: E402
+from beancount_reds_plugins.rename_accounts import rename_accounts as reds  # noqa: E402
+
+from chapter5_plugins import rename_accounts  # noqa: E402
+
+PAYSLIP = [
+    ('Income:Lalit:UK:Google:Salary', Decimal('-5000.00')),
+    ('Expenses:Lalit:UK:Google:Income-Tax', Decimal('1000.00')),
+    ('Expenses:Lalit:UK:Google:National-Insurance', Decimal('400.00')),
+    ('Expenses:Lalit:UK:Google:Pension', Decimal('100.00')),
+    ('Assets:Lalit:UK:HSBC:Current:GBP', Decimal('3500.00')),
+]
+
+
+def net_config() -> str:
+    """The rename_accounts configuration of chapter-5/journal-net.beancount."""
+    _, _, options = parser.parse_file(str(REPO_ROOT / 'chapter-5' / 'journal-net.beancount'))
+    return next(config for name, config in options['plugin'] if name.endswith('rename_accounts'))
+
+
+def ledger(postings: int, seed: int = 42) -> data.Entries:
+    """Transactions totalling about `postings` postings, one payslip every 500."""
+    rng = random.Random(seed)
+    expenses = [f'Expenses:Category{i // 20}:Item{i}' for i in range(300)]
+    start = datetime.date(2000, 1, 1)
+    entries = []
+    count = 0
+    while count < postings:
+        date = start + datetime.timedelta(days=len(entries) // 100)
+        meta = data.new_metadata('<bench>', len(entries))
+        if len(entries) % 500 == 0:
+            legs = PAYSLIP
+        else:
+            number = Decimal(rng.randrange(100, 20000)) / 100
+            legs = [(rng.choice(expenses), number), ('Assets:Lalit:UK:HSBC:Current:GBP', -number)]
+        entries.append(data.Transaction(meta, date, '*', None, 'Bench', data.EMPTY_SET, data.EMPTY_SET, [
+            data.Posting(account, Amount(number, 'GBP'), None, None, None, None) for account, number in legs
+        ]))
+        count += len(legs)
+    return entries
+
+
+def timed(label: str, func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    print(f'{label:<34} {min(timings) * 1000:>9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--postings', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    config = net_config()
+    entries = ledger(args.postings)
+    print(f'{len(entries)} transactions, {sum(len(e.postings) for e in entries)} postings')
+
+    expected, _ = timed('beancount_reds_plugins', lambda: reds.rename_accounts(entries, {}, config), args.repeat)
+    renamed, _ = timed('chapter5_plugins.rename_accounts',
+                       lambda: rename_accounts.rename_accounts(entries, {}, config), args.repeat)
+    assert renamed == expected, 'chapter5_plugins.rename_accounts disagrees with beancount_reds_plugins'
+
+    shared = sum(1 for old, new in zip(entries, renamed) if old is new)
+    print(f'{shared} of {len(entries)} transactions passed through unchanged')
+
+
+if __name__ == '__main__':
+    main()
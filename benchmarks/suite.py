@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the load, import, query and report paths.
+
+Times the following on every chapter's journals plus scaled synthetic ledgers
+generated with demo/generate.py (small, medium, large):
+
+    load        loader.load_file on each journal, and reading it back from its
+                snapshot (see scripts/snapshot.py)
+    extract     HsbcCurrentImporter.extract over a large statement CSV
+    archive     each chapter-5 archive.py report query, and the full batch
+    dashboards  each BQL query in dashboards.yaml (see scripts/profile_dashboards.py),
+                and all of them through the shared-scan batch evaluator, without
+                and with the monthly rollup store
+
+Synthetic ledgers and statements are generated once into .cache/bench/.
+A journal that loads with errors fails its benchmarks rather than timing a
+partial ledger, and any failure makes the suite exit non-zero. Results are
+written as JSON. --compare checks them against an earlier
+results file and exits non-zero if any benchmark got slower by more than
+--threshold, so a beancount, plugin or config change can be checked before
+it lands.
+
+Usage (from repo root):
+    python benchmarks/suite.py [--sizes small,medium] [--groups load,archive]
+        [--filter TEXT] [--repeat 3] [--output FILE] [--compare BASELINE]
+"""
+
+import argparse
+import datetime
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = REPO_ROOT / '.cache' / 'bench'
+SNAPSHOT_DIR = BENCH_DIR / 'snapshots'
+sys.path.insert(0, str(REPO_ROOT / 'chapter-3'))
+sys.path.insert(0, str(REPO_ROOT / 'chapter-5' / 'scripts'))
+sys.path.insert(0, str(REPO_ROOT / 'scripts'))
+sys.path.insert(0, str(REPO_ROOT / 'demo'))
+
+from beancount import loader  # noqa: E402
+from beancount.core import data  # noqa: E402
+from beanquery.query_render import render_text  # noqa: E402
+
+import archive  # noqa: E402
+import generate  # noqa: E402
+from bench_hsbc_extract import ACCOUNT, write_statement  # noqa: E402
+from importers.hsbc import HsbcCurrentImporter  # noqa: E402
+from batch_queries import BatchEvaluator  # noqa: E402
+from profile_dashboards import ledger_context, load_panels  # noqa: E402
+from rollups import RollupStore  # noqa: E402
+import snapshot  # noqa: E402
+from validate_all import find_journal_files  # noqa: E402
+
+GROUPS = ['load', 'extract', 'archive', 'dashboards']
+
+# Synthetic ledger shapes (see demo/README.md) and statement CSV sizes
+SIZES = {
+    'small': {'years': None, 'persons': 1, 'accounts': 0, 'rate': 0.0, 'rows': 10_000},
+    'medium': {'years': 5, 'persons': 2, 'accounts': 20, 'rate': 10.0, 'rows': 100_000},
+    'large': {'years': 10, 'persons': 4, 'accounts': 50, 'rate': 60.0, 'rows': 1_000_000},
+}
+
+# Which dashboards run against which chapter journals; demo/dashboards.yaml
+# runs against the synthetic ledgers, which share the demo's accounts.
+DASHBOARDS = {
+    'chapter-5/dashboards.yaml': ['chapter-5/journal-net.beancount'],
+    'chapter-6/dashboards.yaml': ['chapter-6/total/journal-net.beancount'],
+}
+SYNTHETIC_DASHBOARDS = 'demo/dashboards.yaml'
+ARCHIVE_JOURNALS = ['chapter-5/journal-net.beancount']
+
+
+def synthetic_ledger(size: str) -> Path:
+    """Generate (or reuse) the synthetic ledger for size and return its journal."""
+    params = SIZES[size]
+    output_dir = BENCH_DIR / size
+    journal = output_dir / 'journal.beancount'
+    stamp = output_dir / 'params.json'
+    wanted = json.dumps({**params, 'generator': generate.__file__}, sort_keys=True)
+    if journal.exists() and stamp.exists() and stamp.read_text() == wanted:
+        return journal
+
+    start, end = generate.START_DATE, generate.END_DATE
+    if params['years'] is not None:
+        start = datetime.date(2014, 1, 1)
+        end = start.replace(year=start.year + params['years']) - datetime.timedelta(days=1)
+    generate.generate(start, end, params['persons'], params['accounts'], params['rate'],
+                      output_dir=output_dir)
+    stamp.write_text(wanted)
+    return journal
+
+
+def synthetic_statement(size: str) -> Path:
+    """Write (or reuse) an HSBC statement CSV with the size's row count."""
+    rows = SIZES[size]['rows']
+    path = BENCH_DIR / size / f'statement-{rows}.csv'
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_statement(path, rows)
+    return path
+
+
+def label(journal: Path) -> str:
+    """Short, stable name for a journal in result keys."""
+    try:
+        return f'synthetic-{journal.relative_to(BENCH_DIR).parts[0]}'
+    except ValueError:
+        return str(journal.relative_to(REPO_ROOT))
+
+
+def load_journal(journal: Path) -> tuple:
+    """loader.load_file, raising ValueError if the journal has errors."""
+    entries, errors, options = loader.load_file(str(journal))
+    if errors:
+        raise ValueError(f'{len(errors)} error(s) loading {label(journal)}, '
+                         f'first: {errors[0].message.splitlines()[0]}')
+    return entries, errors, options
+
+
+def measure(func, repeat: int) -> dict:
+    """Call func repeat times; return the best and all wall times in seconds."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {'seconds': min(runs), 'runs': runs}
+
+
+class Suite:
+    """Collects benchmark results keyed by '<group>/<subject>/<case>'."""
+
+    def __init__(self, groups: list[str], pattern: str | None, repeat: int):
+        self.groups = groups
+        self.pattern = pattern
+        self.repeat = repeat
+        self.results = {}
+        self.failures = []
+        self._loaded = {}
+
+    def wanted(self, key: str) -> bool:
+        return key.split('/', 1)[0] in self.groups and (not self.pattern or self.pattern in key)
+
+    def run(self, key: str, func, **extra):
+        if not self.wanted(key):
+            return
+        try:
+            result = measure(func, self.repeat)
+        except Exception as exc:
+            self.fail(key, exc)
+            return
+        result.update(extra)
+        self.results[key] = result
+        print(f"{key:<80} {result['seconds'] * 1000:>10.1f} ms")
+
+    def fail(self, key: str, exc: Exception):
+        self.failures.append(key)
+        print(f'{key:<80} FAILED: {exc}')
+
+    def load(self, journal: Path):
+        """Load a journal once, untimed, for the query benchmarks; ValueError if it has errors."""
+        if journal not in self._loaded:
+            self._loaded[journal] = load_journal(journal)
+        return self._loaded[journal]
+
+    def bench_load(self, journal: Path):
+        self.run(f'load/{label(journal)}', lambda: load_journal(journal))
+        key = f'load/{label(journal)}/snapshot'
+        if self.wanted(key):
+            try:
+                snapshot.write(str(journal), self.load(journal), SNAPSHOT_DIR)
+            except ValueError as exc:
+                self.fail(key, exc)
+                return
+            self.run(key, lambda: snapshot.read(str(journal), SNAPSHOT_DIR))
+
+    def bench_extract(self, size: str):
+        key = f'extract/{size}/hsbc-current'
+        if not self.wanted(key):
+            return
+        statement = synthetic_statement(size)
+        importer = HsbcCurrentImporter(ACCOUNT)
+        self.run(key, lambda: importer.extract(str(statement)), rows=SIZES[size]['rows'])
+
+    def bench_archive(self, journal: Path):
+        if 'archive' not in self.groups:
+            return
+        prefix = f'archive/{label(journal)}'
+        try:
+            entries, errors, options = self.load(journal)
+        except ValueError as exc:
+            self.fail(prefix, exc)
+            return
+        dates = [entry.date for entry in entries if isinstance(entry, data.Transaction)]
+        open_date = min(dates).isoformat()
+        close_date = (max(dates) + datetime.timedelta(days=1)).isoformat()
+
+        context = archive.connect(entries, errors, options)
+        for filename, sql in archive.report_queries(open_date, close_date):
+            def report():
+                cursor = context.execute(sql)
+                render_text(cursor.description, cursor.fetchall(), options['dcontext'], io.StringIO())
+            self.run(f'{prefix}/{filename}', report)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.run(f'{prefix}/batch', lambda: archive.run_report_batch(
+                entries, errors, options, tmp, open_date, close_date))
+
+    def bench_dashboards(self, dashboards: Path, journal: Path):
+        if 'dashboards' not in self.groups:
+            return
+        prefix = f'dashboards/{label(journal)}'
+        try:
+            entries, errors, options = self.load(journal)
+        except ValueError as exc:
+            self.fail(prefix, exc)
+            return
+        context = archive.connect(entries, errors, options)
+        panels = load_panels(dashboards, ledger_context(entries, options))
+        for panel in panels:
+            for name, bql in panel.queries:
+                key = f'{prefix}/{panel.dashboard}/{panel.title}'
+                if len(panel.queries) > 1:
+                    key += f'/{name}'
+                self.run(key, lambda: context.execute(bql).fetchall())
+
+        queries = [bql for panel in panels for _, bql in panel.queries]
+        self.run(f'{prefix}/batch', lambda: BatchEvaluator(entries, errors, options).execute(queries))
+        with tempfile.TemporaryDirectory() as tmp:
+            rollups = RollupStore.for_ledger(entries, options, Path(tmp))
+            self.run(f'{prefix}/rollups', lambda: BatchEvaluator(entries, errors, options, rollups).execute(queries))
+            rollups.close()
+
+
+def environment() -> dict:
+    """Versions and machine details stored alongside the results."""
+    versions = {}
+    for package in ['beancount', 'beanquery', 'beancount-reds-plugins', 'fava']:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, check=True,
+                                capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': versions,
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float, noise: float) -> list[str]:
+    """Print old vs new times; return the keys that regressed beyond threshold.
+
+    Differences smaller than noise seconds are never flagged, so that
+    sub-millisecond queries do not trip the check on timer jitter.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<80} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key in sorted(set(baseline) & set(results)):
+        old, new = baseline[key]['seconds'], results[key]['seconds']
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > noise
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<80} {old * 1000:>8.1f}ms {new * 1000:>8.1f}ms {change:>+7.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    for key in sorted(set(baseline) - set(results)):
+        print(f'{key:<80} missing from this run')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium',
+                        help=f"Comma-separated synthetic ledger sizes ({', '.join(SIZES)})")
+    parser.add_argument('--groups', default=','.join(GROUPS),
+                        help=f"Comma-separated benchmark groups ({', '.join(GROUPS)})")
+    parser.add_argument('--filter', help='Only run benchmarks whose key contains this text')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the best is kept')
+    parser.add_argument('--output', type=Path, default=BENCH_DIR / 'results.json',
+                        help='Where to write the JSON results')
+    parser.add_argument('--compare', type=Path, help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative slowdown flagged as a regression (default: 0.10)')
+    parser.add_argument('--noise', type=float, default=0.005,
+                        help='Absolute slowdown in seconds below which nothing is flagged')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    groups = args.groups.split(',')
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f'unknown size {size!r}')
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f'unknown group {group!r}')
+
+    # Time the parse, not beancount's pickle cache of a previous parse
+    loader.initialize(use_cache=False)
+
+    suite = Suite(groups, args.filter, args.repeat)
+    synthetic = [synthetic_ledger(size) for size in sizes] if set(groups) - {'extract'} else []
+
+    for journal in find_journal_files(REPO_ROOT) + synthetic:
+        suite.bench_load(journal)
+    for size in sizes:
+        suite.bench_extract(size)
+    for journal in [REPO_ROOT / path for path in ARCHIVE_JOURNALS] + synthetic:
+        suite.bench_archive(journal)
+    for dashboards, journals in DASHBOARDS.items():
+        for journal in journals:
+            suite.bench_dashboards(REPO_ROOT / dashboards, REPO_ROOT / journal)
+    for journal in synthetic:
+        suite.bench_dashboards(REPO_ROOT / SYNTHETIC_DASHBOARDS, journal)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'repeat': args.repeat, 'results': suite.results},
+                  f, indent=2, sort_keys=True)
+    print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(baseline, suite.results, args.threshold, args.noise)
+        if regressions:
+            print(f'\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}')
+            sys.exit(1)
+        print('\nNo regressions')
+
+    if suite.failures:
+        print(f'\n{len(suite.failures)} benchmark(s) failed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,53 +2,132 @@
 """Run script for beancount-import.
 
 Usage:
-    python beancount_import_config.py
+    python beancount_import_config.py [--extract-workers N] [--no-extract-cache] [--import-report]
+                                      [--shard-output {month,year}]
 
 This launches the beancount-import web UI for categorizing transactions.
+Statements are extracted up front in a pool of N processes (default: one per
+core); pass --extract-workers 0 to let beancount-import extract them itself.
+Extracted entries are cached in .cache/extract keyed by file content, so only
+new or changed statements are parsed on startup.
+
+Importers are named as 'module:Class' and only imported once a source has a
+statement that needs them (see importers/registry.py). --import-report
+prints which importer classes were loaded and what each step of startup
+cost, then exits without launching the UI.
+
+With --shard-output, src/transactions.beancount and src/balance.beancount
+only hold what the current session accepted: on startup and on exit their
+entries are moved into per-month (or per-year) shard files under src/shards/
+(see importers/shards.py), so the files beancount-import rewrites stay small.
 """
 
+import argparse
 import os
 import sys
+import time
 
-from importers.hsbc import HsbcCurrentImporter
-
-
-def run_reconcile(extra_args):
-    import beancount_import.webserver
+from importers.registry import ImporterRegistry
 
-    journal_dir = os.path.dirname(__file__)
-    data_dir = os.path.join(journal_dir, 'data')
 
-    data_sources = [
+def data_source_declarations(data_dir):
+    """The data sources, with importers named for importers.registry."""
+    return [
         dict(
             module='beancount_import.source.generic_importer_source',
-            importer=HsbcCurrentImporter('Assets:Lalit:UK:HSBC:Current:GBP'),
+            importer='importers.hsbc:HsbcCurrentImporter',
             account='Assets:Lalit:UK:HSBC:Current:GBP',
             directory=os.path.join(data_dir, 'hsbc-current'),
         ),
         # Add more importers here as you add accounts, e.g.:
         # dict(
         #     module='beancount_import.source.generic_importer_source',
-        #     importer=AmexImporter('Liabilities:Lalit:UK:AMEX:GBP'),
+        #     importer='importers.amex:AmexImporter',
         #     account='Liabilities:Lalit:UK:AMEX:GBP',
         #     directory=os.path.join(data_dir, 'amex'),
         # ),
     ]
 
-    beancount_import.webserver.main(
-        extra_args,
-        journal_input=os.path.join(journal_dir, 'journal.beancount'),
-        ignored_journal=os.path.join(journal_dir, 'src', 'ignored.beancount'),
-        default_output=os.path.join(journal_dir, 'src', 'transactions.beancount'),
-        open_account_output_map=[
-            ('.*', os.path.join(journal_dir, 'src', 'accounts.beancount')),
-        ],
-        balance_account_output_map=[
-            ('.*', os.path.join(journal_dir, 'src', 'balance.beancount')),
-        ],
-        price_output=os.path.join(journal_dir, 'src', 'prices.beancount'),
-        data_sources=data_sources,
-    )
+
+def drain_output(src_dir, period):
+    """Move the session's accepted transactions and balances into shards."""
+    from importers import shards
+
+    moved = shards.drain(src_dir, {
+        kind: os.path.join(src_dir, f'{kind}.beancount') for kind in ('transactions', 'balance')
+    }, period)
+    for kind, count in moved.items():
+        if count < 0:
+            print(f'src/{kind}.beancount uses pushtag, option or include; left unsharded')
+        elif count:
+            print(f'Moved {count} entries from src/{kind}.beancount into src/shards/{kind}/')
+
+
+def run_reconcile(extra_args):
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--extract-workers', type=int, default=None)
+    parser.add_argument('--extract-cache', default=None)
+    parser.add_argument('--no-extract-cache', action='store_true')
+    parser.add_argument('--import-report', action='store_true')
+    parser.add_argument('--shard-output', choices=('month', 'year'), default=None)
+    args, extra_args = parser.parse_known_args(extra_args)
+
+    journal_dir = os.path.dirname(__file__)
+    data_dir = os.path.join(journal_dir, 'data')
+    src_dir = os.path.join(journal_dir, 'src')
+    if args.shard_output:
+        drain_output(src_dir, args.shard_output)
+    registry = ImporterRegistry(os.path.join(journal_dir, '.cache', 'importers.json'))
+
+    data_sources = registry.data_sources(data_source_declarations(data_dir))
+    timings = [('Data source declarations', time.perf_counter() - start)]
+
+    if args.extract_workers != 0:
+        step = time.perf_counter()
+        from importers.cache import ExtractCache
+        from importers.parallel import prefetch_data_sources
+
+        cache = None
+        if not args.no_extract_cache:
+            cache = ExtractCache(args.extract_cache or os.path.join(journal_dir, '.cache', 'extract'))
+        data_sources = prefetch_data_sources(data_sources, workers=args.extract_workers, cache=cache)
+        if cache is not None:
+            print(f'Extraction cache: {cache.stats()}')
+        timings.append(('Extraction stage', time.perf_counter() - step))
+
+    step = time.perf_counter()
+    import beancount_import.webserver
+    timings.append(('Import beancount_import.webserver', time.perf_counter() - step))
+
+    if args.import_report:
+        for line in registry.report():
+            print(line)
+        for label, seconds in timings:
+            print(f'{label}: {seconds * 1000:.1f} ms')
+        print(f'Total before the web UI starts: {(time.perf_counter() - start) * 1000:.1f} ms')
+        return
+
+    try:
+        beancount_import.webserver.main(
+            extra_args,
+            journal_input=os.path.join(journal_dir, 'journal.beancount'),
+            ignored_journal=os.path.join(src_dir, 'ignored.beancount'),
+            default_output=os.path.join(src_dir, 'transactions.beancount'),
+            open_account_output_map=[
+                ('.*', os.path.join(src_dir, 'accounts.beancount')),
+            ],
+            balance_account_output_map=[
+                ('.*', os.path.join(src_dir, 'balance.beancount')),
+            ],
+            price_output=os.path.join(src_dir, 'prices.beancount'),
+            data_sources=data_sources,
+        )
+    finally:
+        # beancount-import edits its output files by line, so they are only
+        # drained while it is not running
+        if args.shard_output:
+            drain_output(src_dir, args.shard_output)
 
 
 if __name__ == '__main__':
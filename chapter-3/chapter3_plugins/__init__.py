@@ -0,0 +1 @@
+# Beancount plugins for the chapter 3 journal
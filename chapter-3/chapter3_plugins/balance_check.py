@@ -0,0 +1,302 @@
+"""Check balance assertions in one sweep over per-account prefix sums.
+
+A drop-in replacement for beancount.ops.balance: it reports the same errors
+and flags failing Balance entries the same way. The loader always runs the
+built-in check, so a journal switches to raw plugin processing and lists
+the built-in plugins around this one:
+
+    option "plugin_processing_mode" "raw"
+    option "insert_pythonpath" "TRUE"
+    plugin "beancount.ops.documents"
+    plugin "beancount.ops.pad"
+    plugin "chapter3_plugins.balance_check"
+
+beancount.ops.balance keeps an Inventory per account. It finds the accounts
+under each asserted account by testing every account against every asserted
+one. Then, for every assertion, it adds up copies of the inventories of the
+asserted account and all its sub-accounts. BalanceIndex instead keeps, per
+account and currency, the dates the balance changed on and the running
+total after each. Each account is filed under its parents once, and an
+assertion costs one bisect per account in its subtree. A failing
+assertion's balance is recomputed the way beancount does, so the error text
+matches to the digit.
+
+The index also serves statements that arrive later. BalanceIndex.add()
+inserts new transactions and assertions and shifts the running totals after
+them. It then re-checks only the assertions dated after the earliest change
+on the accounts it touched (see scripts/check_balances.py).
+"""
+
+import bisect
+import itertools
+from collections import defaultdict
+from decimal import Decimal
+
+from beancount.core import amount, data, realization
+from beancount.core.interpolate import BalanceError
+from beancount.core.number import ZERO
+from beancount.ops.balance import get_balance_tolerance
+
+__plugins__ = ('check',)
+
+
+class BalanceIndex:
+    """Running balances of accounts by date, and the assertions checked against them.
+
+    With `asserted` given, only the accounts under those are indexed, as
+    beancount.ops.balance only tracks those; None indexes every account, so
+    assertions added later on any account can be checked.
+    """
+
+    def __init__(self, options_map: dict, asserted: set[str] | None = None):
+        self.options_map = options_map
+        self.asserted = asserted
+        # (account, currency) -> (dates, amounts, running totals) of its postings, by date
+        self.changes = defaultdict(lambda: ([], [], []))
+        self.lots = {}  # account -> {(currency, cost): number}, as its Inventory would hold them
+        self.untracked = set()  # accounts outside every asserted subtree
+        self.under = defaultdict(set)  # account -> itself and every indexed account below it
+        self.subtrees = {}  # account -> under[account] in the order realization walks it
+        self.opens = {}  # account -> its Open entry, None if it only has a Close
+        self.entries = []  # indexed transactions, in the order they were added
+        self.latest = None  # date of the latest indexed transaction
+        self.assertions = defaultdict(list)  # account -> [(date, seq, Balance)], sorted
+        self.failing = {}  # seq -> whether the assertion currently fails
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_entries(cls, entries: data.Entries, options_map: dict) -> 'BalanceIndex':
+        """Index every account of a whole ledger and check its assertions."""
+        index = cls(options_map)
+        index.sweep(entries)
+        return index
+
+    def _track(self, account: str) -> bool:
+        """Start indexing account if it is tracked; return whether it is."""
+        if account in self.lots:
+            return True
+        parts = account.split(':')
+        parents = [':'.join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+        if self.asserted is not None and not any(parent in self.asserted for parent in parents):
+            self.untracked.add(account)
+            return False
+        self.lots[account] = {}
+        for parent in parents:
+            self.under[parent].add(account)
+            self.subtrees.pop(parent, None)
+        return True
+
+    def _subtree(self, account: str) -> list[str]:
+        subtree = self.subtrees.get(account)
+        if subtree is None:
+            subtree = self.subtrees[account] = sorted(self.under.get(account, ()), key=lambda name: name.split(':'))
+        return subtree
+
+    def _add_open_close(self, entry: data.Directive):
+        # Like getters.get_account_open_close(), the earliest Open wins
+        if isinstance(entry, data.Open):
+            previous = self.opens.get(entry.account)
+            if previous is None or entry.date < previous.date:
+                self.opens[entry.account] = entry
+        elif isinstance(entry, data.Close):
+            self.opens.setdefault(entry.account, None)
+
+    def _add_transaction(self, entry: data.Transaction) -> list[str]:
+        """Add entry's postings to the lots and dated changes; return the accounts it changed."""
+        changed = []
+        in_order = self.latest is None or entry.date >= self.latest
+        for posting in entry.postings:
+            account = posting.account
+            if account not in self.lots and (account in self.untracked or not self._track(account)):
+                continue
+            changed.append(account)
+            units = posting.units
+            number = units.number
+            lots = self.lots[account]
+            key = (units.currency, posting.cost)
+            total = lots.get(key)
+            if total is None:
+                if number != ZERO:
+                    lots[key] = number
+            else:
+                total += number
+                if total == ZERO:
+                    del lots[key]
+                else:
+                    lots[key] = total
+
+            key = (account, units.currency)
+            dates, numbers, totals = self.changes[key]
+            if in_order:
+                dates.append(entry.date)
+                numbers.append(number)
+                totals.append(totals[-1] + number if totals else number)
+            else:
+                # An older transaction moves every later running total
+                i = bisect.bisect_right(dates, entry.date)
+                dates.insert(i, entry.date)
+                numbers.insert(i, number)
+                totals[:] = itertools.accumulate(numbers)
+        if changed:
+            self.entries.append(entry)
+            if in_order:
+                self.latest = entry.date
+        return changed
+
+    def balance(self, account: str, currency: str, date) -> Decimal:
+        """The units of currency held in account and its sub-accounts at the start of date."""
+        total = ZERO
+        for name in self.under.get(account, ()):
+            changes = self.changes.get((name, currency))
+            if changes is not None:
+                i = bisect.bisect_left(changes[0], date)
+                if i:
+                    total += changes[2][i - 1]
+        return total
+
+    def _current_balance(self, account: str, currency: str) -> amount.Amount:
+        """The balance after every indexed transaction, summed as realization.compute_balance() does.
+
+        Lots are merged account by account in realization's order, so a lot
+        that cancels out is dropped at the same point and the result has the
+        same exponent as beancount's.
+        """
+        subtree = self._subtree(account)
+        if len(subtree) == 1:
+            merged = self.lots[subtree[0]]
+        else:
+            merged = {}
+            for name in subtree:
+                for key, number in self.lots[name].items():
+                    total = merged.get(key)
+                    if total is None:
+                        merged[key] = number
+                    else:
+                        total += number
+                        if total == ZERO:
+                            del merged[key]
+                        else:
+                            merged[key] = total
+        total = ZERO
+        for (lot_currency, _), number in merged.items():
+            if lot_currency == currency:
+                total += number
+        return amount.Amount(total, currency)
+
+    def _inventory_balance(self, account: str, currency: str, date) -> amount.Amount:
+        """The balance at the start of date, rebuilt as beancount.ops.balance computes it."""
+        subtree = set(self._subtree(account))
+        real_root = realization.RealAccount('')
+        for entry in sorted(self.entries, key=lambda entry: entry.date):
+            if entry.date >= date:
+                break
+            for posting in entry.postings:
+                if posting.account in subtree:
+                    realization.get_or_create(real_root, posting.account).balance.add_position(posting)
+        real_account = realization.get_or_create(real_root, account)
+        return realization.compute_balance(real_account, leaf_only=False).get_currency_units(currency)
+
+    def check(self, entry: data.Balance) -> tuple[list[BalanceError], data.Balance]:
+        """Check entry against the indexed balances, as beancount.ops.balance does."""
+        errors = []
+        expected_amount = entry.amount
+        if entry.account not in self.opens:
+            errors.append(BalanceError(
+                entry.meta, "Invalid reference to unknown account '{}'".format(entry.account), entry))
+            open = None
+        else:
+            open = self.opens[entry.account]
+        if expected_amount is not None and open and open.currencies and expected_amount.currency not in open.currencies:
+            errors.append(BalanceError(
+                entry.meta, "Invalid currency '{}' for Balance directive: ".format(expected_amount.currency), entry))
+
+        current = self.latest is None or entry.date > self.latest
+        if current:
+            balance_amount = self._current_balance(entry.account, expected_amount.currency)
+            difference = balance_amount.number - expected_amount.number
+        else:
+            difference = self.balance(entry.account, expected_amount.currency, entry.date) - expected_amount.number
+        if abs(difference) > get_balance_tolerance(entry, self.options_map):
+            if not current:
+                balance_amount = self._inventory_balance(entry.account, expected_amount.currency, entry.date)
+            diff_amount = amount.sub(balance_amount, expected_amount)
+            errors.append(BalanceError(
+                entry.meta,
+                "Balance failed for '{}': expected {} != accumulated {} ({} {})".format(
+                    entry.account, expected_amount, balance_amount, abs(diff_amount.number),
+                    'too much' if diff_amount.number > 0 else 'too little'),
+                entry))
+            entry = entry._replace(meta=entry.meta.copy(), diff_amount=diff_amount)
+        return errors, entry
+
+    def _add_assertion(self, entry: data.Balance) -> tuple:
+        item = (entry.date, next(self._seq), entry)
+        bisect.insort(self.assertions[entry.account], item, key=lambda item: item[:2])
+        return item
+
+    def sweep(self, entries: data.Entries) -> tuple[data.Entries, list[BalanceError]]:
+        """Index sorted entries in one pass, checking each assertion as it is reached."""
+        for entry in entries:
+            self._add_open_close(entry)
+        new_entries = []
+        errors = []
+        for entry in entries:
+            if isinstance(entry, data.Transaction):
+                self._add_transaction(entry)
+            elif isinstance(entry, data.Balance):
+                _, seq, _ = self._add_assertion(entry)
+                entry_errors, entry = self.check(entry)
+                self.failing[seq] = bool(entry_errors)
+                errors.extend(entry_errors)
+            new_entries.append(entry)
+        return new_entries, errors
+
+    def add(self, entries: data.Entries) -> tuple[list[BalanceError], list[data.Balance]]:
+        """Add entries that arrived after indexing, in any order.
+
+        Only assertions that are new, or dated after a new transaction on
+        their account or one below it, are checked again. Returns the errors
+        of assertions that now fail and the assertions that failed before but
+        now pass.
+        """
+        for entry in entries:
+            self._add_open_close(entry)
+        earliest = {}
+        recheck = []
+        for entry in entries:
+            if isinstance(entry, data.Transaction):
+                for account in self._add_transaction(entry):
+                    if account not in earliest or entry.date < earliest[account]:
+                        earliest[account] = entry.date
+            elif isinstance(entry, data.Balance):
+                recheck.append(self._add_assertion(entry))
+
+        asserted = {}
+        for account, date in earliest.items():
+            parts = account.split(':')
+            for depth in range(1, len(parts) + 1):
+                parent = ':'.join(parts[:depth])
+                if parent in self.assertions and (parent not in asserted or date < asserted[parent]):
+                    asserted[parent] = date
+        for account, date in asserted.items():
+            items = self.assertions[account]
+            # Assertions are checked at the start of their day
+            start = bisect.bisect_right(items, date, key=lambda item: item[0])
+            recheck.extend(items[start:])
+
+        failed, fixed = [], []
+        for _, seq, entry in sorted({item[1]: item for item in recheck}.values(), key=lambda item: item[:2]):
+            entry_errors, _ = self.check(entry)
+            was_failing = self.failing.get(seq)
+            self.failing[seq] = bool(entry_errors)
+            if entry_errors and not was_failing:
+                failed.extend(entry_errors)
+            elif was_failing and not entry_errors:
+                fixed.append(entry)
+        return failed, fixed
+
+
+def check(entries, options_map):
+    """Process the balance assertion directives, as beancount.ops.balance.check does."""
+    asserted = {entry.account for entry in entries if isinstance(entry, data.Balance)}
+    return BalanceIndex(options_map, asserted).sweep(entries)
@@ -0,0 +1,118 @@
+"""On-disk cache of importer extraction results.
+
+Old statements never change, so re-extracting them on every launch is wasted
+work. Results are stored keyed by the file's content hash together with the
+importer's name, version and target account; a statement is only parsed
+again when its bytes change or the importer is bumped. As the key ignores
+where the file is, a hit is returned with its metadata pointing at the path
+it was looked up for rather than the one it was first extracted from.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+from beancount.core import data
+
+
+def _with_filename(meta: dict | None, path: str) -> dict | None:
+    if meta is None or meta.get('filename', path) == path:
+        return meta
+    return dict(meta, filename=path)
+
+
+def relocate(entries: data.Entries, path: str) -> data.Entries:
+    """Point the 'filename' metadata of entries and their postings at path."""
+    relocated = []
+    for entry in entries:
+        meta = _with_filename(entry.meta, path)
+        if meta is not entry.meta:
+            entry = entry._replace(meta=meta)
+        postings = getattr(entry, 'postings', None)
+        if postings:
+            moved = [posting._replace(meta=_with_filename(posting.meta, path)) for posting in postings]
+            if any(new.meta is not old.meta for new, old in zip(moved, postings)):
+                entry = entry._replace(postings=moved)
+        relocated.append(entry)
+    return relocated
+
+
+class ExtractCache:
+    """Persistent cache of extracted entries, stored under `directory`.
+
+    `index.json` maps each source file to the key of its cached result so
+    entries for deleted or modified statements can be evicted by prune().
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._index_path = os.path.join(directory, 'index.json')
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def key(self, importer, path: str) -> str:
+        """Return the cache key for running importer over path."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        version = getattr(importer, 'VERSION', 0)
+        header = f'{importer.name()}\0{version}\0{importer.account(path)}\0'
+        digest.update(header.encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.pickle')
+
+    def contains(self, key: str) -> bool:
+        """Return True if a result is stored under key."""
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key: str, path: str) -> data.Entries | None:
+        """Return the cached entries for key, or None on a miss."""
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        self._index[path] = key
+        self.hits += 1
+        return relocate(entries, path)
+
+    def put(self, key: str, path: str, entries: data.Entries):
+        """Store the entries extracted from path under key."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._entry_path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._entry_path(key))
+        self._index[path] = key
+
+    def prune(self):
+        """Evict results whose source files are gone or have since changed."""
+        self._index = {path: key for path, key in self._index.items() if os.path.exists(path)}
+        live = {key + '.pickle' for key in self._index.values()}
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle') and name not in live:
+                os.remove(os.path.join(self.directory, name))
+
+    def save(self):
+        """Prune stale results and write the index back to disk."""
+        self.prune()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._index_path)
+
+    def stats(self) -> str:
+        return f'{self.hits} hits, {self.misses} misses'
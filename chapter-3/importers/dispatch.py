@@ -0,0 +1,60 @@
+"""Route statement files to candidate importers in a single pass.
+
+Asking every importer to identify() every file is N×M probes. Importers can
+instead declare cheap routing hints as class attributes:
+
+    DIRECTORY  name of a data/ subfolder the importer's statements live in
+    SUFFIX     file extension, e.g. '.csv'
+
+ImporterIndex looks files up by directory, filters by suffix, and only then
+asks the surviving candidates to identify() the file. Importers without
+hints are probed for every file, as before. Hints must never be stricter
+than identify() itself, since a file they rule out is never offered to it;
+that is why there is no hint on file content, as importers find CSV columns
+by name rather than by an exact header line.
+"""
+
+import os
+from collections import defaultdict
+from pathlib import Path
+
+
+class ImporterIndex:
+    """Dispatch index from routing hints to importers."""
+
+    def __init__(self, importers: list):
+        self.importers = list(importers)
+        self._by_directory = defaultdict(list)
+        self._unrouted = []
+        for index, importer in enumerate(self.importers):
+            directory = getattr(importer, 'DIRECTORY', None)
+            if directory is None:
+                self._unrouted.append(index)
+            else:
+                self._by_directory[directory].append(index)
+
+    def candidates(self, path: str) -> list[int]:
+        """Return indices of importers whose hints match path."""
+        parts = Path(path).parts[:-1]
+        suffix = os.path.splitext(path)[1]
+        found = set(self._unrouted)
+        for part in parts:
+            for index in self._by_directory.get(part, ()):
+                importer = self.importers[index]
+                expected_suffix = getattr(importer, 'SUFFIX', None)
+                if expected_suffix is not None and suffix != expected_suffix:
+                    continue
+                found.add(index)
+        return sorted(found)
+
+    def route(self, paths) -> list[tuple[str, int]]:
+        """Return (path, importer index) for every file an importer claims.
+
+        identify() is only called on the candidates for each file.
+        """
+        routed = []
+        for path in paths:
+            for index in self.candidates(path):
+                if self.importers[index].identify(path):
+                    routed.append((path, index))
+        return routed
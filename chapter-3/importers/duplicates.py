@@ -0,0 +1,126 @@
+"""Find extracted transactions that are already in the ledger.
+
+beangulp's default Importer.deduplicate() re-sorts the existing entries on
+every call and runs a fuzzy comparator against everything dated within a
+few days of each extracted row. With a ten-year ledger and statements that
+overlap (downloads rarely line up exactly with the last import) that is
+the slow part of an import. DuplicateIndex is built once per import session
+instead and answers each row with a hash lookup:
+
+    key = (account, amount, currency, normalized payee, date bucket)
+
+Buckets are window + 1 days wide, so a row only needs its own bucket and
+the two neighbouring ones, and candidates there are checked against the
+exact date window. Each ledger posting is indexed under every description
+it carries (the posting's source_desc metadata, as beancount-import writes
+it, and the transaction's payee and narration). Within one statement a
+ledger posting matches at most one row, so a statement listing two
+identical purchases against one recorded purchase keeps the second.
+"""
+
+import functools
+import re
+from collections import defaultdict
+from decimal import Decimal
+
+from beancount.core import data
+from beangulp.extract import DUPLICATE
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]+')
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_payee(text: str | None) -> str:
+    """Upper-case text and collapse punctuation and whitespace runs, cached as payees repeat."""
+    return _NON_ALNUM.sub(' ', (text or '').upper()).strip()
+
+
+class DuplicateIndex:
+    """Hash index of the postings of existing ledger transactions."""
+
+    # The index of the last session, reused while the same list is passed in
+    _session = None
+
+    def __init__(self, existing_entries: data.Entries, window_days: int = 2):
+        self.window = window_days
+        self.width = window_days + 1
+        self.buckets = defaultdict(list)
+        self.add(existing_entries)
+
+    def add(self, entries: data.Entries):
+        """Index the postings of more ledger transactions."""
+        for entry in entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            ordinal = entry.date.toordinal()
+            bucket = ordinal // self.width
+            entry_descriptions = {normalize_payee(entry.payee), normalize_payee(entry.narration)} - {''}
+            for posting in entry.postings:
+                units = posting.units
+                if units is None or not isinstance(units.number, Decimal):
+                    continue
+                descriptions = entry_descriptions
+                if posting.meta and posting.meta.get('source_desc'):
+                    descriptions = descriptions | {normalize_payee(posting.meta['source_desc'])}
+                for description in descriptions:
+                    key = (posting.account, units.number, units.currency, description, bucket)
+                    self.buckets[key].append((ordinal, id(posting), entry))
+
+    @classmethod
+    def session(cls, existing_entries: data.Entries, window_days: int = 2) -> 'DuplicateIndex':
+        """The index of existing_entries, built once for as long as the same list is passed.
+
+        beangulp passes every statement of an import the same existing
+        entries list and extends it with each statement's rows after
+        deduplicating them. The index is built on the first statement, and
+        later calls only index the entries appended since.
+        """
+        cached = cls._session
+        if (cached is not None and cached[0] is existing_entries and cached[1] <= len(existing_entries)
+                and cached[2].window == window_days):
+            index = cached[2]
+            index.add(existing_entries[cached[1]:])
+            cls._session = (existing_entries, len(existing_entries), index)
+            return index
+        index = cls(existing_entries, window_days)
+        cls._session = (existing_entries, len(existing_entries), index)
+        return index
+
+    def find(self, entry: data.Directive, used: set) -> data.Transaction | None:
+        """Return the ledger transaction entry duplicates, or None.
+
+        The entry's first posting is looked up. `used` holds the postings
+        already matched in this statement and is updated with the match.
+        """
+        if not isinstance(entry, data.Transaction) or not entry.postings:
+            return None
+        posting = entry.postings[0]
+        if posting.units is None:
+            return None
+        ordinal = entry.date.toordinal()
+        bucket = ordinal // self.width
+        prefix = (posting.account, posting.units.number, posting.units.currency,
+                  normalize_payee(entry.payee or entry.narration))
+        best = None
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for candidate in self.buckets.get(prefix + (neighbour,), ()):
+                distance = abs(candidate[0] - ordinal)
+                if distance <= self.window and candidate[1] not in used and (best is None or distance < best[0]):
+                    best = (distance, candidate[1], candidate[2])
+        if best is None:
+            return None
+        used.add(best[1])
+        return best[2]
+
+    def mark(self, entries: data.Entries):
+        """Set beangulp's __duplicate__ metadata on entries already in the ledger, in place."""
+        used = set()
+        for entry in entries:
+            target = self.find(entry, used)
+            if target is not None:
+                entry.meta[DUPLICATE] = target
+
+    def drop(self, entries: data.Entries) -> data.Entries:
+        """Return entries without those already in the ledger."""
+        used = set()
+        return [entry for entry in entries if self.find(entry, used) is None]
@@ -9,17 +9,34 @@ cases, multi-currency), see: https://github.com/LalitMaganti/beancount-lalitm
 
 import csv
 import datetime
+import functools
 from pathlib import Path
+from typing import Iterator
 
 from beancount.core import data
 from beancount.core.amount import Amount
 from beancount.core.number import D
 from beangulp import Importer
 
+from importers.duplicates import DuplicateIndex
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(text: str) -> datetime.date:
+    """Parse an ISO date, cached because statements repeat the same few dates."""
+    return datetime.date.fromisoformat(text)
+
 
 class HsbcCurrentImporter(Importer):
     """Importer for HSBC current account CSV statements."""
 
+    # Bump whenever extract() output changes so cached results are discarded
+    VERSION = 1
+
+    # Routing hints for importers.dispatch.ImporterIndex
+    DIRECTORY = 'hsbc-current'
+    SUFFIX = '.csv'
+
     def __init__(self, account: str):
         self._account = account
 
@@ -32,9 +49,9 @@ class HsbcCurrentImporter(Importer):
         # Handle beangulp's _FileMemo object
         path = Path(filepath.name if hasattr(filepath, 'name') else filepath)
         # Check if it's a CSV in the hsbc-current folder
-        if path.suffix != '.csv':
+        if path.suffix != self.SUFFIX:
             return False
-        if 'hsbc-current' not in str(path):
+        if self.DIRECTORY not in path.parent.parts:
             return False
         return True
 
@@ -55,37 +72,55 @@ class HsbcCurrentImporter(Importer):
         return datetime.date.today()
 
     def extract(self, filepath, existing_entries: data.Entries = None) -> data.Entries:
-        """Parse the CSV file and return beancount transactions."""
-        # Handle beangulp's _FileMemo object
-        path = filepath.name if hasattr(filepath, 'name') else filepath
-        entries = []
+        """Parse the CSV file and return beancount transactions.
 
-        with open(path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Parse the date
-                date = datetime.datetime.strptime(row['Date'], '%Y-%m-%d').date()
+        Every row is returned, even those already in the ledger:
+        beancount-import matches the ledger's postings to extracted rows by
+        source_desc and reports any it cannot match as invalid.
+        """
+        return list(self.iter_extract(filepath))
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        """Mark entries already in the ledger, for beangulp's own import flow."""
+        DuplicateIndex.session(existing).mark(entries)
+
+    def iter_extract(self, filepath) -> Iterator[data.Transaction]:
+        """Parse the CSV file, yielding one transaction per row.
 
-                # Parse the amount
-                amount = D(row['Amount'])
+        Rows are streamed so memory stays flat however large the statement is.
+        """
+        # Handle beangulp's _FileMemo object
+        path = str(filepath.name if hasattr(filepath, 'name') else filepath)
+        units_currency = 'GBP'
+
+        with open(path, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            # Look up column positions once instead of building a dict per row
+            date_col = header.index('Date')
+            payee_col = header.index('Description')
+            amount_col = header.index('Amount')
 
-                # Create metadata
-                meta = data.new_metadata(str(path), 0)
+            for row in reader:
+                if not row:
+                    continue
 
                 # Create the transaction with single posting
                 # beancount-import will add the categorized other side
-                txn = data.Transaction(
-                    meta=meta,
-                    date=date,
+                yield data.Transaction(
+                    meta=data.new_metadata(path, reader.line_num),
+                    date=parse_date(row[date_col]),
                     flag='*',
-                    payee=row['Description'],
+                    payee=row[payee_col],
                     narration='',
-                    tags=set(),
-                    links=set(),
+                    tags=data.EMPTY_SET,
+                    links=data.EMPTY_SET,
                     postings=[
                         data.Posting(
                             account=self._account,
-                            units=Amount(amount, 'GBP'),
+                            units=Amount(D(row[amount_col]), units_currency),
                             cost=None,
                             price=None,
                             flag=None,
@@ -93,6 +128,3 @@ class HsbcCurrentImporter(Importer):
                         ),
                     ],
                 )
-                entries.append(txn)
-
-        return entries
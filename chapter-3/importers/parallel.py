@@ -0,0 +1,158 @@
+"""Parallel extraction stage for beancount-import data sources.
+
+beancount-import asks each data source's importer to extract its files one
+after another before the web UI is usable. With many accounts and years of
+statements that is the bulk of startup time, so this module extracts every
+file of every source up front in a process pool and hands beancount-import
+importers that serve those precomputed results.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from beancount.core import data
+from beangulp import Importer
+
+from importers.cache import ExtractCache
+from importers.dispatch import ImporterIndex
+from importers.registry import LazyImporter
+
+
+def _filepath(filepath) -> str:
+    """Normalise a path or beangulp _FileMemo to an absolute path string."""
+    return os.path.abspath(filepath.name if hasattr(filepath, 'name') else filepath)
+
+
+def _walk(directory: str) -> list[str]:
+    """List every file under directory in a stable (sorted) order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            paths.append(os.path.join(root, name))
+    return paths
+
+
+def _extract_file(importer, path: str) -> data.Entries:
+    """Worker entry point: run a single importer over a single file."""
+    return importer.extract(path)
+
+
+class PrefetchedImporter(Importer):
+    """Wraps an importer, answering extract() from results computed up front.
+
+    Files that were not prefetched (e.g. dropped in after startup) fall
+    through to the wrapped importer.
+    """
+
+    def __init__(self, importer, results: dict[str, data.Entries]):
+        self._importer = importer
+        self._results = results
+
+    def __getattr__(self, name):
+        return getattr(self._importer, name)
+
+    def name(self) -> str:
+        return self._importer.name()
+
+    def identify(self, filepath) -> bool:
+        if _filepath(filepath) in self._results:
+            return True
+        return self._importer.identify(filepath)
+
+    def account(self, filepath) -> str:
+        return self._importer.account(filepath)
+
+    def date(self, filepath):
+        return self._importer.date(filepath)
+
+    def extract(self, filepath, existing_entries: data.Entries = None) -> data.Entries:
+        entries = self._results.get(_filepath(filepath))
+        if entries is None:
+            return self._importer.extract(filepath, existing_entries)
+        return list(entries)
+
+
+def prefetch_data_sources(
+    data_sources: list[dict],
+    workers: int | None = None,
+    cache: ExtractCache | None = None,
+) -> list[dict]:
+    """Extract all files of all data sources in parallel.
+
+    Files are fanned out across a pool of `workers` processes (default: one
+    per core) and the results are merged back per source in sorted path
+    order, so the outcome does not depend on scheduling. When a cache is
+    given, only statements it has not seen before are extracted. Returns a
+    copy of data_sources with each importer wrapped in a PrefetchedImporter.
+    """
+    # Walk each source directory once and route its files through the
+    # dispatch index rather than asking every importer about every file.
+    routable = [
+        index for index, source in enumerate(data_sources)
+        if source.get('importer') is not None and source.get('directory') is not None
+    ]
+    dispatch = ImporterIndex([data_sources[index]['importer'] for index in routable])
+    directories = sorted({_filepath(data_sources[index]['directory']) for index in routable})
+
+    jobs = set()
+    keys = {}
+    for directory in directories:
+        for path in _walk(directory):
+            for candidate in dispatch.candidates(path):
+                index = routable[candidate]
+                importer = data_sources[index]['importer']
+                source_directory = _filepath(data_sources[index]['directory'])
+                if os.path.commonpath([source_directory, path]) != source_directory:
+                    continue
+                # A statement cached for this importer was claimed by it
+                # before, so an importer not loaded yet need not be loaded
+                # just to identify() it again
+                if cache is not None and isinstance(importer, LazyImporter) and not importer.loaded:
+                    keys[index, path] = cache.key(importer, path)
+                    if cache.contains(keys[index, path]):
+                        jobs.add((index, path))
+                        continue
+                if importer.identify(path):
+                    jobs.add((index, path))
+    jobs = sorted(jobs)
+
+    results = [{} for _ in data_sources]
+    pending = []
+    for index, path in jobs:
+        key = None
+        if cache is not None:
+            key = keys.get((index, path)) or cache.key(data_sources[index]['importer'], path)
+            entries = cache.get(key, path)
+            if entries is not None:
+                results[index][path] = entries
+                continue
+        pending.append((index, path, key))
+
+    if workers == 1 or len(pending) <= 1:
+        extracted = [
+            _extract_file(data_sources[index]['importer'], path)
+            for index, path, _ in pending
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_extract_file, data_sources[index]['importer'], path)
+                for index, path, _ in pending
+            ]
+            extracted = [future.result() for future in futures]
+
+    for (index, path, key), entries in zip(pending, extracted):
+        results[index][path] = entries
+        if cache is not None:
+            cache.put(key, path, entries)
+    if cache is not None:
+        cache.save()
+
+    prefetched = []
+    for index, source in enumerate(data_sources):
+        source = dict(source)
+        if 'importer' in source and 'directory' in source:
+            source['importer'] = PrefetchedImporter(source['importer'], results[index])
+        prefetched.append(source)
+    return prefetched
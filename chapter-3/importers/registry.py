@@ -0,0 +1,216 @@
+"""Load importer classes only when a data source needs them.
+
+Importing an importer module pulls in beancount, beangulp and whatever the
+importer parses with (PDF or spreadsheet libraries for real bank
+statements), and the config used to do that for every configured account
+before the web UI could start. Data sources can instead name their importer
+as 'module:Class':
+
+    dict(
+        module='beancount_import.source.generic_importer_source',
+        importer='importers.hsbc:HsbcCurrentImporter',
+        account='Assets:Lalit:UK:HSBC:Current:GBP',
+        directory=os.path.join(data_dir, 'hsbc-current'),
+    )
+
+ImporterRegistry.data_sources() swaps each such name for a LazyImporter,
+constructed as Class(account) unless the source gives importer_args. The
+class is imported the first time something needs more than its name,
+routing hints (see dispatch.py) or account. Those are recorded in a small
+JSON file the first time the class is loaded and reused for as
+long as the module's source file is unchanged, so afterwards:
+
+  - a source whose directory holds no file matching the hints never loads
+    its importer, since identify() rejects such files without it;
+  - a source whose statements are all in the extraction cache never loads
+    it either, as the cache key only needs the name, VERSION and account.
+
+account() answers with the data source's account without loading the
+class: beancount-import files everything a generic importer source extracts
+under that account anyway.
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import time
+
+from beangulp import Importer
+
+from importers.dispatch import ImporterIndex
+
+# Class attributes read through the registry without loading the class
+HINTS = ('VERSION', 'DIRECTORY', 'SUFFIX')
+
+
+class LazyImporter(Importer):
+    """Stands in for an importer, loading its class on first real use.
+
+    It is a beangulp Importer itself, so beancount-import uses it directly
+    rather than wrapping it in beangulp's Adapter for old-style importers.
+    """
+
+    def __init__(self, spec: str, args: tuple, kwargs: dict, account: str | None,
+                 metadata: dict | None, on_load=None):
+        self.spec = spec
+        self.args = args
+        self.kwargs = kwargs
+        self.source_account = account
+        self.metadata = metadata
+        self.load_seconds = None
+        self._importer = None
+        self._on_load = on_load
+
+    def __getstate__(self):
+        # Sent to extraction workers without the registry's callback
+        return dict(self.__dict__, _on_load=None)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name in HINTS and self.metadata is not None:
+            return self.metadata['hints'][name]
+        return getattr(self.load(), name)
+
+    @property
+    def loaded(self) -> bool:
+        return self._importer is not None
+
+    def load(self):
+        """Import the importer's module and construct it, once."""
+        if self._importer is None:
+            module_name, _, class_name = self.spec.partition(':')
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            self._importer = getattr(module, class_name)(*self.args, **self.kwargs)
+            self.load_seconds = time.perf_counter() - start
+            if self._on_load is not None:
+                self._on_load(self)
+        return self._importer
+
+    def name(self) -> str:
+        if self.metadata is not None:
+            return self.metadata['name']
+        return self.load().name()
+
+    def identify(self, filepath) -> bool:
+        path = filepath.name if hasattr(filepath, 'name') else filepath
+        # The directory and suffix hints are necessary conditions, so files
+        # they rule out are rejected without loading the class
+        if not ImporterIndex([self]).candidates(path):
+            return False
+        return self.load().identify(filepath)
+
+    def account(self, filepath) -> str:
+        if self.source_account is not None:
+            return self.source_account
+        return self.load().account(filepath)
+
+    def date(self, filepath):
+        return self.load().date(filepath)
+
+    def filename(self, filepath):
+        return self.load().filename(filepath)
+
+    def extract(self, filepath, existing_entries=None):
+        return self.load().extract(filepath, existing_entries)
+
+    def deduplicate(self, entries, existing):
+        return self.load().deduplicate(entries, existing)
+
+    def sort(self, entries, reverse=False):
+        return self.load().sort(entries, reverse)
+
+
+class ImporterRegistry:
+    """Creates LazyImporters and remembers what loading their classes taught it.
+
+    `path` is the JSON file the importers' names and routing hints are kept
+    in; with None nothing is remembered and every importer is loaded as
+    soon as it is asked for its name or hints.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.importers = []
+        self._stamps = {}
+        self._metadata = {}
+        if path is not None:
+            try:
+                with open(path) as f:
+                    self._metadata = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def _stamp(self, spec: str) -> list | None:
+        """(mtime, size) of the source file defining spec's module, found without importing it."""
+        module_name = spec.partition(':')[0]
+        if module_name not in self._stamps:
+            try:
+                origin = importlib.util.find_spec(module_name).origin
+                stat = os.stat(origin)
+                self._stamps[module_name] = [stat.st_mtime_ns, stat.st_size]
+            except (AttributeError, ImportError, OSError, TypeError, ValueError):
+                self._stamps[module_name] = None
+        return self._stamps[module_name]
+
+    @staticmethod
+    def _key(spec: str, args: tuple, kwargs: dict) -> str:
+        return repr((spec, args, sorted(kwargs.items())))
+
+    def importer(self, spec: str, *args, account: str | None = None, **kwargs) -> LazyImporter:
+        """A LazyImporter for spec ('module:Class') constructed with args and kwargs."""
+        key = self._key(spec, args, kwargs)
+        metadata = self._metadata.get(key)
+        stamp = self._stamp(spec)
+        if metadata is None or stamp is None or metadata['stamp'] != stamp:
+            metadata = None
+        importer = LazyImporter(spec, args, kwargs, account, metadata, on_load=self._record)
+        self.importers.append(importer)
+        return importer
+
+    def data_sources(self, declarations: list[dict]) -> list[dict]:
+        """Copy data source declarations, turning 'module:Class' importers into LazyImporters."""
+        data_sources = []
+        for source in declarations:
+            source = dict(source)
+            if isinstance(source.get('importer'), str):
+                args = source.pop('importer_args', (source.get('account'),))
+                source['importer'] = self.importer(source['importer'], *args, account=source.get('account'))
+            data_sources.append(source)
+        return data_sources
+
+    def _record(self, importer: LazyImporter):
+        stamp = self._stamp(importer.spec)
+        if stamp is None:
+            return
+        loaded = importer.load()
+        importer.metadata = {
+            'stamp': stamp,
+            'name': loaded.name(),
+            'hints': {name: getattr(loaded, name, 0 if name == 'VERSION' else None) for name in HINTS},
+        }
+        key = self._key(importer.spec, importer.args, importer.kwargs)
+        if self._metadata.get(key) == importer.metadata or self.path is None:
+            return
+        self._metadata[key] = importer.metadata
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._metadata, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def report(self) -> list[str]:
+        """One line per importer: whether its class was loaded, and the import cost if so."""
+        lines = []
+        for importer in self.importers:
+            account = f' ({importer.source_account})' if importer.source_account else ''
+            if importer.loaded:
+                status = f'loaded in {importer.load_seconds * 1000:.1f} ms'
+            elif importer.metadata is None:
+                status = 'not loaded'
+            else:
+                status = 'not loaded (no new matching files)'
+            lines.append(f'{importer.spec}{account}: {status}')
+        return lines
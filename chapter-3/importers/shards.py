@@ -0,0 +1,196 @@
+"""Move beancount-import's output into per-month (or per-year) shard files.
+
+beancount-import appends accepted transactions and balance assertions to a
+single file per kind, so src/transactions.beancount and src/balance.beancount
+grow without bound, and each save re-reads and rewrites a file the size of
+the whole history. In sharded mode those files are only an inbox: drain()
+moves their entries into
+
+    src/shards/<kind>/<year>/<year>-<month>.beancount
+
+and keeps src/shards.beancount, which journal.beancount includes, listing
+every shard. Entries are moved as the exact text beancount-import wrote,
+including comment lines directly above them, and are appended to the shards
+with one buffered write per shard. Draining therefore costs time in
+proportion to the inbox, and shards for months that received nothing are
+not touched - so their parse results stay valid for anything caching
+parses per file, like scripts/ledgerd.py.
+
+Before appending, drain() records each shard's size and the inbox's size
+and hash in a journal file next to the inbox (transactions.beancount.drain),
+and it removes the journal once the inbox is rewritten. If a drain is
+interrupted in between, the next one finds the journal: while the inbox
+still starts with what was being drained, the appends are rolled back by
+truncating the shards to their recorded sizes; otherwise the move had
+completed. No entry ends up in both the inbox and a shard.
+
+An inbox using pushtag/poptag, option, plugin or include is left alone:
+moving its entries would change their meaning.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+
+from beancount.parser import parser
+
+SHARD_INDEX = 'shards.beancount'
+_UNMOVABLE = re.compile(r'^(pushtag|poptag|pushmeta|popmeta|option|plugin|include)\b')
+
+
+def shard_path(kind: str, date, period: str = 'month') -> str:
+    """The shard file, relative to the output directory, holding kind entries dated date."""
+    if period == 'year':
+        return os.path.join('shards', kind, f'{date.year}.beancount')
+    return os.path.join('shards', kind, f'{date.year}', f'{date.year}-{date.month:02d}.beancount')
+
+
+def entry_blocks(path: str) -> tuple[list[str], list[tuple]] | None:
+    """Split an inbox into its header lines and (entry, text) blocks.
+
+    Returns None if the file uses directives that make moving entries
+    unsafe, or fails to parse.
+    """
+    with open(path) as f:
+        lines = f.readlines()
+    if any(_UNMOVABLE.match(line) for line in lines):
+        return None
+    entries, errors, _ = parser.parse_file(path)
+    if errors:
+        return None
+
+    starts = []
+    # The parser does not return entries in file order
+    for entry in sorted(entries, key=lambda entry: entry.meta['lineno']):
+        start = entry.meta['lineno'] - 1
+        # Comment lines directly above an entry travel with it
+        while start > 0 and lines[start - 1].startswith(';'):
+            start -= 1
+        starts.append((entry, start))
+    if not starts:
+        return lines, []
+
+    header = lines[:starts[0][1]]
+    blocks = []
+    for i, (entry, start) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else len(lines)
+        text = ''.join(lines[start:end]).rstrip('\n') + '\n'
+        blocks.append((entry, text))
+    return header, blocks
+
+
+def _digest(path: str, size: int | None = None) -> str:
+    """Hash of the first size bytes of path (all of it by default)."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(size)).hexdigest()
+
+
+def recover(directory: str, inbox: str) -> bool:
+    """Finish or roll back an interrupted drain of inbox; return whether one was found."""
+    journal_path = inbox + '.drain'
+    try:
+        with open(journal_path) as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        # A journal that never finished writing was written before any append
+        if os.path.exists(journal_path + '.tmp'):
+            os.remove(journal_path + '.tmp')
+        return False
+    size, digest = journal['inbox']
+    if os.path.exists(inbox) and os.path.getsize(inbox) >= size and _digest(inbox, size) == digest:
+        # The inbox still holds every entry, maybe with more appended since, so undo the shards
+        for shard, size in journal['shards'].items():
+            path = os.path.join(directory, shard)
+            if size is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                os.truncate(path, size)
+    os.remove(journal_path)
+    return True
+
+
+def write_index(directory: str) -> bool:
+    """Rewrite directory/shards.beancount to include every shard; return whether it changed."""
+    shards = []
+    root = os.path.join(directory, 'shards')
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith('.beancount'):
+                shards.append(os.path.relpath(os.path.join(dirpath, name), directory))
+    text = ('; Generated by importers/shards.py - lists every shard of beancount-import output.\n'
+            + ''.join(f'include "{shard}"\n' for shard in sorted(shards)))
+    index_path = os.path.join(directory, SHARD_INDEX)
+    try:
+        with open(index_path) as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, index_path)
+    return True
+
+
+def drain(directory: str, inboxes: dict[str, str], period: str = 'month') -> dict[str, int]:
+    """Move the entries of each inbox file into kind shards under directory.
+
+    inboxes maps kind (e.g. 'transactions') to the inbox file. Returns
+    kind -> number of entries moved; an inbox that cannot be moved safely
+    is reported as -1 and left unchanged.
+    """
+    moved = {}
+    index_stale = not os.path.exists(os.path.join(directory, SHARD_INDEX))
+    for kind, inbox in inboxes.items():
+        if recover(directory, inbox):
+            index_stale = True
+        if not os.path.exists(inbox):
+            moved[kind] = 0
+            continue
+        split = entry_blocks(inbox)
+        if split is None:
+            moved[kind] = -1
+            continue
+        header, blocks = split
+        if not blocks:
+            moved[kind] = 0
+            continue
+
+        by_shard = collections.defaultdict(list)
+        for entry, text in blocks:
+            by_shard[shard_path(kind, entry.date, period)].append(text)
+
+        journal_path = inbox + '.drain'
+        sizes = {}
+        for shard in by_shard:
+            path = os.path.join(directory, shard)
+            sizes[shard] = os.path.getsize(path) if os.path.exists(path) else None
+        inbox_size = os.path.getsize(inbox)
+        with open(journal_path + '.tmp', 'w') as f:
+            json.dump({'inbox': [inbox_size, _digest(inbox, inbox_size)], 'shards': sizes}, f)
+        os.replace(journal_path + '.tmp', journal_path)
+
+        for shard, texts in sorted(by_shard.items()):
+            path = os.path.join(directory, shard)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                index_stale = True
+            with open(path, 'a', buffering=1 << 20) as f:
+                # Entries are separated by a blank line, as beancount-import writes them
+                f.write(('\n' if f.tell() else '') + '\n'.join(texts))
+
+        tmp_path = inbox + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(''.join(header).rstrip('\n') + '\n' if header else '')
+        os.replace(tmp_path, inbox)
+        os.remove(journal_path)
+        moved[kind] = len(blocks)
+
+    if index_stale:
+        write_index(directory)
+    return moved
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Report how new statements change the journal's balance assertions.
+
+Loads the journal once and indexes its running balances and assertions in
+chapter3_plugins/balance_check.py's BalanceIndex. Then it extracts every
+statement under data/ with the configured importers, drops rows the ledger
+already records (see importers/duplicates.py), and adds each statement's
+rows to the index in turn. Only the assertions those rows can affect are
+checked again, so each statement reports which assertions it breaks or
+fixes without rechecking the whole ledger.
+
+With --watch the index stays in memory and statements dropped into data/
+later are checked the same way as they arrive. Rows cannot be taken back
+out of the index, so a statement that is edited after being checked needs
+a fresh run.
+
+Usage (from chapter-3/):
+    python scripts/check_balances.py [journal.beancount] [--watch SECONDS]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from beancount import loader  # noqa: E402
+
+from beancount_import_config import data_source_declarations  # noqa: E402
+from importers.registry import ImporterRegistry  # noqa: E402
+from chapter3_plugins.balance_check import BalanceIndex  # noqa: E402
+from importers.duplicates import DuplicateIndex  # noqa: E402
+
+
+def statements(data_sources: list[dict]) -> dict[str, object]:
+    """path -> importer for every file an importer claims."""
+    found = {}
+    for source in data_sources:
+        for root, dirs, files in os.walk(source['directory']):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if source['importer'].identify(path):
+                    found[path] = source['importer']
+    return found
+
+
+def report(index: BalanceIndex, path: str, importer, existing: list):
+    """Add one statement's new rows to the index and print what they changed."""
+    start = time.perf_counter()
+    rows = DuplicateIndex.session(existing).drop(importer.extract(path, existing))
+    failed, fixed = index.add(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{os.path.relpath(path)}: {len(rows)} new rows, checked in {elapsed * 1000:.1f} ms")
+    for error in failed:
+        print(f"  fails: {error.message}")
+    for entry in fixed:
+        print(f"  passes: {entry.date} balance {entry.account} {entry.amount}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report how new statements change balance assertions")
+    parser.add_argument('journal', nargs='?', default='journal.beancount', help='Journal file')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='Keep checking statements that arrive, every SECONDS')
+    args = parser.parse_args()
+
+    entries, _, options = loader.load_file(args.journal)
+    start = time.perf_counter()
+    index = BalanceIndex.from_entries(entries, options)
+    failing = sum(index.failing.values())
+    print(f"{len(index.failing)} balance assertions indexed in {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{failing} failing")
+
+    journal_dir = os.path.dirname(os.path.abspath(args.journal))
+    registry = ImporterRegistry(os.path.join(journal_dir, '.cache', 'importers.json'))
+    data_sources = registry.data_sources(data_source_declarations(os.path.join(journal_dir, 'data')))
+    seen = set()
+    while True:
+        for path, importer in statements(data_sources).items():
+            if path not in seen:
+                seen.add(path)
+                report(index, path, importer, entries)
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
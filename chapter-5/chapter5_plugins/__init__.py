@@ -0,0 +1 @@
+# Beancount plugins for the chapter 5 journals
@@ -0,0 +1,76 @@
+"""Rename accounts, rewriting only the entries that use them.
+
+A drop-in replacement for beancount_reds_plugins.rename_accounts, taking the
+same configuration: a dict of account regex -> replacement, every pattern
+applied in turn with re.subn.
+
+    option "insert_pythonpath" "TRUE"
+    plugin "chapter5_plugins.rename_accounts" "{
+      'Income:Lalit:UK:Google:Salary': 'Income:Lalit:UK:Google:Net-Income',
+    }"
+
+The reds plugin runs every pattern over the account of every posting and
+rebuilds the posting list of every transaction. Here each distinct account
+is renamed once, with the results interned so all postings to a renamed
+account share one string. Transactions that touch no renamed account, and
+the untouched postings of those that do, are passed through as the same
+objects, so the cost is one dict lookup per posting plus the few entries
+actually rewritten.
+"""
+
+import re
+import sys
+from ast import literal_eval
+
+from beancount.core import data
+
+__plugins__ = ('rename_accounts',)
+
+
+def account_renames(config: str, accounts) -> dict[str, str]:
+    """Map each of accounts that the configured patterns change to its new name."""
+    patterns = [(re.compile(pattern), replacement) for pattern, replacement in literal_eval(config).items()]
+    renames = {}
+    for name in accounts:
+        new_name = name
+        for pattern, replacement in patterns:
+            new_name = pattern.sub(replacement, new_name)
+        if new_name != name:
+            renames[name] = sys.intern(new_name)
+    return renames
+
+
+def rename_accounts(entries, options_map, config):
+    """Apply the renames in config to every account of every entry."""
+    accounts = set()
+    for entry in entries:
+        if isinstance(entry, data.Transaction):
+            for posting in entry.postings:
+                accounts.add(posting.account)
+        elif isinstance(entry, data.Pad):
+            accounts.add(entry.account)
+            accounts.add(entry.source_account)
+        elif hasattr(entry, 'account'):
+            accounts.add(entry.account)
+    renames = account_renames(config, accounts)
+    if not renames:
+        return entries, []
+
+    new_entries = []
+    for entry in entries:
+        if isinstance(entry, data.Transaction):
+            for posting in entry.postings:
+                if posting.account in renames:
+                    entry = entry._replace(postings=[
+                        posting._replace(account=renames[posting.account]) if posting.account in renames
+                        else posting for posting in entry.postings
+                    ])
+                    break
+        elif isinstance(entry, data.Pad):
+            if entry.account in renames or entry.source_account in renames:
+                entry = entry._replace(account=renames.get(entry.account, entry.account),
+                                       source_account=renames.get(entry.source_account, entry.source_account))
+        elif hasattr(entry, 'account') and entry.account in renames:
+            entry = entry._replace(account=renames[entry.account])
+        new_entries.append(entry)
+    return new_entries, []
@@ -8,28 +8,101 @@ maintain a git history of your net worth over time.
 
 Usage:
     uv run scripts/archive.py <output_dir> <journal_file> <open_date> <close_date>
+        [--workers N] [--state FILE] [--period daily|weekly|monthly] [--verify] [--no-daemon]
+        [--no-snapshot]
 
 Example:
     uv run scripts/archive.py outputs/ journal.beancount 2024-01-01 2024-12-31
+
+All reports for a period share one pass over the ledger: the entries are
+clamped to [open_date, close_date) once, every query runs over that view,
+and the text files are rendered in parallel.
+
+With --state, per-account aggregates are checkpointed to FILE and later runs
+only fold in transactions dated after the checkpoint. Directives added before
+the checkpoint, or balance assertions that change what an earlier pad
+inserts, make the run recompute from scratch. --verify additionally
+reruns every query on its own against the full ledger and fails if any
+report differs.
+
+With --period, the range from open_date to close_date is split into periods
+and every period's reports are written to <output_dir>/<period close date>/
+in a single sweep over the ledger, e.g. to rebuild the git history of net
+worth month by month.
+
+If the ledger daemon (scripts/ledgerd.py) is running, the whole run is handed
+to it before beancount is even imported, and it reuses the journal it keeps
+loaded; pass --no-daemon to load the journal here regardless.
+
+Otherwise the journal is loaded from its snapshot (see scripts/snapshot.py)
+when none of its files or plugins changed since the last run; pass
+--no-snapshot to parse it regardless.
 """
 
 import argparse
+import bisect
+import datetime
+import filecmp
+import hashlib
 import os
+import pickle
+import sys
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Hand the run to the daemon before importing beancount and beanquery below,
+# which would otherwise cost more than the whole forwarded run
+if __name__ == '__main__' and '--no-daemon' not in sys.argv:
+    try:
+        import ledgerd
+    except ImportError:
+        ledgerd = None
+    status = ledgerd and ledgerd.forward('archive', sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+import beanquery  # noqa: E402
+from beancount import loader  # noqa: E402
+from beancount.core import data, flags  # noqa: E402
+from beancount.core.amount import Amount  # noqa: E402
+from beancount.core.number import ZERO  # noqa: E402
+from beancount.ops import summarize  # noqa: E402
+from beanquery.query_render import render_text  # noqa: E402
 
-import beanquery
-from beanquery.query_render import render_text
+import price_index  # noqa: E402
+from append_only import file_signature, padding_key, prefix_unchanged  # noqa: E402
+
+# Bump whenever the layout of the checkpoint state changes
+STATE_VERSION = 2
 
 
 def execute_sql_to_file(context: beanquery.Connection, sql: str, filepath: str):
     """Execute SQL query and write results to a text file."""
     cursor = context.execute(sql)
-    rtypes = cursor.description
-    rrows = cursor.fetchall()
+    render_to_file(cursor.description, cursor.fetchall(), context.options['dcontext'], filepath)
+
+
+def render_to_file(rtypes, rrows, dcontext, filepath: str):
+    """Render query results as a text table into filepath."""
     with open(filepath, 'w') as out:
-        render_text(rtypes, rrows, context.options['dcontext'], out)
+        render_text(rtypes, rrows, dcontext, out)
+
 
+def period_clause(open_date: str, close_date: str, clamped: bool = False) -> str:
+    """FROM clause restricting a query to the reporting period.
 
-def balance_sheet_sql(currency: str, open_date: str, close_date: str) -> str:
+    Entries already passed through clamp_entries() need no clause.
+    """
+    if clamped:
+        return ''
+    return f'FROM OPEN ON {open_date} CLOSE ON {close_date} CLEAR'
+
+
+def balance_sheet_sql(currency: str, open_date: str, close_date: str, clamped: bool = False) -> str:
     """Generate SQL for balance sheet in a specific currency."""
     value = f"round(sum(number(convert(value(position, {close_date}), {currency}, {close_date}))), 2)"
     cost = f"round(sum(number(convert(cost(position), {currency}, date))), 2)"
@@ -40,14 +113,14 @@ def balance_sheet_sql(currency: str, open_date: str, close_date: str) -> str:
             {cost} AS cost,
             {value} - {cost} AS unrealized_gain,
             {currency} AS currency
-        FROM OPEN ON {open_date} CLOSE ON {close_date} CLEAR
+        {period_clause(open_date, close_date, clamped)}
         GROUP BY account, currency
         HAVING round(sum(number), 2) != 0
         ORDER BY account, currency;
     '''
 
 
-def holdings_sql(currency: str, open_date: str, close_date: str) -> str:
+def holdings_sql(currency: str, open_date: str, close_date: str, clamped: bool = False) -> str:
     """Generate SQL for holdings breakdown."""
     return f'''
         SELECT
@@ -58,7 +131,7 @@ def holdings_sql(currency: str, open_date: str, close_date: str) -> str:
             round(sum(number(convert(value(position, {close_date}), {currency}, {close_date}))) / sum(number), 2) AS price,
             round(sum(number(convert(cost(position), {currency}, date))), 2) AS book_val,
             round(sum(number(convert(value(position, {close_date}), {currency}, {close_date}))), 2) AS mkt_val
-        FROM OPEN ON {open_date} CLOSE ON {close_date} CLEAR
+        {period_clause(open_date, close_date, clamped)}
         WHERE account ~ 'Assets' OR account ~ 'Liabilities'
         GROUP BY account, currency
         HAVING round(sum(number), 2) != 0
@@ -66,54 +139,347 @@ def holdings_sql(currency: str, open_date: str, close_date: str) -> str:
     '''
 
 
-def equity_sql(open_date: str, close_date: str) -> str:
+def equity_sql(open_date: str, close_date: str, clamped: bool = False) -> str:
     """Generate SQL for single-line net worth."""
     return f'''
         SELECT
             only('GBP', sum(convert(position, 'GBP', {close_date}))) AS gbp,
             only('USD', sum(convert(position, 'USD', {close_date}))) AS usd
-        FROM OPEN ON {open_date} CLOSE ON {close_date} CLEAR
+        {period_clause(open_date, close_date, clamped)}
         WHERE account ~ 'Assets' OR account ~ 'Liabilities'
     '''
 
 
-def main():
+def report_queries(open_date: str, close_date: str, clamped: bool = False) -> list[tuple[str, str]]:
+    """Return (filename, SQL) for every archived report."""
+    return [
+        ('balance-sheet.txt', balance_sheet_sql("'GBP'", open_date, close_date, clamped)),
+        ('holdings.txt', holdings_sql("'GBP'", open_date, close_date, clamped)),
+        ('networth.txt', equity_sql(open_date, close_date, clamped)),
+    ]
+
+
+def write_reports(context: beanquery.Connection, output_dir: str, open_date: str, close_date: str):
+    """Run every report query on its own and write the text files to output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
+    for filename, sql in report_queries(open_date, close_date):
+        execute_sql_to_file(context, sql, os.path.join(output_dir, filename))
+
+
+def connect(entries: data.Entries, errors: list, options: dict) -> beanquery.Connection:
+    """Create a query connection over already-loaded entries."""
+    return beanquery.connect('beancount:', entries=entries, errors=errors, options=options)
+
+
+def clamp_entries(entries: data.Entries, options: dict, open_date: datetime.date,
+                  close_date: datetime.date) -> data.Entries:
+    """Apply OPEN ON / CLOSE ON / CLEAR once, exactly as beanquery does per query.
+
+    Price directives are carried over from the unclamped ledger so that
+    convert() and value() see the same price map as a FROM-clause query.
+    """
+    clamped, _ = summarize.open_opt(entries, open_date, options)
+    clamped, _ = summarize.close_opt(clamped, close_date, options)
+    clamped, _ = summarize.clear_opt(clamped, None, options)
+    view = [entry for entry in clamped if not isinstance(entry, data.Price)]
+    view.extend(entry for entry in entries if isinstance(entry, data.Price))
+    return data.sorted(view)
+
+
+def run_report_batch(entries: data.Entries, errors: list, options: dict, output_dir: str,
+                     open_date: str, close_date: str, workers: int | None = None):
+    """Run every report over one clamped view of the ledger.
+
+    The ledger is summarized for the period once and shared by all queries,
+    then the text files are rendered concurrently. Price lookups go through
+    the array-backed PriceIndex.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    view = clamp_entries(
+        entries, options,
+        datetime.date.fromisoformat(open_date), datetime.date.fromisoformat(close_date),
+    )
+
+    with price_index.installed(), ThreadPoolExecutor(max_workers=workers) as pool:
+        context = connect(view, errors, options)
+        dcontext = context.options['dcontext']
+        futures = []
+        for filename, sql in report_queries(open_date, close_date, clamped=True):
+            cursor = context.execute(sql)
+            futures.append(pool.submit(
+                render_to_file, cursor.description, cursor.fetchall(), dcontext,
+                os.path.join(output_dir, filename),
+            ))
+        for future in futures:
+            future.result()
+
+
+def new_state(journal_file: str, open_date: datetime.date) -> dict:
+    """Return an empty checkpoint with nothing folded in yet."""
+    return {
+        'version': STATE_VERSION,
+        'journal': os.path.abspath(journal_file),
+        'open_date': open_date,
+        'checkpoint': datetime.date.min,
+        'plugins': None,
+        'files': {},
+        # Hash of the padding transactions dated before the checkpoint
+        'padding': hashlib.sha256().hexdigest(),
+        # (bucket date, account, currency, cost) -> units
+        'balances': {},
+    }
+
+
+def load_state(path: str, journal_file: str, open_date: datetime.date,
+               close_date: datetime.date, options: dict) -> dict:
+    """Load the checkpoint at path, or start afresh if it cannot be reused.
+
+    A checkpoint is reusable when it was taken for the same journal and open
+    date, no later than close_date, under the same plugins, and every file it
+    was built from has only been appended to since.
+    """
+    fresh = new_state(journal_file, open_date)
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return fresh
+    if (state.get('version') != STATE_VERSION
+            or state['journal'] != fresh['journal']
+            or state['open_date'] != open_date
+            or state['checkpoint'] > close_date
+            or state['plugins'] != repr(options['plugin'])):
+        return fresh
+    for filename, (size, _, digest) in state['files'].items():
+        if not prefix_unchanged(filename, size, digest):
+            return fresh
+    return state
+
+
+def save_state(path: str, state: dict, options: dict):
+    """Record the files and plugins the checkpoint was built from and save it."""
+    state['plugins'] = repr(options['plugin'])
+    state['files'] = {filename: file_signature(filename) for filename in options['include']}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def add_transactions(state: dict, transactions: list[data.Transaction], close_date: datetime.date):
+    """Fold transactions, all dated in [checkpoint, close_date), into the state.
+
+    Postings are summed per (date, account, currency, cost), which is all the
+    report SQL depends on; everything before the open date shares one bucket
+    because OPEN summarizes it anyway.
+    """
+    before_open = state['open_date'] - datetime.timedelta(days=1)
+    balances = state['balances']
+    for entry in transactions:
+        bucket = max(entry.date, before_open)
+        for posting in entry.postings:
+            key = (bucket, posting.account, posting.units.currency, posting.cost)
+            balances[key] = balances.get(key, ZERO) + posting.units.number
+    state['checkpoint'] = close_date
+
+
+def fold_transactions(state: dict, entries: data.Entries, close_date: datetime.date) -> bool:
+    """Fold the ledger's transactions dated in [checkpoint, close_date) into the state.
+
+    Returns False, folding nothing, if any
+    directive dated before the checkpoint was added since it was taken, or
+    if a padding transaction before it changed: a balance assertion appended
+    later, whatever its date, can change the amount an earlier pad inserts.
+    """
+    checkpoint = state['checkpoint']
+    known_lines = {filename: lines for filename, (_, lines, _) in state['files'].items()}
+    folded_padding = hashlib.sha256()
+    padding = hashlib.sha256()
+    transactions = []
+
+    for entry in entries:
+        if entry.date >= close_date:
+            break
+        is_transaction = isinstance(entry, data.Transaction)
+        if is_transaction and entry.flag == flags.FLAG_PADDING:
+            padding.update(padding_key(entry))
+            if entry.date < checkpoint:
+                folded_padding.update(padding_key(entry))
+        if entry.date < checkpoint:
+            filename = entry.meta.get('filename')
+            # Other directives generated by plugins follow from the checked ones
+            if not is_transaction and (filename is None or filename.startswith('<')):
+                continue
+            if entry.meta.get('lineno', 0) > known_lines.get(filename, -1):
+                return False
+        elif is_transaction:
+            transactions.append(entry)
+    if folded_padding.hexdigest() != state['padding']:
+        return False
+
+    add_transactions(state, transactions, close_date)
+    state['padding'] = padding.hexdigest()
+    return True
+
+
+def checkpoint_entries(state: dict, entries: data.Entries) -> data.Entries:
+    """Rebuild a compact ledger from the state plus all non-transaction entries."""
+    postings = defaultdict(list)
+    for (date, account, currency, cost), number in state['balances'].items():
+        if number != ZERO:
+            postings[date].append(data.Posting(account, Amount(number, currency), cost, None, None, None))
+
+    meta = data.new_metadata('<archive-checkpoint>', 0)
+    compact = [entry for entry in entries if not isinstance(entry, data.Transaction)]
+    for date, date_postings in postings.items():
+        compact.append(data.Transaction(
+            meta, date, flags.FLAG_SUMMARIZE, None, 'Archive checkpoint',
+            data.EMPTY_SET, data.EMPTY_SET, date_postings,
+        ))
+    return data.sorted(compact)
+
+
+def period_closes(open_date: datetime.date, close_date: datetime.date, period: str) -> list[datetime.date]:
+    """Return the (exclusive) close date of every period in the range.
+
+    Periods start at open_date and step by a day, a week or a calendar month;
+    the last period ends at close_date.
+    """
+    closes = []
+    current = open_date
+    while True:
+        if period == 'daily':
+            current += datetime.timedelta(days=1)
+        elif period == 'weekly':
+            current += datetime.timedelta(weeks=1)
+        else:
+            year, month = divmod(current.month, 12)
+            current = datetime.date(current.year + year, month + 1, 1)
+        if current >= close_date:
+            break
+        closes.append(current)
+    closes.append(close_date)
+    return closes
+
+
+def backfill(entries: data.Entries, errors: list, options: dict, journal_file: str, output_dir: str,
+             open_date: str, close_date: str, period: str, workers: int | None = None) -> list[str]:
+    """Write reports for every period in the range in one sweep over the ledger.
+
+    Running balances are carried from one period to the next in a checkpoint
+    state, so each transaction is folded in exactly once; each period's
+    compact ledger is then reported on by a pool of worker processes.
+    Returns the close date of every period written.
+    """
+    first = datetime.date.fromisoformat(open_date)
+    closes = period_closes(first, datetime.date.fromisoformat(close_date), period)
+    others = [entry for entry in entries if not isinstance(entry, data.Transaction)]
+    transactions = [entry for entry in entries if isinstance(entry, data.Transaction)]
+    state = new_state(journal_file, first)
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        start = 0
+        for close in closes:
+            end = bisect.bisect_left(transactions, close, lo=start, key=lambda entry: entry.date)
+            add_transactions(state, transactions[start:end], close)
+            start = end
+            futures.append(pool.submit(
+                run_report_batch, checkpoint_entries(state, others), errors, options,
+                os.path.join(output_dir, close.isoformat()), open_date, close.isoformat(), 1,
+            ))
+            written.append(close.isoformat())
+        for future in futures:
+            future.result()
+    return written
+
+
+def verify_reports(context: beanquery.Connection, output_dir: str, open_date: str, close_date: str) -> list[str]:
+    """Recompute every report from scratch and return the names that differ."""
+    with tempfile.TemporaryDirectory() as full_dir:
+        write_reports(context, full_dir, open_date, close_date)
+        return [
+            filename for filename, _ in report_queries(open_date, close_date)
+            if not filecmp.cmp(os.path.join(full_dir, filename), os.path.join(output_dir, filename), shallow=False)
+        ]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Generate archive reports from a Beancount ledger"
+        prog='archive.py', description="Generate archive reports from a Beancount ledger"
     )
     parser.add_argument('output_dir', help='Directory to write reports to')
     parser.add_argument('journal_file', help='Path to the beancount journal')
     parser.add_argument('open_date', help='Start date (YYYY-MM-DD)')
     parser.add_argument('close_date', help='End date (YYYY-MM-DD)')
-    args = parser.parse_args()
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Threads (processes with --period) used to render reports')
+    parser.add_argument('--state', help='Checkpoint file for incremental runs')
+    parser.add_argument('--period', choices=['daily', 'weekly', 'monthly'],
+                        help='Backfill one set of reports per period in the range')
+    parser.add_argument('--verify', action='store_true',
+                        help='Check the reports against a full per-query recompute')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Load the journal here even if the ledger daemon is running')
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help='Parse the journal even if its snapshot is current')
+    args = parser.parse_args(argv)
+    if args.period and args.state:
+        parser.error('--period cannot be combined with --state')
+    return args
 
-    os.makedirs(args.output_dir, exist_ok=True)
 
-    context = beanquery.connect(None)
-    context.attach('beancount:' + args.journal_file)
+def run(args: argparse.Namespace, entries: data.Entries, errors: list, options: dict):
+    """Write (and optionally verify) the reports asked for by args from a loaded ledger."""
+    if args.period:
+        closes = backfill(entries, errors, options, args.journal_file, args.output_dir,
+                          args.open_date, args.close_date, args.period, args.workers)
+        print(f"Reports for {len(closes)} periods written to {args.output_dir}/")
+        if args.verify:
+            context = connect(entries, errors, options)
+            for close in closes:
+                mismatched = verify_reports(context, os.path.join(args.output_dir, close), args.open_date, close)
+                if mismatched:
+                    print(f"Reports for {close} differ from a full recompute: {', '.join(mismatched)}")
+                    sys.exit(1)
+            print("Verified: reports match a full recompute")
+        return
 
-    # Balance sheet
-    execute_sql_to_file(
-        context,
-        balance_sheet_sql("'GBP'", args.open_date, args.close_date),
-        os.path.join(args.output_dir, 'balance-sheet.txt'),
-    )
+    if args.state:
+        open_date = datetime.date.fromisoformat(args.open_date)
+        close_date = datetime.date.fromisoformat(args.close_date)
+        state = load_state(args.state, args.journal_file, open_date, close_date, options)
+        if not fold_transactions(state, entries, close_date):
+            print("Ledger history changed since the checkpoint; recomputing from scratch")
+            state = new_state(args.journal_file, open_date)
+            fold_transactions(state, entries, close_date)
+        report_entries = checkpoint_entries(state, entries)
+    else:
+        report_entries = entries
 
-    # Holdings breakdown
-    execute_sql_to_file(
-        context,
-        holdings_sql("'GBP'", args.open_date, args.close_date),
-        os.path.join(args.output_dir, 'holdings.txt'),
-    )
+    run_report_batch(report_entries, errors, options, args.output_dir,
+                     args.open_date, args.close_date, args.workers)
+    if args.state:
+        save_state(args.state, state, options)
+    print(f"Reports written to {args.output_dir}/")
 
-    # Single-line net worth
-    execute_sql_to_file(
-        context,
-        equity_sql(args.open_date, args.close_date),
-        os.path.join(args.output_dir, 'networth.txt'),
-    )
+    if args.verify:
+        mismatched = verify_reports(connect(entries, errors, options), args.output_dir, args.open_date, args.close_date)
+        if mismatched:
+            print(f"Reports differ from a full recompute: {', '.join(mismatched)}")
+            sys.exit(1)
+        print("Verified: reports match a full recompute")
 
-    print(f"Reports written to {args.output_dir}/")
+
+def main():
+    args = parse_args()
+    if args.no_snapshot:
+        run(args, *loader.load_file(args.journal_file))
+        return
+    import snapshot
+
+    run(args, *snapshot.load_file(args.journal_file))
 
 
 if __name__ == '__main__':
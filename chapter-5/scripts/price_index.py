@@ -0,0 +1,132 @@
+"""Array-backed price index for convert()/value() lookups.
+
+beancount's PriceMap keeps a list of (date, rate) tuples per currency pair and
+get_price() bisects it with a Python-level key function on every call. The
+archive queries call convert() for every posting, so with years of daily
+prices that search dominates.
+
+PriceIndex is a drop-in PriceMap (same dict contents, so any code reading it
+directly keeps working) that also keeps, per pair, a sorted array of date
+ordinals searched with the C bisect. Pairs with no direct price can be
+triangulated through intermediate currencies (e.g. USD, GBP); triangulated
+series are built once and memoized.
+
+Usage:
+    with price_index.installed():
+        ...  # beancount/beanquery price lookups now go through PriceIndex
+"""
+
+import bisect
+import contextlib
+import datetime
+from array import array
+
+from beancount.core import data, prices
+from beancount.core.number import ONE
+
+# The stock implementations, kept so installed() can restore them
+_build_price_map = prices.build_price_map
+_get_price = prices.get_price
+
+
+def _compose(first: list, second: list) -> list:
+    """Multiply two (date, rate) series, forward-filling each to the other's dates."""
+    composed = []
+    i = j = 0
+    rate1 = rate2 = None
+    while i < len(first) or j < len(second):
+        if j == len(second) or (i < len(first) and first[i][0] <= second[j][0]):
+            date, rate1 = first[i]
+            i += 1
+        else:
+            date, rate2 = second[j]
+            j += 1
+        if rate1 is None or rate2 is None:
+            continue
+        if composed and composed[-1][0] == date:
+            composed[-1] = (date, rate1 * rate2)
+        else:
+            composed.append((date, rate1 * rate2))
+    return composed
+
+
+class PriceIndex(dict):
+    """PriceMap with bisectable date arrays and memoized triangulation."""
+
+    def __init__(self, price_map: prices.PriceMap, via: tuple[str, ...] = ()):
+        super().__init__(price_map)
+        self.forward_pairs = list(getattr(price_map, 'forward_pairs', []))
+        self.via = tuple(via)
+        self._ordinals = {}
+        self._unreachable = set()
+        for pair, series in price_map.items():
+            self._ordinals[pair] = array('l', (date.toordinal() for date, _ in series))
+
+    @classmethod
+    def from_entries(cls, entries: data.Entries, via: tuple[str, ...] = ()) -> 'PriceIndex':
+        """Build the index from the Price directives in entries."""
+        return cls(_build_price_map(entries), via)
+
+    def __missing__(self, pair):
+        series = self._triangulate(pair)
+        if series is None:
+            raise KeyError(pair)
+        self[pair] = series
+        self._ordinals[pair] = array('l', (date.toordinal() for date, _ in series))
+        return series
+
+    def _triangulate(self, pair) -> list | None:
+        if pair in self._unreachable:
+            return None
+        base, quote = pair
+        for via in self.via:
+            if via == base or via == quote:
+                continue
+            first = dict.get(self, (base, via))
+            second = dict.get(self, (via, quote))
+            if first and second:
+                return _compose(first, second)
+        self._unreachable.add(pair)
+        return None
+
+    def lookup(self, base: str, quote: str, date: datetime.date | None = None):
+        """Return the latest (date, rate) on or before date, like get_price()."""
+        if base == quote:
+            return None, ONE
+        pair = (base, quote)
+        try:
+            series = self[pair]
+        except KeyError:
+            return None, None
+        if date is None:
+            return series[-1]
+        index = bisect.bisect_right(self._ordinals[pair], date.toordinal())
+        if index == 0:
+            return None, None
+        return series[index - 1]
+
+
+def get_price(price_map, base_quote, date=None):
+    """prices.get_price() replacement that uses PriceIndex.lookup when it can."""
+    if isinstance(price_map, PriceIndex):
+        base, quote = prices.normalize_base_quote(base_quote)
+        return price_map.lookup(base, quote, date)
+    return _get_price(price_map, base_quote, date)
+
+
+@contextlib.contextmanager
+def installed(via: tuple[str, ...] = ()):
+    """Route beancount's price map building and lookups through PriceIndex.
+
+    Anything that builds a price map via beancount.core.prices while this is
+    active (beanquery's convert()/value(), fava, ...) gets a PriceIndex. With
+    the default via=() results are identical to the stock lookups; pass e.g.
+    via=('USD', 'GBP') to also convert between pairs with no direct price.
+    """
+    prices.build_price_map = lambda entries: PriceIndex.from_entries(entries, via)
+    prices.get_price = get_price
+    try:
+        yield
+    finally:
+        prices.build_price_map = _build_price_map
+        prices.get_price = _get_price
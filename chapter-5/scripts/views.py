@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Load several views of one ledger from a single parse.
+
+journal-gross.beancount and journal-net.beancount include the same src/
+files and differ only in a few directives and the net view's rename plugin.
+Loading them one after the other parses and books every source file twice.
+load_views() instead:
+
+  1. parses each file of the views' include closures once;
+  2. books the files every view includes once, when the views' own files
+     hold no transactions or booking methods and their booking options
+     agree, and otherwise books each view separately;
+  3. merges each view's own directives into the shared entries in the
+     loader's order, then runs that view's plugin chain and validation.
+
+Views share the parsed and booked entry objects; plugins that leave an
+entry alone (including chapter5_plugins/rename_accounts.py) pass the same
+object through, so a second view only costs its own entry list, options
+and the entries its plugins rewrite. The shared entries are treated as
+immutable: a plugin that mutated an entry in place would leak the change
+into the other views.
+
+Each view comes out as loader.load_file() would return it.
+
+Usage (from chapter-5/):
+    python scripts/views.py journal-gross.beancount journal-net.beancount [--verify]
+
+--verify also loads every view on its own and fails if any differs. It
+then loads the views both ways again, once the first loads have imported
+the plugins, and compares the time each takes and the memory its result
+retains.
+"""
+
+import argparse
+import copy
+import gc
+import glob
+import heapq
+import os
+import sys
+import time
+import tracemalloc
+
+from beancount import loader
+from beancount.core import data
+from beancount.ops import validation
+from beancount.parser import booking, parser
+
+# Options that change how a transaction is booked
+BOOKING_OPTIONS = ('booking_method', 'inferred_tolerance_default', 'inferred_tolerance_multiplier',
+                   'infer_tolerance_from_cost', 'use_precise_interpolation')
+
+
+def parse_view(journal: str, parsed: dict) -> tuple[list[str], list, dict]:
+    """Parse a view's include closure the way the loader does, reusing parsed files.
+
+    parsed maps absolute paths to parser.parse_file() results and is filled
+    in as files are parsed. Returns the closure in parse order, the parse
+    errors and the view's aggregated options.
+    """
+    files, errors, other_options = [], [], []
+    options = None
+    queue = [os.path.normpath(os.path.abspath(journal))]
+    while queue:
+        filename = queue.pop(0)
+        if filename in files:
+            errors.append(loader.LoadError(data.new_metadata('<load>', 0),
+                                           f'Duplicate filename parsed: "{filename}"'))
+            continue
+        if not os.path.exists(filename):
+            errors.append(loader.LoadError(data.new_metadata('<load>', 0), f'File "{filename}" does not exist'))
+            continue
+        files.append(filename)
+        if filename not in parsed:
+            parsed[filename] = parser.parse_file(filename)
+        _, file_errors, file_options = parsed[filename]
+        errors.extend(file_errors)
+        if options is None:
+            # The loader updates the top file's options in place
+            options = dict(file_options, dcontext=copy.deepcopy(file_options['dcontext']))
+        else:
+            other_options.append(file_options)
+
+        cwd = os.path.dirname(filename)
+        for include in file_options['include']:
+            matches = glob.glob(os.path.join(cwd, include), recursive=True)
+            if not matches:
+                errors.append(loader.LoadError(data.new_metadata('<load>', 0),
+                                               f'File glob "{include}" does not match any files'))
+            queue.extend(os.path.normpath(match) for match in matches)
+
+    options['include'] = sorted(files)
+    return files, errors, loader.aggregate_options_map(options, other_options)
+
+
+def sorted_entries(files: list[str], parsed: dict) -> list:
+    """The entries of files in parse order, sorted as the loader sorts them."""
+    entries = [entry for filename in files for entry in parsed[filename][0]]
+    entries.sort(key=data.entry_sortkey)
+    return entries
+
+
+def shared_files(views: list[tuple], parsed: dict) -> list[str] | None:
+    """Files every view includes, in parse order, if they can be booked once for all views."""
+    common = set(views[0][0]).intersection(*(files for files, _, _ in views[1:]))
+    order = [filename for filename in views[0][0] if filename in common]
+    for files, _, options in views:
+        if [filename for filename in files if filename in common] != order:
+            return None
+        if any(options[name] != views[0][2][name] for name in BOOKING_OPTIONS):
+            return None
+        for filename in files:
+            if filename not in common and any(
+                    isinstance(entry, data.Transaction) or (isinstance(entry, data.Open) and entry.booking)
+                    for entry in parsed[filename][0]):
+                return None
+    return order
+
+
+def finish_view(entries: list, errors: list, options: dict) -> tuple:
+    """Run a view's plugins and validation on its booked entries, as loader._load does."""
+    saved_pythonpath = list(sys.path)
+    try:
+        sys.path[0:0] = options.get('pythonpath', [])
+        entries, errors = loader.run_transformations(entries, errors, options, None)
+    finally:
+        sys.path[:] = saved_pythonpath
+    errors.extend(validation.validate(entries, options))
+    options['input_hash'] = loader.compute_input_hash(options['include'])
+    return entries, errors, options
+
+
+def load_views(journals: list[str], stats: dict | None = None) -> dict[str, tuple]:
+    """Load each journal like loader.load_file(), parsing shared files only once.
+
+    Returns journal -> (entries, errors, options). stats, if given, receives
+    'files' (files parsed), 'shared' (files booked once for all views, or
+    None if every view was booked on its own).
+    """
+    parsed = {}
+    views = [parse_view(journal, parsed) for journal in journals]
+    shared = shared_files(views, parsed) if len(views) > 1 else None
+    if stats is not None:
+        stats.update(files=len(parsed), shared=None if shared is None else len(shared))
+
+    if shared is not None:
+        shared_entries, shared_errors = booking.book(sorted_entries(shared, parsed), views[0][2])
+
+    results = {}
+    for journal, (files, errors, options) in zip(journals, views):
+        if shared is None:
+            entries, booking_errors = booking.book(sorted_entries(files, parsed), options)
+        else:
+            rank = {filename: index for index, filename in enumerate(files)}
+
+            def sortkey(entry):
+                return data.entry_sortkey(entry), rank[entry.meta['filename']]
+
+            own = sorted_entries([filename for filename in files if filename not in shared], parsed)
+            own, booking_errors = booking.book(own, options)
+            entries = list(heapq.merge(own, shared_entries, key=sortkey))
+            booking_errors = shared_errors + booking_errors
+        results[journal] = finish_view(entries, errors + booking_errors, options)
+    return results
+
+
+def measure(load) -> tuple[float, int]:
+    """Milliseconds load() takes and bytes its result keeps allocated.
+
+    Run after a first load, so that neither count includes importing
+    plugins or filling module-level caches.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return elapsed * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load several views of a ledger from a single parse")
+    parser.add_argument('journals', nargs='+', help='Journal files of the views')
+    parser.add_argument('--verify', action='store_true',
+                        help='Also load every view on its own and compare entries and memory')
+    args = parser.parse_args()
+
+    loader.initialize(use_cache=False)
+    stats = {}
+    start = time.perf_counter()
+    views = load_views(args.journals, stats)
+    elapsed = time.perf_counter() - start
+    shared = f"{stats['shared']} booked once" if stats['shared'] is not None else 'each view booked separately'
+    print(f"{len(views)} views from {stats['files']} parsed files ({shared}) in {elapsed * 1000:.1f} ms")
+
+    seen = {}
+    for journal, (entries, _, _) in views.items():
+        for entry in entries:
+            seen[id(entry)] = seen.get(id(entry), 0) + 1
+    for journal, (entries, errors, _) in views.items():
+        common = sum(1 for entry in entries if seen[id(entry)] > 1)
+        print(f"  {journal}: {len(entries)} entries ({common} shared with other views), {len(errors)} error(s)")
+
+    if args.verify:
+        separate = {journal: loader.load_file(journal) for journal in args.journals}
+        failed = False
+        for journal, (entries, errors, _) in views.items():
+            expected, expected_errors, _ = separate[journal]
+            if entries != expected or [e.message for e in errors] != [e.message for e in expected_errors]:
+                print(f"{journal} differs from loading it on its own")
+                failed = True
+        if failed:
+            sys.exit(1)
+        print("All views match separate loads")
+
+        del views, separate, seen
+        shared_ms, shared_size = measure(lambda: load_views(args.journals))
+        separate_ms, separate_size = measure(lambda: {journal: loader.load_file(journal)
+                                                      for journal in args.journals})
+        print(f"Loading again: {shared_ms:.1f} ms and {shared_size / 2**20:.2f} MB retained shared, "
+              f"{separate_ms:.1f} ms and {separate_size / 2**20:.2f} MB separate")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Load the combined household view from the members' own views.
+
+total/journal-net.beancount includes both people's src/journal.beancount and
+renames the inter-person transfer accounts with rename_accounts, so opening
+it parses, books and checks both ledgers from scratch even when only one of
+them changed. load_household() instead:
+
+  1. loads each member's view (lalit/journal-net.beancount, ...) from a
+     cache in .cache/household/, keyed by the files of its include closure
+     and the beancount version;
+     members that changed are loaded in parallel, so a cold load costs about
+     as much as the slowest member;
+  2. streams the members' entries through a k-way merge in the loader's
+     order, taking the common/ entries from the first member only, dropping
+     directives that live in a member's top-level journal, adding the
+     household journal's own directives and applying its rename_accounts
+     mapping on the way;
+  3. re-runs validation on the merged entries and caches the result, keyed
+     by the household's files, its plugin modules and the beancount version,
+     so an unchanged household costs one unpickle.
+
+The result is what loader.load_file() returns for the household journal.
+Where the shortcut could differ - the household journal has other plugins,
+transactions or balance checks of its own, a member view has plugins or
+options the household journal does not, or a member's pad, balance or
+at-cost booking touches an account the other member or the renames also
+touch - it falls back to a full load, which is cached the same way.
+
+Usage (from chapter-6/):
+    python scripts/household.py total/journal-net.beancount [--jobs N] [--no-cache] [--verify]
+
+--verify also runs a plain loader.load_file() and fails if the entries or
+errors differ.
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import hashlib
+import heapq
+import os
+import pickle
+import re
+import sys
+import time
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from beancount import __version__ as beancount_version
+from beancount import loader
+from beancount.core import account, data
+from beancount.ops import validation
+from beancount.parser import parser
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'scripts'))
+
+import snapshot  # noqa: E402
+
+# Bump whenever the layout of the cached results changes
+CACHE_VERSION = 2
+CACHE_DIR = REPO_ROOT / '.cache' / 'household'
+
+RENAME_PLUGIN = 'beancount_reds_plugins.rename_accounts.rename_accounts'
+INCLUDE = re.compile(r'^include\s+"([^"]*)"', re.MULTILINE)
+
+# Options that always differ between a member view and the household journal
+PER_FILE_OPTIONS = ('filename', 'include', 'dcontext', 'plugin')
+
+# Options the balance check of a transaction depends on
+TOLERANCE_OPTIONS = ('inferred_tolerance_default', 'inferred_tolerance_multiplier', 'infer_tolerance_from_cost')
+
+
+def include_order(journal: str) -> list[str]:
+    """Absolute paths of journal's include closure, in the order the loader parses them."""
+    order = []
+    queue = [os.path.normpath(os.path.abspath(journal))]
+    while queue:
+        filename = queue.pop(0)
+        if filename in order or not os.path.exists(filename):
+            continue
+        order.append(filename)
+        with open(filename, encoding='utf-8') as f:
+            includes = INCLUDE.findall(f.read())
+        cwd = os.path.dirname(filename)
+        for pattern in includes:
+            queue.extend(os.path.normpath(match) for match in glob.glob(os.path.join(cwd, pattern), recursive=True))
+    return order
+
+
+def file_stamps(files) -> dict:
+    stamps = {}
+    for path in files:
+        stat = os.stat(path)
+        stamps[path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def cache_path(cache_dir: Path, journal: str) -> Path:
+    return cache_dir / (hashlib.sha256(journal.encode()).hexdigest()[:16] + '.pickle')
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Suspend the cyclic garbage collector.
+
+    (Un)pickling a ledger allocates millions of objects, none of them
+    garbage, and the collections they trigger cost more than the pickling.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_cache(path: Path, stamps: dict, check_only: bool = False):
+    """Return the cached (entries, errors, options) if it was saved for stamps.
+
+    With check_only, return True instead, without unpickling the entries.
+    """
+    try:
+        with open(path, 'rb') as f, gc_paused():
+            if pickle.load(f) != (CACHE_VERSION, beancount_version, stamps):
+                return None
+            return True if check_only else pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+
+def write_cache(path: Path, stamps: dict, result: tuple):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f, gc_paused():
+        pickle.dump((CACHE_VERSION, beancount_version, stamps), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def account_renamer(config: str):
+    """rename_accounts' mapping as a memoized function of one account name.
+
+    Every pattern is applied in turn with re.subn, exactly as the plugin does.
+    """
+    patterns = [(re.compile(pattern), replacement) for pattern, replacement in literal_eval(config).items()]
+    renamed = {}
+
+    def rename(name: str) -> str:
+        new_name = renamed.get(name)
+        if new_name is None:
+            new_name = name
+            for pattern, replacement in patterns:
+                new_name = pattern.sub(replacement, new_name)
+            renamed[name] = new_name
+        return new_name
+
+    return rename
+
+
+def rename_entry(entry: data.Directive, rename) -> data.Directive:
+    """Apply rename to an entry the way the rename_accounts plugin does."""
+    if isinstance(entry, data.Transaction):
+        postings = [posting._replace(account=rename(posting.account)) if rename(posting.account) != posting.account
+                    else posting for posting in entry.postings]
+        if any(new is not old for new, old in zip(postings, entry.postings)):
+            return entry._replace(postings=postings)
+        return entry
+    if isinstance(entry, data.Pad):
+        return entry._replace(account=rename(entry.account), source_account=rename(entry.source_account))
+    if hasattr(entry, 'account') and rename(entry.account) != entry.account:
+        return entry._replace(account=rename(entry.account))
+    return entry
+
+
+@dataclass
+class Household:
+    """How a household journal is assembled from its members' views."""
+
+    journal: str                    # absolute path of the household journal
+    order: list[str]                # its include closure, in parse order
+    members: list[str]              # absolute paths of the member views
+    owners: dict[str, int | None] = field(default_factory=dict)   # file -> member providing its entries
+    plugins: list[str] = field(default_factory=list)              # source files of the household's plugins
+    top: tuple = ()                 # parse result of the household journal itself
+    renames: str | None = None      # rename_accounts configuration
+    reason: str | None = None       # why the household must be loaded in full, if it must
+
+
+def plan_household(journal: str) -> Household:
+    """Find the member views behind a household journal's includes.
+
+    A member is an include X/src/journal.beancount next to an X/<journal
+    name> view that includes it; every other include must be shared by all
+    members.
+    """
+    journal = os.path.normpath(os.path.abspath(journal))
+    top = parser.parse_file(journal)
+    cwd = os.path.dirname(journal)
+    includes = [os.path.normpath(os.path.join(cwd, include)) for include in top[2]['include']]
+    household = Household(journal, include_order(journal), [], top=top)
+
+    member_closures = []
+    shared = []
+    for include in includes:
+        view = os.path.join(os.path.dirname(os.path.dirname(include)), os.path.basename(journal))
+        closure = include_order(view) if view != journal and os.path.exists(view) else []
+        if include in closure:
+            household.members.append(view)
+            member_closures.append(closure)
+        else:
+            shared.append(include)
+
+    if not household.members:
+        household.reason = 'no member views found'
+        return household
+    shared_files = set()
+    for include in shared:
+        shared_files.update(include_order(include))
+    for index, closure in enumerate(member_closures):
+        household.owners[closure[0]] = None
+        for filename in closure[1:]:
+            household.owners.setdefault(filename, 0 if filename in shared_files else index)
+    if not shared_files <= set(member_closures[0]):
+        household.reason = 'shared includes missing from the member views'
+    elif set(household.order) != {journal, *(f for f, owner in household.owners.items() if owner is not None)}:
+        household.reason = 'member views include files the household does not'
+
+    options = top[2]
+    household.plugins = snapshot.plugin_files(options)
+    # A member view's own plugins and options apply when it is loaded on its own, not in the household
+    for member in household.members:
+        member_options = parser.parse_file(member)[2]
+        if member_options['plugin']:
+            household.reason = f'plugins in {os.path.relpath(member, cwd)}'
+        elif any(member_options[name] != options[name] for name in member_options if name not in PER_FILE_OPTIONS):
+            household.reason = f'options in {os.path.relpath(member, cwd)} that the household does not set'
+    plugins = options['plugin']
+    if any(name != RENAME_PLUGIN for name, _ in plugins) or len(plugins) > 1:
+        household.reason = 'plugins other than rename_accounts'
+    elif plugins:
+        household.renames = plugins[0][1]
+    if options['documents'] or options['plugin_processing_mode'] != 'default':
+        household.reason = 'documents or raw plugin processing'
+    if any(isinstance(entry, (data.Transaction, data.Pad, data.Balance)) for entry in top[0]):
+        household.reason = 'transactions or balance checks in the household journal'
+    return household
+
+
+def conflicts(household: Household, postings: dict, checks: list, costed: set, rename) -> str | None:
+    """Why merging member views would differ from a full load, or None.
+
+    postings maps accounts to the members posting to them, checks lists
+    (member, account) for every pad and balance directive, and costed holds
+    accounts with postings at cost.
+    """
+    under = {}
+    for name, members in postings.items():
+        for parent in account.parents(name):
+            under.setdefault(parent, set()).update(members)
+    renamed = {name for name in postings if rename(name) != name}
+    renamed |= {rename(name) for name in renamed}
+    renamed_under = {parent for name in renamed for parent in account.parents(name)}
+
+    for member, name in checks:
+        if name in renamed_under:
+            return f'pad or balance on renamed account {name}'
+        if under.get(name, {member}) - {member}:
+            return f'pad or balance on {name}, which more than one member posts to'
+    for name in costed:
+        if len(postings[name]) > 1:
+            return f'positions at cost in {name}, which more than one member posts to'
+    return None
+
+
+def merge_views(household: Household, views: list[tuple]) -> tuple[tuple | None, str | None]:
+    """Merge the members' loaded views into the household view.
+
+    Returns the merged (entries, errors, options), or None and the reason a
+    full load would differ. Validation is re-run on the merged entries,
+    except for the transaction balance check: renaming accounts cannot
+    unbalance a transaction, so the members' results are kept when they used
+    the same tolerances.
+    """
+    rank = {filename: index for index, filename in enumerate(household.order)}
+    unranked = len(rank)
+
+    def sortkey(entry):
+        return (entry.date, data.SORT_ORDER.get(type(entry), 0), entry.meta['lineno'],
+                rank.get(entry.meta.get('filename'), unranked))
+
+    postings, checks, costed = {}, [], set()
+
+    def stream(member, entries):
+        for entry in entries:
+            if household.owners.get(entry.meta.get('filename'), member) != member:
+                continue
+            if isinstance(entry, data.Transaction):
+                for posting in entry.postings:
+                    postings.setdefault(posting.account, set()).add(member)
+                    if posting.cost is not None:
+                        costed.add(posting.account)
+            elif isinstance(entry, data.Balance):
+                checks.append((member, entry.account))
+            elif isinstance(entry, data.Pad):
+                checks.append((member, entry.account))
+            yield entry
+
+    rename = account_renamer(household.renames) if household.renames else lambda name: name
+    streams = [stream(member, view[0]) for member, view in enumerate(views)]
+    entries = [rename_entry(entry, rename) for entry in heapq.merge(household.top[0], *streams, key=sortkey)]
+    reason = conflicts(household, postings, checks, costed, rename)
+    if reason:
+        return None, reason
+
+    options = loader.aggregate_options_map(household.top[2], [view[2] for view in views])
+    options['include'] = sorted(household.order)
+    same_tolerances = all(view[2][name] == options[name] for view in views for name in TOLERANCE_OPTIONS)
+    validations = [check for check in validation.VALIDATIONS
+                   if not (same_tolerances and check is validation.validate_check_transaction_balances)]
+
+    errors = list(household.top[1])
+    for member, (_, member_errors, _) in enumerate(views):
+        for error in member_errors:
+            if isinstance(error, validation.ValidationError) and not (
+                    same_tolerances and error.message.startswith('Transaction does not balance')):
+                continue
+            if household.owners.get((error.source or {}).get('filename'), member) == member:
+                errors.append(error)
+    for check in validations:
+        errors.extend(check(entries, options))
+    options['input_hash'] = loader.compute_input_hash(options['include'])
+    return (entries, errors, options), None
+
+
+def load_member(journal: str, path: Path | None = None, stamps: dict | None = None) -> tuple | None:
+    """Load a member view in a worker; given a cache path, save it there instead of returning it."""
+    loader.initialize(use_cache=False)
+    result = loader.load_file(journal)
+    if path is None:
+        return result
+    write_cache(path, stamps, result)
+    return None
+
+
+def load_household(journal: str, cache_dir: Path | None = CACHE_DIR, jobs: int | None = None,
+                   stats: dict | None = None) -> tuple:
+    """Load a household journal like loader.load_file(), from its members' views.
+
+    stats, if given, receives how the result was obtained: 'status' is
+    'cached', 'merged' or 'full', 'members_loaded' how many member views had
+    to be loaded, and 'reason' why a full load was needed.
+    """
+    stats = {} if stats is None else stats
+    household = plan_household(journal)
+    stamps = file_stamps(household.order + household.members + household.plugins)
+    if cache_dir is not None:
+        result = read_cache(cache_path(cache_dir, household.journal), stamps)
+        if result is not None:
+            stats.update(status='cached', members_loaded=0)
+            return result
+
+    result = None
+    if household.reason is None:
+        # Changed members are loaded in fresh worker processes, before any
+        # cached view is read: the loader slows down as the heap grows.
+        views = [None] * len(household.members)
+        member_stamps = [file_stamps(include_order(member)) for member in household.members]
+        missing = [
+            index for index, member in enumerate(household.members)
+            if cache_dir is None or not read_cache(cache_path(cache_dir, member), member_stamps[index], True)
+        ]
+        if missing:
+            # Workers save their views to the cache themselves, in parallel,
+            # rather than pickling them back through the pool
+            paths = [cache_dir and cache_path(cache_dir, household.members[index]) for index in missing]
+            with ProcessPoolExecutor(max_workers=min(len(missing), jobs or len(missing))) as pool:
+                loaded = list(pool.map(load_member, [household.members[index] for index in missing], paths,
+                                       [member_stamps[index] for index in missing]))
+            for index, view in zip(missing, loaded):
+                views[index] = view
+        for index, member in enumerate(household.members):
+            if views[index] is None:
+                views[index] = read_cache(cache_path(cache_dir, member), member_stamps[index])
+        stats['members_loaded'] = len(missing)
+
+        with gc_paused():
+            result, household.reason = merge_views(household, views)
+
+    if result is None:
+        result = loader.load_file(household.journal)
+        stats.update(status='full', reason=household.reason)
+    else:
+        stats['status'] = 'merged'
+    if cache_dir is not None:
+        write_cache(cache_path(cache_dir, household.journal), stamps, result)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a household journal from its members' cached views")
+    parser.add_argument('journal_file', help='Path to the household journal')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Member views to load in parallel (default: one per core)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not write cached views')
+    parser.add_argument('--verify', action='store_true', help='Compare with a plain load of the journal')
+    args = parser.parse_args()
+
+    stats = {}
+    start = time.perf_counter()
+    entries, errors, options = load_household(args.journal_file, None if args.no_cache else CACHE_DIR,
+                                              args.jobs, stats)
+    elapsed = time.perf_counter() - start
+    detail = f", {stats['members_loaded']} member view(s) loaded" if 'members_loaded' in stats else ''
+    if stats.get('reason'):
+        detail += f" ({stats['reason']})"
+    print(f"Household {stats['status']}{detail}: {len(entries)} entries, {len(errors)} error(s) "
+          f"in {elapsed * 1000:.1f} ms")
+
+    if args.verify:
+        loader.initialize(use_cache=False)
+        start = time.perf_counter()
+        expected, expected_errors, _ = loader.load_file(args.journal_file)
+        elapsed = time.perf_counter() - start
+        if entries != expected:
+            different = next((i for i, (a, b) in enumerate(zip(entries, expected)) if a != b),
+                             min(len(entries), len(expected)))
+            print(f"Entries differ from a full load at #{different} "
+                  f"({len(entries)} vs {len(expected)} entries)")
+            sys.exit(1)
+        if sorted(error.message for error in errors) != sorted(error.message for error in expected_errors):
+            print(f"Errors differ from a full load ({len(errors)} vs {len(expected_errors)})")
+            sys.exit(1)
+        print(f"Matches a full load ({elapsed * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
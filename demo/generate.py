@@ -1,11 +1,35 @@
+"""Generate the demo journal, or larger synthetic ledgers for load testing.
+
+With no arguments this regenerates demo/journal.beancount (Jan 2022 - Apr
+2024, one persona). The options scale it up:
+
+    python demo/generate.py --years 10 --persons 4 --accounts 50 --rate 60 \\
+        --output /tmp/big --split
+
+Transactions are streamed to disk in chunks, so memory stays flat however
+many are generated. Output is reproducible for a given --seed.
+"""
+
+import argparse
+import bisect
 import datetime
-import random
 import os
+import pickle
+import random
+import shutil
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 # Configuration
 START_DATE = datetime.date(2022, 1, 1)
 END_DATE = datetime.date(2024, 4, 1)
-OUTPUT_DIR = "demo"
+OUTPUT_DIR = Path(__file__).parent
+PRICES_FILE = Path(__file__).parent / "prices.beancount"
+
+# Accounts are opened no later than this, or the day before generation starts
+SETUP_DATE = datetime.date(2020, 1, 1)
 
 # Financial Profile
 SALARY = 3500
@@ -16,71 +40,57 @@ GIA_INVESTMENT = 800
 # Random seed for reproducible transaction generation
 SEED = 42
 
+# Person names; any further persons are called Person3, Person4, ...
+PERSONS = ["Lalit", "Wife"]
+
+# Spending accounts used for the extra load-test transactions
+SPENDING_ACCOUNTS = ["Expenses:Food:Groceries", "Expenses:Food:Restaurant"]
+
+# Transactions buffered per file before being written out
+CHUNK_SIZE = 10_000
+
 header = """option "title" "Demo Financials"
 option "operating_currency" "GBP"
 plugin "beancount.plugins.auto_accounts"
 
 ; Fava extensions
-2020-01-01 custom "fava-extension" "fava_dashboards"
-2020-01-01 custom "fava-extension" "fava_portfolio_returns" "{
+{setup} custom "fava-extension" "fava_dashboards"
+{setup} custom "fava-extension" "fava_portfolio_returns" "{{
   'beangrow_config': 'beangrow.pbtxt',
-}"
+}}"
 
 ; Commodities
-2020-01-01 commodity GOOG
+{setup} commodity GOOG
   name: "Alphabet Inc Class C"
-2020-01-01 commodity VWRL
+{setup} commodity VWRL
   name: "Vanguard FTSE All-World UCITS ETF"
-2020-01-01 commodity USD
-2020-01-01 commodity GBP
-
-2020-01-01 open Assets:Lalit:UK:HSBC:Current:GBP          GBP
-2020-01-01 open Assets:Lalit:UK:Vanguard:ISA:VWRL         VWRL
-2020-01-01 open Assets:Lalit:UK:Vanguard:ISA:GBP          GBP
-2020-01-01 open Assets:Lalit:UK:Vanguard:GIA:VWRL         VWRL
-2020-01-01 open Assets:Lalit:UK:Vanguard:GIA:GBP          GBP
-2020-01-01 open Assets:Lalit:US:Schwab:Brokerage:GOOG     GOOG
-2020-01-01 open Assets:Lalit:US:Schwab:Brokerage:USD      USD
-2020-01-01 open Liabilities:Lalit:UK:Amex:GBP             GBP
-2020-01-01 open Income:Lalit:UK:Google:Salary             GBP
-2020-01-01 open Income:Lalit:UK:Google:Stock-Vest         USD
-2020-01-01 open Expenses:Housing:Rent                     GBP
-2020-01-01 open Expenses:Food:Groceries                   GBP
-2020-01-01 open Expenses:Food:Restaurant                  GBP
-2020-01-01 open Expenses:Transport:Tube                   GBP
-2020-01-01 open Equity:Opening-Balances                   GBP
+{setup} commodity USD
+{setup} commodity GBP
+
+{setup} open Assets:Lalit:UK:HSBC:Current:GBP          GBP
+{setup} open Assets:Lalit:UK:Vanguard:ISA:VWRL         VWRL
+{setup} open Assets:Lalit:UK:Vanguard:ISA:GBP          GBP
+{setup} open Assets:Lalit:UK:Vanguard:GIA:VWRL         VWRL
+{setup} open Assets:Lalit:UK:Vanguard:GIA:GBP          GBP
+{setup} open Assets:Lalit:US:Schwab:Brokerage:GOOG     GOOG
+{setup} open Assets:Lalit:US:Schwab:Brokerage:USD      USD
+{setup} open Liabilities:Lalit:UK:Amex:GBP             GBP
+{setup} open Income:Lalit:UK:Google:Salary             GBP
+{setup} open Income:Lalit:UK:Google:Stock-Vest         USD
+{setup} open Expenses:Housing:Rent                     GBP
+{setup} open Expenses:Food:Groceries                   GBP
+{setup} open Expenses:Food:Restaurant                  GBP
+{setup} open Expenses:Transport:Tube                   GBP
+{setup} open Equity:Opening-Balances                   GBP
 
 ; Initial Balance
-2021-12-31 * "Opening Balance"
+{opening} * "Opening Balance"
   Assets:Lalit:UK:HSBC:Current:GBP              5000.00 GBP
   Equity:Opening-Balances
 
 """
 
 
-def load_prices() -> dict[datetime.date, dict[str, float]]:
-    """Load prices from the pre-fetched prices.beancount file."""
-    prices_file = "demo/prices.beancount"
-    prices = {}
-
-    with open(prices_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith(';'):
-                continue
-            # Parse: 2022-01-03 price AAPL 182.01 USD
-            parts = line.split()
-            if len(parts) >= 5 and parts[1] == 'price':
-                date = datetime.datetime.strptime(parts[0], "%Y-%m-%d").date()
-                symbol = parts[2]
-                value = float(parts[3])
-                if date not in prices:
-                    prices[date] = {}
-                prices[date][symbol] = value
-
-    return prices
-
-
 # Initial prices (close to first real prices in the data)
 INITIAL_PRICES = {
     "GOOG": 136.0,   # ~Jan 2022
@@ -88,114 +98,423 @@ INITIAL_PRICES = {
     "USD": 0.74,     # ~Jan 2022
 }
 
+# Binary sidecar cache: magic, then the source file's mtime and size
+PRICE_CACHE_MAGIC = b"PRICES01"
+PRICE_CACHE_HEADER = struct.Struct("<8sqq")
+
+
+class PriceSeries:
+    """Per-symbol price history as sorted date ordinals and values.
+
+    Lookups forward-fill: a weekend or holiday gets the last earlier price,
+    and dates before the first price get INITIAL_PRICES. Lookups are pure
+    functions of the date, so periods can be generated independently.
+    """
+
+    def __init__(self, series: dict[str, tuple[array, array]]):
+        self._series = series
+
+    def __len__(self) -> int:
+        """Number of distinct dates with at least one price."""
+        return len({ordinal for ordinals, _ in self._series.values() for ordinal in ordinals})
+
+    def get(self, symbol: str, date: datetime.date) -> float:
+        """Get price for date, falling back to last known price for weekends/holidays."""
+        ordinals, values = self._series.get(symbol, ((), ()))
+        index = bisect.bisect_right(ordinals, date.toordinal())
+        if index == 0:
+            return INITIAL_PRICES.get(symbol, 100.0)
+        return values[index - 1]
+
+    @classmethod
+    def parse(cls, path: Path) -> "PriceSeries":
+        """Parse the price directives of a beancount file."""
+        by_symbol = {}
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(';'):
+                    continue
+                # Parse: 2022-01-03 price AAPL 182.01 USD
+                parts = line.split()
+                if len(parts) >= 5 and parts[1] == 'price':
+                    date = datetime.date.fromisoformat(parts[0])
+                    by_symbol.setdefault(parts[2], {})[date.toordinal()] = float(parts[3])
+
+        series = {}
+        for symbol, prices in by_symbol.items():
+            ordinals = sorted(prices)
+            series[symbol] = (array('l', ordinals), array('d', (prices[o] for o in ordinals)))
+        return cls(series)
+
+    @classmethod
+    def load(cls, path: Path) -> "PriceSeries":
+        """Load prices from the binary sidecar of path, re-parsing if it is stale."""
+        stat = os.stat(path)
+        cache_path = path.with_name(f".{path.name}.cache")
+        try:
+            with open(cache_path, 'rb') as f:
+                magic, mtime_ns, size = PRICE_CACHE_HEADER.unpack(f.read(PRICE_CACHE_HEADER.size))
+                if (magic, mtime_ns, size) == (PRICE_CACHE_MAGIC, stat.st_mtime_ns, stat.st_size):
+                    return cls(pickle.load(f))
+        except (OSError, struct.error, pickle.UnpicklingError, EOFError):
+            pass
+
+        prices = cls.parse(path)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(PRICE_CACHE_HEADER.pack(PRICE_CACHE_MAGIC, stat.st_mtime_ns, stat.st_size))
+                pickle.dump(prices._series, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        return prices
+
+
+def load_prices() -> PriceSeries:
+    """Load prices from the pre-fetched prices.beancount file."""
+    return PriceSeries.load(PRICES_FILE)
 
-def get_price(prices: dict, date: datetime.date, symbol: str, last_known: dict) -> float:
-    """Get price for date, falling back to last known price for weekends/holidays."""
-    if date in prices and symbol in prices[date]:
-        last_known[symbol] = prices[date][symbol]
-    return last_known.get(symbol, INITIAL_PRICES.get(symbol, 100.0))
-
-
-def generate():
-    random.seed(SEED)
-
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
 
-    # Load pre-fetched prices
-    all_prices = load_prices()
-    print(f"Loaded prices for {len(all_prices)} dates")
+def person_name(index: int) -> str:
+    return PERSONS[index] if index < len(PERSONS) else f"Person{index + 1}"
 
-    transactions = []
-    last_known = {}
 
-    current_date = START_DATE
+def opening_balance(person: str, date: datetime.date) -> str:
+    """Opening balance for every person except the first (which is in the header)."""
+    return f"""{date:%Y-%m-%d} * "Opening Balance"
+  Assets:{person}:UK:HSBC:Current:GBP              5000.00 GBP
+  Equity:Opening-Balances"""
 
-    while current_date <= END_DATE:
-        date_str = current_date.strftime("%Y-%m-%d")
 
-        # Get prices for investment transactions
-        vwrl_price = get_price(all_prices, current_date, "VWRL", last_known)
-        goog_price = get_price(all_prices, current_date, "GOOG", last_known)
+def persona_transactions(person: str, current_date: datetime.date, vwrl_price: float,
+                         goog_price: float, rng: random.Random):
+    """Yield the demo persona's transactions for one day."""
+    date_str = current_date.strftime("%Y-%m-%d")
 
-        # Monthly Salary, Rent & Stock Vest (1st of month)
-        if current_date.day == 1:
-            transactions.append(f"""{date_str} * "Google" "Salary"
-  Assets:Lalit:UK:HSBC:Current:GBP          {SALARY:.2f} GBP
-  Income:Lalit:UK:Google:Salary""")
+    # Monthly Salary, Rent & Stock Vest (1st of month)
+    if current_date.day == 1:
+        yield f"""{date_str} * "Google" "Salary"
+  Assets:{person}:UK:HSBC:Current:GBP          {SALARY:.2f} GBP
+  Income:{person}:UK:Google:Salary"""
 
-            transactions.append(f"""{date_str} * "Landlord" "Rent"
+        yield f"""{date_str} * "Landlord" "Rent"
   Expenses:Housing:Rent                      {RENT:.2f} GBP
-  Assets:Lalit:UK:HSBC:Current:GBP""")
-
-            # Monthly GOOG stock vest - cash goes to Schwab, then purchase GOOG
-            goog_price_rounded = round(goog_price, 2)
-            vest_units = 2
-            vest_value = round(vest_units * goog_price_rounded, 2)
-            transactions.append(f"""{date_str} * "Google" "RSU Vest"
-  Assets:Lalit:US:Schwab:Brokerage:USD       {vest_value:.2f} USD
-  Income:Lalit:UK:Google:Stock-Vest         -{vest_value:.2f} USD""")
-
-            transactions.append(f"""{date_str} * "Schwab" "Buy GOOG"
-  Assets:Lalit:US:Schwab:Brokerage:GOOG      {vest_units} GOOG {{{goog_price_rounded:.2f} USD}}
-  Assets:Lalit:US:Schwab:Brokerage:USD      -{vest_value:.2f} USD""")
-
-            # Monthly Investment (DCA) - Transfer to ISA and buy VWRL
-            vwrl_price_rounded = round(vwrl_price, 2)
-            isa_units = int(ISA_INVESTMENT / vwrl_price_rounded)
-            isa_cost = round(isa_units * vwrl_price_rounded, 2)
-            transactions.append(f"""{date_str} * "Vanguard" "ISA Transfer"
-  Assets:Lalit:UK:Vanguard:ISA:GBP           {isa_cost:.2f} GBP
-  Assets:Lalit:UK:HSBC:Current:GBP          -{isa_cost:.2f} GBP""")
-
-            transactions.append(f"""{date_str} * "Vanguard" "ISA Buy VWRL"
-  Assets:Lalit:UK:Vanguard:ISA:VWRL          {isa_units} VWRL {{{vwrl_price_rounded:.2f} GBP}}
-  Assets:Lalit:UK:Vanguard:ISA:GBP          -{isa_cost:.2f} GBP""")
-
-            # Monthly Investment (DCA) - Transfer to GIA and buy VWRL
-            gia_units = int(GIA_INVESTMENT / vwrl_price_rounded)
-            gia_cost = round(gia_units * vwrl_price_rounded, 2)
-            transactions.append(f"""{date_str} * "Vanguard" "GIA Transfer"
-  Assets:Lalit:UK:Vanguard:GIA:GBP           {gia_cost:.2f} GBP
-  Assets:Lalit:UK:HSBC:Current:GBP          -{gia_cost:.2f} GBP""")
-
-            transactions.append(f"""{date_str} * "Vanguard" "GIA Buy VWRL"
-  Assets:Lalit:UK:Vanguard:GIA:VWRL          {gia_units} VWRL {{{vwrl_price_rounded:.2f} GBP}}
-  Assets:Lalit:UK:Vanguard:GIA:GBP          -{gia_cost:.2f} GBP""")
-
-        # Weekly Groceries (Random days)
-        if random.random() < 0.15:
-            amount = random.uniform(30, 120)
-            transactions.append(f"""{date_str} * "Tesco" "Groceries"
+  Assets:{person}:UK:HSBC:Current:GBP"""
+
+        # Monthly GOOG stock vest - cash goes to Schwab, then purchase GOOG
+        goog_price_rounded = round(goog_price, 2)
+        vest_units = 2
+        vest_value = round(vest_units * goog_price_rounded, 2)
+        yield f"""{date_str} * "Google" "RSU Vest"
+  Assets:{person}:US:Schwab:Brokerage:USD       {vest_value:.2f} USD
+  Income:{person}:UK:Google:Stock-Vest         -{vest_value:.2f} USD"""
+
+        yield f"""{date_str} * "Schwab" "Buy GOOG"
+  Assets:{person}:US:Schwab:Brokerage:GOOG      {vest_units} GOOG {{{goog_price_rounded:.2f} USD}}
+  Assets:{person}:US:Schwab:Brokerage:USD      -{vest_value:.2f} USD"""
+
+        # Monthly Investment (DCA) - Transfer to ISA and buy VWRL
+        vwrl_price_rounded = round(vwrl_price, 2)
+        isa_units = int(ISA_INVESTMENT / vwrl_price_rounded)
+        isa_cost = round(isa_units * vwrl_price_rounded, 2)
+        yield f"""{date_str} * "Vanguard" "ISA Transfer"
+  Assets:{person}:UK:Vanguard:ISA:GBP           {isa_cost:.2f} GBP
+  Assets:{person}:UK:HSBC:Current:GBP          -{isa_cost:.2f} GBP"""
+
+        yield f"""{date_str} * "Vanguard" "ISA Buy VWRL"
+  Assets:{person}:UK:Vanguard:ISA:VWRL          {isa_units} VWRL {{{vwrl_price_rounded:.2f} GBP}}
+  Assets:{person}:UK:Vanguard:ISA:GBP          -{isa_cost:.2f} GBP"""
+
+        # Monthly Investment (DCA) - Transfer to GIA and buy VWRL
+        gia_units = int(GIA_INVESTMENT / vwrl_price_rounded)
+        gia_cost = round(gia_units * vwrl_price_rounded, 2)
+        yield f"""{date_str} * "Vanguard" "GIA Transfer"
+  Assets:{person}:UK:Vanguard:GIA:GBP           {gia_cost:.2f} GBP
+  Assets:{person}:UK:HSBC:Current:GBP          -{gia_cost:.2f} GBP"""
+
+        yield f"""{date_str} * "Vanguard" "GIA Buy VWRL"
+  Assets:{person}:UK:Vanguard:GIA:VWRL          {gia_units} VWRL {{{vwrl_price_rounded:.2f} GBP}}
+  Assets:{person}:UK:Vanguard:GIA:GBP          -{gia_cost:.2f} GBP"""
+
+    # Weekly Groceries (Random days)
+    if rng.random() < 0.15:
+        amount = rng.uniform(30, 120)
+        yield f"""{date_str} * "Tesco" "Groceries"
   Expenses:Food:Groceries                    {amount:.2f} GBP
-  Liabilities:Lalit:UK:Amex:GBP             -{amount:.2f} GBP""")
+  Liabilities:{person}:UK:Amex:GBP             -{amount:.2f} GBP"""
 
-        # Occasional Restaurant
-        if random.random() < 0.08:
-            amount = random.uniform(20, 80)
-            transactions.append(f"""{date_str} * "Nando's" "Dinner"
+    # Occasional Restaurant
+    if rng.random() < 0.08:
+        amount = rng.uniform(20, 80)
+        yield f"""{date_str} * "Nando's" "Dinner"
   Expenses:Food:Restaurant                   {amount:.2f} GBP
-  Liabilities:Lalit:UK:Amex:GBP             -{amount:.2f} GBP""")
+  Liabilities:{person}:UK:Amex:GBP             -{amount:.2f} GBP"""
+
+    # Pay off Credit Card (25th of month)
+    if current_date.day == 25:
+        payment = 500
+        yield f"""{date_str} * "Amex" "Payment"
+  Liabilities:{person}:UK:Amex:GBP              {payment:.2f} GBP
+  Assets:{person}:UK:HSBC:Current:GBP          -{payment:.2f} GBP"""
+
+
+def extra_transactions(person: str, current_date: datetime.date, accounts: list[str],
+                       rate: float, rng: random.Random):
+    """Yield random card spending averaging `rate` transactions per day."""
+    date_str = current_date.strftime("%Y-%m-%d")
+    count = int(rate) + (rng.random() < rate - int(rate))
+    for _ in range(count):
+        account = accounts[rng.randrange(len(accounts))]
+        amount = rng.uniform(1, 150)
+        yield f"""{date_str} * "Card" "Purchase"
+  {account:<42} {amount:.2f} GBP
+  Liabilities:{person}:UK:Amex:GBP             -{amount:.2f} GBP"""
+
+
+class ChunkedWriter:
+    """Streams blank-line separated transactions to files in chunks.
+
+    At most chunk_size transactions are buffered per file, so memory use does
+    not grow with the size of the ledger.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._files = {}
+        self._buffers = {}
+        self._started = set()
+
+    def open(self, path: Path, preamble: str = ""):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(path, "w")
+        f.write(preamble)
+        self._files[path] = f
+        self._buffers[path] = []
+
+    def write(self, path: Path, transaction: str):
+        if path not in self._files:
+            self.open(path)
+        buffer = self._buffers[path]
+        buffer.append(transaction)
+        if len(buffer) >= self.chunk_size:
+            self._flush(path)
+
+    def _flush(self, path: Path):
+        buffer = self._buffers[path]
+        if not buffer:
+            return
+        f = self._files[path]
+        if path in self._started:
+            f.write("\n\n")
+        f.write("\n\n".join(buffer))
+        self._started.add(path)
+        buffer.clear()
+
+    def close(self, path: Path, trailer: str = ""):
+        self._flush(path)
+        f = self._files.pop(path)
+        f.write(trailer)
+        f.close()
+        del self._buffers[path]
+        self._started.discard(path)
+
+    def close_all(self, trailer: str = ""):
+        for path in list(self._files):
+            self.close(path, trailer)
+
+
+def generate_chunk(start: datetime.date, end: datetime.date, persons: int, spending: list[str],
+                   rate: float, seeds: list, output_dir: Path, split: bool, journal: Path,
+                   chunk_size: int = CHUNK_SIZE, openings: bool = False) -> tuple[int, list[Path]]:
+    """Write the transactions from start to end inclusive.
+
+    seeds gives the (transactions, extra transactions) random seeds per person. Without split every transaction
+    goes to `journal`; with split to <person>/src/transactions-<year>. When
+    openings is set, other persons' opening balances are written first.
+    Returns the number of transactions and the files written, in order.
+    """
+    prices = load_prices()
+    names = [person_name(i) for i in range(persons)]
+    rngs = [random.Random(seed) for seed, _ in seeds]
+    extra_rngs = [random.Random(extra_seed) for _, extra_seed in seeds]
+
+    writer = ChunkedWriter(chunk_size)
+    written = []
+
+    def target(name: str, year: int) -> Path:
+        path = journal
+        if split:
+            path = output_dir / name.lower() / "src" / f"transactions-{year}.beancount"
+        if path not in written:
+            written.append(path)
+        return path
+
+    count = 0
+    if openings:
+        opening = start - datetime.timedelta(days=1)
+        for name in names[1:]:
+            writer.write(target(name, opening.year), opening_balance(name, opening))
+            count += 1
+
+    year = start.year
+    current_date = start
+    while current_date <= end:
+        if split and current_date.year != year:
+            writer.close_all("\n")
+            year = current_date.year
 
-        # Pay off Credit Card (25th of month)
-        if current_date.day == 25:
-            payment = 500
-            transactions.append(f"""{date_str} * "Amex" "Payment"
-  Liabilities:Lalit:UK:Amex:GBP              {payment:.2f} GBP
-  Assets:Lalit:UK:HSBC:Current:GBP          -{payment:.2f} GBP""")
+        # Get prices for investment transactions
+        vwrl_price = prices.get("VWRL", current_date)
+        goog_price = prices.get("GOOG", current_date)
+
+        for name, rng, extra_rng in zip(names, rngs, extra_rngs):
+            path = target(name, current_date.year)
+            for transaction in persona_transactions(name, current_date, vwrl_price, goog_price, rng):
+                writer.write(path, transaction)
+                count += 1
+            if rate:
+                for transaction in extra_transactions(name, current_date, spending, rate, extra_rng):
+                    writer.write(path, transaction)
+                    count += 1
 
         current_date += datetime.timedelta(days=1)
 
-    # Write journal file
-    with open(f"{OUTPUT_DIR}/journal.beancount", "w") as f:
-        f.write(header)
-        f.write("\n\n".join(transactions))
-        f.write("\n\n")
-        # Include the prices file
-        f.write('include "prices.beancount"\n')
-
-    print(f"Generated {len(transactions)} transactions in {OUTPUT_DIR}/journal.beancount")
+    writer.close_all("\n" if split else "")
+    return count, written
+
+
+def generate(start: datetime.date = START_DATE, end: datetime.date = END_DATE, persons: int = 1,
+             accounts: int = 0, rate: float = 0.0, seed: int = SEED, output_dir: Path = OUTPUT_DIR,
+             split: bool = False, chunk_size: int = CHUNK_SIZE, workers: int | None = None):
+    """Write a journal for `persons` people from start to end inclusive.
+
+    `accounts` extra spending accounts receive on average `rate` additional
+    card transactions per person per day. With split, each person gets a
+    <person>/src/ folder with one file per year, included from the top-level
+    journal like chapter-6.
+
+    With workers, each calendar year is generated in its own process from
+    its own seeded random streams and the results are merged in date order,
+    so the output is the same for any number of workers (but differs from
+    the single-stream output without workers).
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Load pre-fetched prices (and refresh the sidecar cache for the workers)
+    print(f"Loaded prices for {len(load_prices())} dates")
+    if PRICES_FILE.parent.resolve() != output_dir.resolve():
+        shutil.copyfile(PRICES_FILE, output_dir / "prices.beancount")
+
+    names = [person_name(i) for i in range(persons)]
+    spending = SPENDING_ACCOUNTS + [f"Expenses:Shopping:Category{j:04d}" for j in range(accounts)]
+    opening = start - datetime.timedelta(days=1)
+    preamble = header.format(setup=min(SETUP_DATE, opening), opening=opening)
+    journal = output_dir / "journal.beancount"
+
+    if workers is None:
+        # The first person keeps the original demo's random stream
+        seeds = [(seed if i == 0 else f"{seed}:{i}", f"{seed}:{i}:extra") for i in range(persons)]
+        chunks = [(start, end, seeds, journal)]
+    else:
+        chunks = []
+        for year in range(start.year, end.year + 1):
+            chunk_start = max(start, datetime.date(year, 1, 1))
+            chunk_end = min(end, datetime.date(year, 12, 31))
+            seeds = [(f"{seed}:{i}:{year}", f"{seed}:{i}:{year}:extra") for i in range(persons)]
+            chunks.append((chunk_start, chunk_end, seeds, output_dir / f".journal-{year}.part"))
+
+    jobs = [
+        (chunk_start, chunk_end, persons, spending, rate, seeds, output_dir, split, part, chunk_size, index == 0)
+        for index, (chunk_start, chunk_end, seeds, part) in enumerate(chunks)
+    ]
+    if workers is None:
+        results = [generate_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(generate_chunk, *zip(*jobs)))
+    count = sum(chunk_count for chunk_count, _ in results)
+
+    if split:
+        includes = []
+        for name in names:
+            person_dir = output_dir / name.lower() / "src"
+            paths = sorted({path for _, written in results for path in written if path.parent == person_dir})
+            with open(person_dir / "journal.beancount", "w") as f:
+                f.write(f"; {name}'s transactions, one file per year\n\n")
+                for path in paths:
+                    f.write(f'include "{path.name}"\n')
+            includes.append(f'include "{name.lower()}/src/journal.beancount"\n')
+        with open(journal, "w") as f:
+            f.write(preamble)
+            f.writelines(includes)
+            # Include the prices file
+            f.write('include "prices.beancount"\n')
+    else:
+        parts = [part for _, _, _, part in chunks]
+        if parts != [journal]:
+            merge_parts(journal, parts)
+        prepend_and_append(journal, preamble, '\n\ninclude "prices.beancount"\n')
+
+    print(f"Generated {count} transactions in {journal}")
+
+
+def merge_parts(journal: Path, parts: list[Path]):
+    """Concatenate per-year part files into journal, in order, and delete them."""
+    with open(journal, "w") as out:
+        started = False
+        for part in parts:
+            if part.exists() and part.stat().st_size:
+                if started:
+                    out.write("\n\n")
+                with open(part) as f:
+                    shutil.copyfileobj(f, out)
+                started = True
+            part.unlink(missing_ok=True)
+
+
+def prepend_and_append(journal: Path, preamble: str, trailer: str):
+    """Wrap the transactions in journal with the header and the trailing include."""
+    body = journal.with_suffix(".body")
+    os.replace(journal, body)
+    with open(journal, "w") as out, open(body) as f:
+        out.write(preamble)
+        shutil.copyfileobj(f, out)
+        out.write(trailer)
+    body.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic beancount ledger")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=START_DATE,
+                        help="First day to generate (YYYY-MM-DD)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=None,
+                        help="Last day to generate (default: the demo's end date)")
+    parser.add_argument("--years", type=int, default=None,
+                        help="Generate this many years from --start instead of --end")
+    parser.add_argument("--persons", type=int, default=1, help="Number of people")
+    parser.add_argument("--accounts", type=int, default=0,
+                        help="Extra spending accounts for load-test transactions")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Extra card transactions per person per day")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR, help="Output directory")
+    parser.add_argument("--split", action="store_true",
+                        help="Write a multi-file include tree, one folder per person")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Generate each year in parallel across this many processes")
+    args = parser.parse_args()
+
+    end = args.end or END_DATE
+    if args.years is not None:
+        end = args.start.replace(year=args.start.year + args.years) - datetime.timedelta(days=1)
+
+    generate(args.start, end, args.persons, args.accounts, args.rate, args.seed,
+             args.output, args.split, args.chunk_size, args.workers)
 
 
 if __name__ == "__main__":
-    generate()
+    main()
@@ -0,0 +1,35 @@
+"""Check whether a ledger has only grown by appending since a checkpoint.
+
+archive.py --state and RollupStore keep totals folded from a ledger and, on
+the next run, fold in only what was appended since. Both record each
+journal file's signature when they save, and reuse their totals only while
+every file still starts with the bytes they were built from. Both also hash
+the padding transactions they folded: pad directives keep their line, but
+the amount they insert follows the next balance assertion, which may be
+appended later.
+"""
+
+import hashlib
+
+from beancount.core import data
+
+
+def file_signature(path: str) -> tuple[int, int, str]:
+    """Return (size, line count, sha256) of a journal file."""
+    with open(path, 'rb') as f:
+        content = f.read()
+    return len(content), content.count(b'\n'), hashlib.sha256(content).hexdigest()
+
+
+def prefix_unchanged(path: str, size: int, digest: str) -> bool:
+    """Return True if the first size bytes of path still hash to digest."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read(size)).hexdigest() == digest
+    except OSError:
+        return False
+
+
+def padding_key(entry: data.Transaction) -> bytes:
+    """What a padding transaction contributes, for comparing it across runs."""
+    return repr((entry.date, [(posting.account, posting.units) for posting in entry.postings])).encode()
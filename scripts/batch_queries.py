@@ -0,0 +1,336 @@
+"""Evaluate many dashboard BQL queries in one pass over the postings.
+
+Most fava-dashboards panels run the same kind of query with a different
+account or tag filter:
+
+    SELECT year, month, CONVERT(SUM(position), 'GBP', LAST(date)) AS value
+    WHERE account ~ '^Expenses:Food:' AND NOT 'travel' IN tags
+    GROUP BY year, month
+
+beanquery runs each one as a separate scan over every posting, so a page's
+cost grows with its number of panels. BatchEvaluator parses each query with
+beanquery's own parser and, if it has this shape, evaluates it together with
+all the others in a single scan:
+
+  * queries are grouped by their GROUP BY keys, so each posting's key is
+    computed once per shape, not once per query;
+  * account filters are evaluated once per distinct account, and each
+    posting is routed straight to the aggregators of the queries it matches;
+  * CONVERT() rates are memoized per (currency, date), so groups closing on
+    the same day share their price lookups.
+
+Supported queries select any of year, month, day, date, account, currency
+and root(account, N), plus one SUM(position) optionally wrapped in
+CONVERT(..., '<ccy>'[, LAST(date)]), filtered by a conjunction of
+`account ~ '...'`, `NOT account ~ '...'` and `['...' NOT] IN tags` terms.
+Anything else is handed to beanquery, so execute() always returns the rows
+cursor.fetchall() would for every query.
+
+Given a rollups.RollupStore, queries that only group by year, month,
+account or currency are answered from its monthly cells instead of the
+postings.
+
+Usage:
+    evaluator = BatchEvaluator(entries, errors, options)
+    results = evaluator.execute([bql, ...])   # one list of row tuples per query
+"""
+
+import functools
+import re
+from dataclasses import dataclass, field
+
+import beanquery
+from beancount.core import account, data, inventory, prices
+from beancount.core.amount import Amount
+from beancount.core.position import Cost
+from beanquery import parser
+from beanquery.parser import ast
+
+# Group-by keys derived from the posting's entry, and from its account
+ENTRY_KEYS = {
+    'year': lambda entry: entry.date.year,
+    'month': lambda entry: entry.date.month,
+    'day': lambda entry: entry.date.day,
+    'date': lambda entry: entry.date,
+}
+ACCOUNT_KEYS = {'account', 'root'}
+
+_MISSING = object()
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledQuery:
+    """A query in the shape BatchEvaluator can run in the shared scan."""
+
+    keys: tuple                 # group-by key specs, e.g. ('year',), ('root', 3)
+    layout: list                # per target: index into the key tuple, or None for the aggregate
+    currency: str | None        # CONVERT() target currency; None for a bare SUM(position)
+    at_last_date: bool          # CONVERT(..., LAST(date)) rather than the latest price
+    account_filters: list = field(default_factory=list)    # (compiled regex, negated)
+    tag_filters: list = field(default_factory=list)        # (tag, negated)
+
+    def accepts_account(self, name: str) -> bool:
+        return all(bool(regex.search(name)) != negated for regex, negated in self.account_filters)
+
+    def accepts_tags(self, tags) -> bool:
+        return all((tag in tags) != negated for tag, negated in self.tag_filters)
+
+
+def _key_spec(expression) -> tuple | None:
+    if isinstance(expression, ast.Column) and (expression.name in ENTRY_KEYS or expression.name in
+                                               ('account', 'currency')):
+        return (expression.name,)
+    if (isinstance(expression, ast.Function) and expression.fname == 'root'
+            and len(expression.operands) == 2
+            and expression.operands[0] == ast.Column('account')
+            and isinstance(expression.operands[1], ast.Constant)
+            and isinstance(expression.operands[1].value, int)):
+        return ('root', expression.operands[1].value)
+    return None
+
+
+def _aggregate_spec(expression) -> tuple | None:
+    """Return (currency, at_last_date) for [CONVERT(]SUM(position)[, ...)]."""
+    sum_position = ast.Function('sum', [ast.Column('position')])
+    if expression == sum_position:
+        return None, False
+    if not (isinstance(expression, ast.Function) and expression.fname == 'convert'
+            and len(expression.operands) in (2, 3) and expression.operands[0] == sum_position
+            and isinstance(expression.operands[1], ast.Constant)
+            and isinstance(expression.operands[1].value, str)):
+        return None
+    if len(expression.operands) == 3:
+        if expression.operands[2] != ast.Function('last', [ast.Column('date')]):
+            return None
+        return expression.operands[1].value, True
+    return expression.operands[1].value, False
+
+
+def _filter_spec(term) -> tuple | None:
+    """Return ('account', regex, negated) or ('tag', tag, negated) for a WHERE term."""
+    negated = False
+    if isinstance(term, ast.Not):
+        term, negated = term.operand, True
+    if isinstance(term, (ast.Match, ast.NotMatch)):
+        if term.left == ast.Column('account') and isinstance(term.right, ast.Constant) \
+                and isinstance(term.right.value, str):
+            return 'account', re.compile(term.right.value, re.IGNORECASE), negated != isinstance(term, ast.NotMatch)
+    if isinstance(term, (ast.In, ast.NotIn)):
+        if term.right == ast.Column('tags') and isinstance(term.left, ast.Constant) \
+                and isinstance(term.left.value, str):
+            return 'tag', term.left.value, negated != isinstance(term, ast.NotIn)
+    return None
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_query(sql: str) -> CompiledQuery | None:
+    """Compile sql for the shared scan, or return None if it has another shape.
+
+    Parsing BQL is slow next to scanning a small ledger, and dashboards run
+    the same queries on every page load, so compiled queries are cached.
+    """
+    try:
+        query = parser.parse(sql)
+    except parser.ParseError:
+        return None
+    if not isinstance(query, ast.Select) or query.from_clause or query.order_by or query.pivot_by \
+            or query.limit is not None or query.distinct:
+        return None
+    if not isinstance(query.targets, list) or (query.group_by and query.group_by.having):
+        return None
+
+    keys, layout, aggregate = [], [], None
+    names = {}
+    for index, target in enumerate(query.targets):
+        spec = _key_spec(target.expression)
+        if spec is not None:
+            layout.append(len(keys))
+            keys.append(spec)
+        else:
+            aggregate_spec = _aggregate_spec(target.expression)
+            if aggregate_spec is None or aggregate is not None:
+                return None
+            aggregate = aggregate_spec
+            layout.append(None)
+        name = target.name or (target.expression.name if isinstance(target.expression, ast.Column) else None)
+        if name:
+            names.setdefault(name, index)
+    if aggregate is None:
+        return None
+
+    # Every non-aggregate target must be grouped on, and nothing else
+    grouped = set()
+    for column in (query.group_by.columns if query.group_by else []):
+        if isinstance(column, int):
+            index = column - 1
+        elif isinstance(column, ast.Column) and column.name in names:
+            index = names[column.name]
+        else:
+            index = next((i for i, target in enumerate(query.targets) if target.expression == column), None)
+        if index is None or not 0 <= index < len(layout) or layout[index] is None:
+            return None
+        grouped.add(index)
+    if grouped != {i for i, slot in enumerate(layout) if slot is not None}:
+        return None
+
+    compiled = CompiledQuery(tuple(keys), layout, *aggregate)
+    where = query.where_clause
+    terms = [] if where is None else where.args if isinstance(where, ast.And) else [where]
+    for term in terms:
+        spec = _filter_spec(term)
+        if spec is None:
+            return None
+        kind, value, negated = spec
+        (compiled.account_filters if kind == 'account' else compiled.tag_filters).append((value, negated))
+    return compiled
+
+
+class BatchEvaluator:
+    """Runs a set of BQL queries over loaded entries with one shared scan."""
+
+    def __init__(self, entries: data.Entries, errors: list, options: dict, rollups=None):
+        self.entries = entries
+        self.errors = errors
+        self.options = options
+        self.rollups = rollups
+        self.price_map = prices.build_price_map(entries)
+        self.batched = 0
+        self.rolled_up = 0
+        self.fallback = 0
+        self._connection = None
+        self._rates = {}
+
+    @property
+    def connection(self) -> beanquery.Connection:
+        if self._connection is None:
+            self._connection = beanquery.connect(
+                'beancount:', entries=self.entries, errors=self.errors, options=self.options)
+        return self._connection
+
+    def execute(self, queries: list[str]) -> list[list[tuple]]:
+        """Return the result rows of every query, in order."""
+        compiled = {sql: compile_query(sql) for sql in queries}
+        rolled_up = {
+            query: self.rollups.aggregate(query) for query in compiled.values()
+            if query is not None and self.rollups is not None and self.rollups.answerable(query)
+        }
+        groups = self._scan([query for query in compiled.values() if query is not None and query not in rolled_up])
+        groups.update(rolled_up)
+
+        results = {}
+        for sql, query in compiled.items():
+            if query is None:
+                results[sql] = self.connection.execute(sql).fetchall()
+                self.fallback += 1
+            else:
+                results[sql] = self._rows(query, groups[query])
+                if query in rolled_up:
+                    self.rolled_up += 1
+                else:
+                    self.batched += 1
+        return [results[sql] for sql in queries]
+
+    def _scan(self, queries: list[CompiledQuery]) -> dict:
+        """Aggregate every posting into each query it matches, in one pass.
+
+        Returns, per query, a dict of group key -> [Inventory, last date].
+        """
+        groups = {query: {} for query in queries}
+        if not queries:
+            return groups
+        shapes = {}
+        for query in queries:
+            shapes.setdefault(query.keys, []).append((query, groups[query]))
+
+        key_funcs = {keys: self._key_func(keys) for keys in shapes}
+        routes = {}
+        for entry in self.entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            tags = entry.tags or ()
+            for posting in entry.postings:
+                route = routes.get(posting.account)
+                if route is None:
+                    route = routes[posting.account] = [
+                        (key_funcs[keys], matching) for keys, members in shapes.items()
+                        if (matching := [(q, g) for q, g in members if q.accepts_account(posting.account)])
+                    ]
+                for key_func, matching in route:
+                    key = None
+                    for query, query_groups in matching:
+                        if query.tag_filters and not query.accepts_tags(tags):
+                            continue
+                        if key is None:
+                            key = key_func(entry, posting)
+                        group = query_groups.get(key)
+                        if group is None:
+                            group = query_groups[key] = [inventory.Inventory(), None]
+                        group[0].add_amount(posting.units, posting.cost)
+                        group[1] = entry.date
+        return groups
+
+    @staticmethod
+    def _key_func(keys: tuple):
+        """Build a function computing a posting's group key for a shape."""
+        has_account = any(spec[0] in ACCOUNT_KEYS for spec in keys)
+        account_parts = {}
+
+        def key_func(entry, posting):
+            parts = None
+            if has_account:
+                parts = account_parts.get(posting.account)
+                if parts is None:
+                    parts = account_parts[posting.account] = tuple(
+                        posting.account if spec[0] == 'account'
+                        else account.root(spec[1], posting.account) if spec[0] == 'root'
+                        else None
+                        for spec in keys
+                    )
+            return tuple(
+                ENTRY_KEYS[spec[0]](entry) if spec[0] in ENTRY_KEYS
+                else posting.units.currency if spec[0] == 'currency'
+                else parts[i]
+                for i, spec in enumerate(keys)
+            )
+
+        return key_func
+
+    def _rows(self, query: CompiledQuery, groups: dict) -> list[tuple]:
+        rows = []
+        for key, (balance, last_date) in groups.items():
+            if query.currency is not None:
+                balance = self._convert(balance, query.currency, last_date if query.at_last_date else None)
+            rows.append(tuple(balance if slot is None else key[slot] for slot in query.layout))
+        return rows
+
+    def _convert(self, balance: inventory.Inventory, currency: str, date) -> inventory.Inventory:
+        """Inventory.reduce(convert.convert_position, ...) with memoized rates."""
+        converted = inventory.Inventory()
+        for pos in balance:
+            units = pos.units
+            via = pos.cost.currency if isinstance(pos.cost, Cost) and pos.cost.currency else None
+            key = (units.currency, via, currency, date)
+            rates = self._rates.get(key, _MISSING)
+            if rates is _MISSING:
+                rates = self._rates[key] = self._lookup_rates(units.currency, via, currency, date)
+            if rates is None:
+                converted.add_amount(units)
+                continue
+            number = units.number
+            for rate in rates:
+                number = number * rate
+            converted.add_amount(Amount(number, currency))
+        return converted
+
+    def _lookup_rates(self, base: str, via: str | None, quote: str, date) -> tuple | None:
+        """The rates convert.convert_amount would multiply by, or None if it cannot convert."""
+        _, rate = prices.get_price(self.price_map, (base, quote), date)
+        if rate is not None:
+            return (rate,)
+        if via is not None and via != quote:
+            _, rate1 = prices.get_price(self.price_map, (base, via), date)
+            if rate1 is not None:
+                _, rate2 = prices.get_price(self.price_map, (via, quote), date)
+                if rate2 is not None:
+                    return rate1, rate2
+        return None
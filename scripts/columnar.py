@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Columnar store of a ledger's postings for in-memory analytics.
+
+Usage (from repo root):
+    python scripts/columnar.py <journal> [--by account,year,month] [--under ACCOUNT]
+        [--convert CCY] [--verify]
+
+Every posting of a loaded ledger is a Posting namedtuple holding an Amount
+and a Decimal, a few hundred bytes each once its metadata is counted.
+PostingColumns keeps only what sums need, one posting per index across
+contiguous arrays: the date's ordinal, its year * 12 + month - 1, interned
+account and currency ids, the units as a 64-bit fixed-point integer at the
+currency's finest scale, and the Decimal's own exponent. That is 21 bytes a
+posting, so millions of postings fit in memory on a laptop.
+
+sums() groups the units by any of account, year and month (and always by
+currency) with integer adds, and turns each group back into one Decimal.
+convert() values those sums in another currency with one price lookup per
+currency, and converted_sums() values each posting at its own date with one
+lookup per currency and day. number() returns a posting's units exactly as
+the ledger wrote them, exponent included.
+
+Only units are kept: postings held at cost are summed by their units, and
+tags, payees and metadata are dropped. Amounts that do not fit in 64 bits at
+their currency's scale raise ValueError when the columns are built.
+
+With --verify, checks every posting's round trip and the grouped sums
+against Decimal arithmetic over the entries.
+"""
+
+import argparse
+import datetime
+import itertools
+import sys
+import time
+from array import array
+from decimal import Decimal
+
+from beancount.core import data, prices
+from beancount.core.number import ZERO
+
+KEYS = ('account', 'year', 'month')
+
+
+class PostingColumns:
+    """The units of every posting of a ledger, as parallel arrays."""
+
+    def __init__(self):
+        self.accounts = []  # id -> account name
+        self.currencies = []  # id -> currency
+        self.scales = array('b')  # currency id -> decimal places of its fixed-point units
+        self.dates = array('i')  # date ordinals
+        self.periods = array('i')  # year * 12 + month - 1
+        self.account = array('i')
+        self.currency = array('i')
+        self.units = array('q')  # number * 10 ** scale of the posting's currency
+        self.exponents = array('b')  # the number's own exponent, for the round trip
+        self._columns = {}
+
+    @classmethod
+    def from_entries(cls, entries: data.Entries) -> 'PostingColumns':
+        """Build the columns from the postings of every transaction, in ledger order."""
+        columns = cls()
+        account_ids = {}
+        currency_ids = {}
+        days = {}
+        numbers = []
+        for entry in entries:
+            if not isinstance(entry, data.Transaction):
+                continue
+            day = days.get(entry.date)
+            if day is None:
+                date = entry.date
+                day = days[date] = (date.toordinal(), date.year * 12 + date.month - 1)
+            for posting in entry.postings:
+                units = posting.units
+                number = units.number
+                if not number.is_finite():
+                    raise ValueError(f"Cannot store {number} {units.currency} of {posting.account}")
+                account_id = account_ids.get(posting.account)
+                if account_id is None:
+                    account_id = account_ids[posting.account] = len(columns.accounts)
+                    columns.accounts.append(posting.account)
+                currency_id = currency_ids.get(units.currency)
+                if currency_id is None:
+                    currency_id = currency_ids[units.currency] = len(columns.currencies)
+                    columns.currencies.append(units.currency)
+                    columns.scales.append(0)
+                exponent = number.as_tuple().exponent
+                if -exponent > columns.scales[currency_id]:
+                    columns.scales[currency_id] = -exponent
+                columns.dates.append(day[0])
+                columns.periods.append(day[1])
+                columns.account.append(account_id)
+                columns.currency.append(currency_id)
+                columns.exponents.append(exponent)
+                numbers.append(number)
+
+        # Scales are only known once every posting has been seen
+        scales = columns.scales
+        try:
+            columns.units = array('q', [
+                int(number.scaleb(scales[currency_id])) for number, currency_id in zip(numbers, columns.currency)
+            ])
+        except OverflowError:
+            raise ValueError(f"Amounts do not fit in 64-bit fixed point at scales "
+                             f"{dict(zip(columns.currencies, scales))}") from None
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def nbytes(self) -> int:
+        """Bytes held by the per-posting arrays."""
+        return sum(column.itemsize * len(column) for column in (
+            self.dates, self.periods, self.account, self.currency, self.units, self.exponents))
+
+    def number(self, i: int) -> Decimal:
+        """The units of posting i, equal to the ledger's Decimal and with its exponent."""
+        exponent = self.exponents[i]
+        # The scale is at least as fine as every exponent of the currency, so this divides exactly
+        return Decimal(self.units[i] // 10 ** (self.scales[self.currency[i]] + exponent)).scaleb(exponent)
+
+    def numbers(self) -> list[Decimal]:
+        return [self.number(i) for i in range(len(self))]
+
+    def _column(self, key: str) -> array:
+        if key == 'account':
+            return self.account
+        column = self._columns.get(key)
+        if column is None:
+            if key == 'year':
+                column = array('h', [period // 12 for period in self.periods])
+            elif key == 'month':
+                column = array('b', [period % 12 + 1 for period in self.periods])
+            else:
+                raise ValueError(f"Unknown key {key!r}; expected one of {', '.join(KEYS)}")
+            self._columns[key] = column
+        return column
+
+    def _selected(self, under: str | None):
+        """Per-posting flags for postings on under or an account below it; None for all."""
+        if under is None:
+            return None
+        prefix = under + ':'
+        accepted = bytes(name == under or name.startswith(prefix) for name in self.accounts)
+        return map(accepted.__getitem__, self.account)
+
+    def _decimal(self, total: int, currency_id: int) -> Decimal:
+        return Decimal(total).scaleb(-self.scales[currency_id])
+
+    def _group(self, columns: list, under: str | None) -> dict:
+        """Fixed-point totals by the values of columns, the currency id last."""
+        totals = {}
+        get = totals.get
+        rows = zip(zip(*columns, self.currency), self.units)
+        selected = self._selected(under)
+        if selected is not None:
+            rows = itertools.compress(rows, selected)
+        for key, units in rows:
+            totals[key] = get(key, 0) + units
+        return totals
+
+    def sums(self, by: tuple[str, ...] = ('account',), under: str | None = None) -> dict[tuple, Decimal]:
+        """Units summed by the keys in by, as key values + (currency,) -> Decimal.
+
+        Keys are 'account', 'year' and 'month' (1-12, as BQL's month()).
+        With under, only postings on that account or below it are summed.
+        """
+        accounts, currencies = self.accounts, self.currencies
+        positions = [i for i, key in enumerate(by) if key == 'account']
+        sums = {}
+        for key, total in self._group([self._column(key) for key in by], under).items():
+            if total:
+                *values, currency_id = key
+                for i in positions:
+                    values[i] = accounts[values[i]]
+                sums[(*values, currencies[currency_id])] = self._decimal(total, currency_id)
+        return sums
+
+    @staticmethod
+    def convert(sums: dict[tuple, Decimal], currency: str, price_map: prices.PriceMap,
+                date: datetime.date | None = None) -> dict[tuple, Decimal]:
+        """Value sums from sums() in currency at date (default: the latest price).
+
+        Like beancount's convert_amount(), sums without a price to currency
+        are kept in their own currency.
+        """
+        rates = {}
+        converted = {}
+        for key, number in sums.items():
+            *values, source = key
+            if source != currency:
+                rate = rates.get(source)
+                if rate is None:
+                    rate = rates[source] = prices.get_price(price_map, (source, currency), date)[1] or ZERO
+                if rate:
+                    number *= rate
+                    source = currency
+            key = (*values, source)
+            converted[key] = converted.get(key, ZERO) + number
+        return converted
+
+    def converted_sums(self, currency: str, price_map: prices.PriceMap, by: tuple[str, ...] = ('account',),
+                       under: str | None = None) -> dict[tuple, Decimal]:
+        """Units valued in currency at each posting's date, then summed by the keys in by.
+
+        Postings are first summed exactly per currency and day, so each
+        currency needs one price lookup per day rather than per posting.
+        """
+        accounts, currencies = self.accounts, self.currencies
+        positions = [i for i, key in enumerate(by) if key == 'account']
+        rates = {}
+        converted = {}
+        for key, total in self._group([self._column(key) for key in by] + [self.dates], under).items():
+            if not total:
+                continue
+            *values, ordinal, currency_id = key
+            number = self._decimal(total, currency_id)
+            source = currencies[currency_id]
+            if source != currency:
+                rate = rates.get((currency_id, ordinal))
+                if rate is None:
+                    date = datetime.date.fromordinal(ordinal)
+                    rate = rates[currency_id, ordinal] = prices.get_price(price_map, (source, currency), date)[1] or ZERO
+                if rate:
+                    number *= rate
+                    source = currency
+            for i in positions:
+                values[i] = accounts[values[i]]
+            key = (*values, source)
+            converted[key] = converted.get(key, ZERO) + number
+        return converted
+
+
+def decimal_sums(entries: data.Entries, by: tuple[str, ...], under: str | None = None) -> dict[tuple, Decimal]:
+    """sums() computed with Decimal arithmetic over the postings, for --verify."""
+    sums = {}
+    for entry in entries:
+        if not isinstance(entry, data.Transaction):
+            continue
+        for posting in entry.postings:
+            if under is not None and posting.account != under and not posting.account.startswith(under + ':'):
+                continue
+            values = {'account': posting.account, 'year': entry.date.year, 'month': entry.date.month}
+            key = (*(values[name] for name in by), posting.units.currency)
+            sums[key] = sums.get(key, ZERO) + posting.units.number
+    return {key: number for key, number in sums.items() if number}
+
+
+def verify(columns: PostingColumns, entries: data.Entries, by: tuple[str, ...], under: str | None) -> list[str]:
+    """Differences between the columns and the entries they were built from."""
+    problems = []
+    originals = [posting.units.number for entry in entries if isinstance(entry, data.Transaction)
+                 for posting in entry.postings]
+    for i, (number, original) in enumerate(zip(columns.numbers(), originals)):
+        if number != original or number.as_tuple().exponent != original.as_tuple().exponent:
+            problems.append(f"posting {i}: {number} != {original}")
+    if len(originals) != len(columns):
+        problems.append(f"{len(columns)} postings stored, {len(originals)} in the ledger")
+    expected = decimal_sums(entries, by, under)
+    if columns.sums(by, under) != expected:
+        problems.append(f"sums by {', '.join(by)} differ from Decimal sums")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sum a journal's postings from a columnar store")
+    parser.add_argument('journal_file', help='Path to the beancount journal')
+    parser.add_argument('--by', default='account', help='Comma-separated keys among account, year, month')
+    parser.add_argument('--under', help='Only sum postings on this account or below it')
+    parser.add_argument('--convert', metavar='CCY', help='Value postings in CCY at their dates')
+    parser.add_argument('--verify', action='store_true', help='Check the columns against Decimal arithmetic')
+    args = parser.parse_args()
+    by = tuple(key for key in args.by.split(',') if key)
+    if any(key not in KEYS for key in by):
+        parser.error(f"--by keys must be among {', '.join(KEYS)}")
+
+    import snapshot
+
+    entries, errors, options = snapshot.load_file(args.journal_file)
+    if errors:
+        print(f"{len(errors)} error(s) loading {args.journal_file}", file=sys.stderr)
+    start = time.perf_counter()
+    columns = PostingColumns.from_entries(entries)
+    print(f"{len(columns)} postings in {columns.nbytes() / 2**20:.1f} MB of columns, "
+          f"built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    if args.convert:
+        sums = columns.converted_sums(args.convert, prices.build_price_map(entries), by, args.under)
+    else:
+        sums = columns.sums(by, args.under)
+    elapsed = time.perf_counter() - start
+    for key, number in sorted(sums.items()):
+        print(f"  {' '.join(map(str, key[:-1])):<60} {number:>16} {key[-1]}")
+    print(f"{len(sums)} groups in {elapsed * 1000:.1f} ms")
+
+    if args.verify:
+        problems = verify(columns, entries, by, args.under)
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        if problems:
+            sys.exit(1)
+        print("Verified: every posting round-trips and the sums match Decimal arithmetic")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Keep journals loaded in a background process and run reports against them.
+
+Usage (from repo root):
+    python scripts/ledgerd.py serve [--preload JOURNAL ...] [--interval SECONDS]
+    python scripts/ledgerd.py status
+    python scripts/ledgerd.py stop
+
+Every run of archive.py or validate_all.py imports beancount and beanquery
+and loads its journal before doing any real work. The daemon pays for both
+once: it listens on .cache/ledgerd.sock, loads a journal the first time a
+request names it and keeps the result in memory. A watcher thread polls the
+files of every loaded journal's include closure and plugin modules and
+reloads the journal when one of them changes, importing a changed plugin
+afresh. Only the changed files are parsed again - the others come from an
+in-memory parse cache - while booking, plugins and validation rerun over the
+whole ledger as they must. Parsed BQL queries are cached too, since on a
+small ledger parsing a report's queries costs more than running them.
+
+chapter-5/scripts/archive.py and scripts/validate_all.py hand their work to
+the daemon whenever it is running, before importing beancount, and load
+directly otherwise (or with --no-daemon). A repeated run then costs a socket
+round trip plus the reports themselves. A journal whose load has a LoadError
+(a plugin that failed to import or to run, an include glob matching nothing)
+may only fail in the daemon, so the daemon declines requests for it and the
+script runs them itself.
+
+Requests and responses are one JSON object per line:
+    {"command": "validate", "journal": PATH}      -> {"errors": [...], "include": [...], "plugins": [...]}
+    {"command": "archive", "argv": [...], "cwd": DIR} -> {"stdout": ..., "stderr": ..., "exit": N}
+    {"command": "status"} / {"command": "stop"}
+Either of the first two may instead answer {"declined": REASON}.
+"""
+
+import argparse
+import contextlib
+import copy
+import functools
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SOCKET_PATH = REPO_ROOT / '.cache' / 'ledgerd.sock'
+
+
+def request(message: dict, socket_path: Path = SOCKET_PATH) -> dict | None:
+    """Send one request to the daemon; return its response, or None if it is not running."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+            client.sendall(json.dumps(message).encode() + b'\n')
+            with client.makefile('rb') as f:
+                line = f.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return json.loads(line) if line else None
+
+
+def forward(command: str, argv: list[str], socket_path: Path = SOCKET_PATH) -> int | None:
+    """Run a script's command line in the daemon and print its output.
+
+    Returns the exit status, or None if no daemon is running or it declined the run.
+    """
+    response = request({'command': command, 'argv': argv, 'cwd': os.getcwd()}, socket_path)
+    if response is None or 'declined' in response:
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit']
+
+
+class ParseCache:
+    """parser.parse_file() results of unchanged files, kept in memory."""
+
+    def __init__(self):
+        self.results = {}
+        self.parsed = 0
+
+    def install(self, parser):
+        original = parser.parse_file
+
+        def parse_file(file, *args, **kwargs):
+            if not isinstance(file, str) or args or set(kwargs) - {'encoding'}:
+                return original(file, *args, **kwargs)
+            stat = os.stat(file)
+            stamp = (stat.st_mtime_ns, stat.st_size, kwargs.get('encoding'))
+            cached = self.results.get(file)
+            if cached is None or cached[0] != stamp:
+                cached = self.results[file] = (stamp, original(file, *args, **kwargs))
+                self.parsed += 1
+            entries, errors, options = cached[1]
+            # The loader updates the top file's options, display context included, in place
+            return entries, errors, dict(options, dcontext=copy.deepcopy(options['dcontext']))
+
+        parser.parse_file = parse_file
+
+
+class Ledger:
+    """One journal's loaded (entries, errors, options), reloaded when its files change."""
+
+    def __init__(self, journal: str):
+        self.journal = journal
+        self.result = None
+        self.stamps = {}
+        self.plugins = {}
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    @staticmethod
+    def _stamp(path: str) -> tuple | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load_error(self) -> str | None:
+        """The first LoadError of the current load, if it had any."""
+        from beancount import loader
+
+        for error in self.result[1]:
+            if isinstance(error, loader.LoadError):
+                return error.message
+        return None
+
+    def stale(self) -> bool:
+        # A load with a LoadError is retried, as what failed may since have been fixed
+        if self.result is None or self.load_error() is not None:
+            return True
+        return any(self._stamp(path) != stamp for path, stamp in self.stamps.items())
+
+    def load(self) -> tuple:
+        from beancount import loader
+
+        import snapshot
+
+        if self.stale():
+            # The loader imports plugins through sys.modules, which would keep the old code
+            for name, path in self.plugins.items():
+                if self._stamp(path) != self.stamps.get(path):
+                    sys.modules.pop(name, None)
+            start = time.perf_counter()
+            self.result = loader.load_file(self.journal)
+            self.load_seconds = time.perf_counter() - start
+            self.loads += 1
+            options = self.result[2]
+            self.plugins = {name: sys.modules[name].__file__ for name, _ in options['plugin']
+                            if getattr(sys.modules.get(name), '__file__', None)}
+            files = options['include'] + snapshot.plugin_files(options)
+            self.stamps = {path: self._stamp(path) for path in files}
+            # Requests capture sys.stdout; log to the daemon's own output
+            print(f"Loaded {self.journal} in {self.load_seconds * 1000:.1f} ms", file=sys.__stdout__, flush=True)
+        return self.result
+
+
+class Daemon:
+    """The ledgers held in memory and the commands run against them."""
+
+    def __init__(self, interval: float):
+        import beanquery.parser
+        from beancount import loader
+        from beancount.parser import parser
+
+        loader.initialize(use_cache=False)
+        self.parse_cache = ParseCache()
+        self.parse_cache.install(parser)
+        # Reports send the same BQL on every run, and parsing it costs far
+        # more than running it; beanquery's compiler does not modify the AST
+        beanquery.parser.parse = functools.lru_cache(maxsize=1024)(beanquery.parser.parse)
+        # Stays on the path for the daemon's lifetime: archive.py's worker
+        # processes unpickle its functions by module name, and under the
+        # spawn and forkserver start methods they import it from this path
+        sys.path.insert(0, str(REPO_ROOT / 'chapter-5' / 'scripts'))
+        self.ledgers = {}
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.started = time.time()
+
+    def ledger(self, journal: str) -> Ledger:
+        path = os.path.abspath(journal)
+        if path not in self.ledgers:
+            self.ledgers[path] = Ledger(path)
+        self.ledgers[path].load()
+        return self.ledgers[path]
+
+    def watch(self):
+        """Reload changed journals in the background, so requests find them ready."""
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                for ledger in self.ledgers.values():
+                    # Declined journals are retried when next requested, not every interval
+                    if ledger.result is not None and ledger.load_error() is not None:
+                        continue
+                    try:
+                        ledger.load()
+                    except Exception:
+                        traceback.print_exc()
+
+    def handle(self, message: dict) -> dict:
+        with self.lock:
+            command = message.get('command')
+            if command == 'status':
+                return self.status()
+            if command == 'validate':
+                ledger = self.ledger(message['journal'])
+                if ledger.load_error() is not None:
+                    return {'declined': ledger.load_error()}
+                entries, errors, options = ledger.result
+                return {'errors': [error.message for error in errors], 'include': list(options['include']),
+                        'plugins': sorted(ledger.plugins.values())}
+            if command == 'archive':
+                return self.archive(message['argv'], message['cwd'])
+            return {'error': f'unknown command {command!r}'}
+
+    def status(self) -> dict:
+        return {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'files_parsed': self.parse_cache.parsed,
+            'ledgers': {
+                path: {'entries': len(ledger.result[0]), 'errors': len(ledger.result[1]),
+                       'loads': ledger.loads, 'load_ms': ledger.load_seconds * 1000}
+                for path, ledger in self.ledgers.items() if ledger.result is not None
+            },
+        }
+
+    def run_script(self, function, argv: list[str], cwd: str) -> dict:
+        """Run function(argv) in cwd, capturing its output and exit status."""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = 0
+        saved_cwd = os.getcwd()
+        try:
+            os.chdir(cwd)
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    function(argv)
+                except SystemExit as exc:
+                    if isinstance(exc.code, str):
+                        print(exc.code, file=sys.stderr)
+                    status = exc.code if isinstance(exc.code, int) else 0 if exc.code is None else 1
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+        finally:
+            os.chdir(saved_cwd)
+        return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'exit': status}
+
+    def archive(self, argv: list[str], cwd: str) -> dict:
+        import archive
+
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                args = archive.parse_args(argv)
+        except SystemExit:
+            # Usage errors are reported by the script itself
+            return {'declined': 'invalid arguments'}
+        ledger = self.ledger(os.path.join(cwd, args.journal_file))
+        if ledger.load_error() is not None:
+            return {'declined': ledger.load_error()}
+        return self.run_script(lambda argv: archive.run(args, *ledger.result), argv, cwd)
+
+
+def serve(socket_path: Path, preload: list[str], interval: float):
+    if request({'command': 'status'}, socket_path) is not None:
+        print(f"A ledger daemon is already listening on {socket_path}")
+        sys.exit(1)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        socket_path.unlink()
+
+    daemon = Daemon(interval)
+    for journal in preload:
+        daemon.ledger(journal)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            message = json.loads(self.rfile.readline())
+            if message.get('command') == 'stop':
+                self.wfile.write(b'{"stopped": true}\n')
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            self.wfile.write(json.dumps(daemon.handle(message)).encode() + b'\n')
+
+    threading.Thread(target=daemon.watch, daemon=True).start()
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as server:
+        print(f"Listening on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                socket_path.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve reports from journals kept loaded in memory")
+    parser.add_argument('command', choices=['serve', 'status', 'stop'])
+    parser.add_argument('--socket', type=Path, default=SOCKET_PATH, help='Unix socket to listen on')
+    parser.add_argument('--preload', nargs='*', default=[], help='Journals to load before listening')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Seconds between checks of the loaded journals for changes')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.preload, args.interval)
+        return
+
+    response = request({'command': args.command}, args.socket)
+    if response is None:
+        print("No ledger daemon is running")
+        sys.exit(1)
+    if args.command == 'stop':
+        print("Stopped")
+        return
+    print(f"pid {response['pid']}, up {response['uptime']:.0f} s, {response['files_parsed']} file parses")
+    for path, ledger in response['ledgers'].items():
+        print(f"  {os.path.relpath(path)}: {ledger['entries']} entries, {ledger['errors']} error(s), "
+              f"loaded {ledger['loads']}x, last load {ledger['load_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Profile the BQL queries behind fava-dashboards panels.
+
+Usage (from repo root):
+    python scripts/profile_dashboards.py <dashboards.yaml> <journal>
+        [--dashboard NAME] [--repeat N] [--budget MS] [--total-budget MS] [--batch [--rollups]]
+
+Example:
+    python scripts/profile_dashboards.py chapter-5/dashboards.yaml chapter-5/journal-net.beancount --budget 200
+
+Every query's {{ledger.ccy}}-style templating is rendered the way
+fava-dashboards does, then each panel's queries are run against the loaded
+journal. For each panel the tool reports the best wall time over --repeat
+runs, the rows scanned (postings of every transaction visited, plus one per
+other entry) and the peak memory allocated while its queries ran. Rows and
+memory are measured in a separate traced run so they do not skew the
+timings.
+
+Panels are printed slowest first. With --budget, any panel slower than MS
+milliseconds fails the run; --total-budget does the same for the sum of all
+panels, i.e. roughly the cost of opening every dashboard page.
+
+With --batch, all queries are also run through batch_queries.BatchEvaluator
+(one shared scan for the common CONVERT(SUM(position)) shape) and its total
+is printed next to the one-by-one total. Adding --rollups answers the
+queries it can from the journal's monthly rollup store (see rollups.py).
+"""
+
+import argparse
+import re
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+import beanquery
+import yaml
+from beancount.core import data
+
+from batch_queries import BatchEvaluator, compile_query
+from rollups import RollupStore
+import snapshot
+
+TEMPLATE_VAR = re.compile(r'\{\{\s*ledger\.(\w+)\s*\}\}')
+
+
+@dataclass
+class Panel:
+    dashboard: str
+    title: str
+    queries: list[tuple[str, str]]
+    seconds: float = 0.0
+    rows: int = 0
+    peak_bytes: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return f'{self.dashboard} / {self.title}'
+
+
+class ScanCounter(list):
+    """Entry list that counts the rows queries iterate over."""
+
+    rows = 0
+
+    def __iter__(self):
+        for entry in list.__iter__(self):
+            self.rows += len(entry.postings) if isinstance(entry, data.Transaction) else 1
+            yield entry
+
+
+def ledger_context(entries: data.Entries, options: dict) -> dict:
+    """The subset of fava-dashboards' `ledger` template object BQL can use."""
+    dates = [entry.date for entry in entries if isinstance(entry, data.Transaction)]
+    return {
+        'ccy': options['operating_currency'][0],
+        'dateFirst': min(dates).isoformat() if dates else '',
+        'dateLast': max(dates).isoformat() if dates else '',
+    }
+
+
+def render(template: str, ledger: dict) -> str:
+    """Substitute {{ledger.<name>}} placeholders in a query."""
+    def substitute(match):
+        try:
+            return ledger[match.group(1)]
+        except KeyError:
+            raise ValueError(f'unsupported template variable ledger.{match.group(1)}') from None
+    return TEMPLATE_VAR.sub(substitute, template)
+
+
+def load_panels(path: str, ledger: dict, dashboard: str | None = None) -> list[Panel]:
+    """Read every panel with BQL queries from a dashboards.yaml, templating rendered."""
+    with open(path) as f:
+        config = yaml.safe_load(f)
+    panels = []
+    for board in config['dashboards']:
+        if dashboard and board['name'] != dashboard:
+            continue
+        for panel in board.get('panels', []):
+            queries = [
+                (query.get('name', str(i)), render(query['bql'], ledger))
+                for i, query in enumerate(panel.get('queries', [])) if 'bql' in query
+            ]
+            if queries:
+                panels.append(Panel(board['name'], panel.get('title', ''), queries))
+    return panels
+
+
+def run_queries(context: beanquery.Connection, panel: Panel):
+    for _, bql in panel.queries:
+        context.execute(bql).fetchall()
+
+
+def profile(panels: list[Panel], entries: data.Entries, errors: list, options: dict, repeat: int):
+    """Fill in each panel's time, rows scanned and peak memory."""
+    context = beanquery.connect('beancount:', entries=entries, errors=errors, options=options)
+    counted = ScanCounter(entries)
+    traced = beanquery.connect('beancount:', entries=counted, errors=errors, options=options)
+
+    for panel in panels:
+        try:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run_queries(context, panel)
+                timings.append(time.perf_counter() - start)
+            panel.seconds = min(timings)
+
+            counted.rows = 0
+            tracemalloc.start()
+            try:
+                run_queries(traced, panel)
+                panel.peak_bytes = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            panel.rows = counted.rows
+        except Exception as exc:
+            panel.errors.append(str(exc))
+
+
+def print_table(panels: list[Panel], budget: float | None):
+    print(f"{'#':>3}  {'time ms':>9} {'rows':>11} {'peak MB':>8}  panel")
+    for rank, panel in enumerate(sorted(panels, key=lambda p: p.seconds, reverse=True), 1):
+        if panel.errors:
+            print(f"{rank:>3}  {'ERROR':>9} {'':>11} {'':>8}  {panel.name}: {panel.errors[0]}")
+            continue
+        over = budget is not None and panel.seconds * 1000 > budget
+        print(f"{rank:>3}  {panel.seconds * 1000:>9.1f} {panel.rows:>11,} "
+              f"{panel.peak_bytes / 2**20:>8.1f}  {panel.name}{'  OVER BUDGET' if over else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile fava-dashboards BQL queries per panel")
+    parser.add_argument('dashboards', help='Path to dashboards.yaml')
+    parser.add_argument('journal_file', help='Path to the beancount journal')
+    parser.add_argument('--dashboard', help='Only profile the dashboard with this name')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per panel; the best is kept')
+    parser.add_argument('--budget', type=float, help='Fail if any panel takes longer than MS milliseconds')
+    parser.add_argument('--total-budget', type=float, help='Fail if all panels together take longer than MS')
+    parser.add_argument('--batch', action='store_true', help='Also time all queries in one shared scan')
+    parser.add_argument('--rollups', action='store_true', help='With --batch, use the monthly rollup store')
+    args = parser.parse_args()
+
+    entries, errors, options = snapshot.load_file(args.journal_file)
+    panels = load_panels(args.dashboards, ledger_context(entries, options), args.dashboard)
+    if not panels:
+        print("No panels with BQL queries found!")
+        sys.exit(1)
+
+    profile(panels, entries, errors, options, args.repeat)
+    print_table(panels, args.budget)
+
+    total = sum(panel.seconds for panel in panels)
+    print(f"\n{len(panels)} panels, {sum(len(p.queries) for p in panels)} queries, {total * 1000:.1f} ms total")
+    if args.batch:
+        queries = [bql for panel in panels for _, bql in panel.queries]
+        batched = sum(1 for bql in queries if compile_query(bql) is not None)
+        rollups = RollupStore.for_ledger(entries, options) if args.rollups else None
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            BatchEvaluator(entries, errors, options, rollups).execute(queries)
+            timings.append(time.perf_counter() - start)
+        print(f"Shared scan{' with rollups' if rollups else ''}: {min(timings) * 1000:.1f} ms total, "
+              f"{batched} of {len(queries)} queries batched")
+
+    failures = []
+    broken = [panel for panel in panels if panel.errors]
+    if broken:
+        failures.append(f"{len(broken)} panel(s) with query errors")
+    if args.budget is not None:
+        over = [panel for panel in panels if panel.seconds * 1000 > args.budget]
+        if over:
+            failures.append(f"{len(over)} panel(s) over the {args.budget:g} ms budget")
+    if args.total_budget is not None and total * 1000 > args.total_budget:
+        failures.append(f"total {total * 1000:.1f} ms over the {args.total_budget:g} ms budget")
+    if failures:
+        print('; '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
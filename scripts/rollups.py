@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Materialized per-month rollups of a ledger's postings.
+
+Usage (from repo root):
+    python scripts/rollups.py <journal> [--store DIR]
+
+Most dashboard panels and reports only need postings summed per account and
+month. RollupStore keeps those sums in a local SQLite file, one cell per
+(year, month, account, currency, cost, tags), with exact Decimal numbers,
+the cell's last posting date and the position of its first posting in the
+ledger. Queries grouped by year, month, account or currency can then be
+answered from a few thousand cells instead of every posting, with groups and
+LAST(date) coming out exactly as a scan would produce them.
+
+Stores live in .cache/rollups/, one per hash of the journal's include
+closure and plugin configuration. refresh() compares the files with the
+signatures recorded last time: unchanged files cost nothing, and when the
+files were only appended to with transactions dated after the last folded
+date, only those transactions are folded in. Anything else - including a
+balance assertion that changes what an earlier pad inserts - rebuilds the
+store from scratch.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+from beancount.core import account, data, flags, inventory
+from beancount.core.amount import Amount
+from beancount.core.number import ZERO
+from beancount.core.position import Cost
+
+from append_only import file_signature, padding_key, prefix_unchanged
+
+STORE_VERSION = 2
+STORE_DIR = Path(__file__).parent.parent / '.cache' / 'rollups'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rollup (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    cost TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    number TEXT NOT NULL,
+    first_seq INTEGER NOT NULL,
+    last_date TEXT NOT NULL,
+    PRIMARY KEY (year, month, account, currency, cost, tags)
+);
+"""
+
+
+def closure_key(options: dict) -> str:
+    """Hash of the include closure and plugin configuration of a loaded ledger."""
+    closure = json.dumps([sorted(options['include']), repr(options['plugin'])])
+    return hashlib.sha256(closure.encode()).hexdigest()
+
+
+def encode_cost(cost: Cost | None) -> str:
+    if cost is None:
+        return ''
+    return json.dumps([str(cost.number), cost.currency, cost.date and cost.date.isoformat(), cost.label])
+
+
+def decode_cost(text: str) -> Cost | None:
+    if not text:
+        return None
+    number, currency, date, label = json.loads(text)
+    return Cost(Decimal(number), currency, date and datetime.date.fromisoformat(date), label)
+
+
+class RollupStore:
+    """Per-month posting sums of one ledger, persisted in SQLite."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(SCHEMA)
+        self._cells = None
+
+    @classmethod
+    def for_ledger(cls, entries: data.Entries, options: dict, directory: Path = STORE_DIR) -> 'RollupStore':
+        """Open the store for a loaded ledger's include closure and bring it up to date."""
+        store = cls(Path(directory) / f'{closure_key(options)[:16]}.sqlite')
+        store.refresh(entries, options)
+        return store
+
+    def close(self):
+        self.db.close()
+
+    def _meta(self) -> dict:
+        return {key: json.loads(value) for key, value in self.db.execute('SELECT key, value FROM meta')}
+
+    def refresh(self, entries: data.Entries, options: dict) -> str:
+        """Fold new transactions in; return 'unchanged', 'incremental' or 'rebuilt'."""
+        meta = self._meta()
+        # As stored in the meta table's JSON
+        files = {filename: list(file_signature(filename)) for filename in options['include']}
+        reusable = (
+            meta.get('version') == STORE_VERSION
+            and meta.get('closure') == closure_key(options)
+            and all(prefix_unchanged(filename, size, digest)
+                    for filename, (size, _, digest) in meta['files'].items())
+        )
+        if reusable and meta['files'] == files:
+            return 'unchanged'
+
+        if reusable:
+            last_date = datetime.date.fromisoformat(meta['last_date'])
+            if self._fold(self._load_cells(), entries, options, files, last_date, meta['next_seq'],
+                          meta['files'], meta['padding']):
+                return 'incremental'
+
+        self._fold({}, entries, options, files, datetime.date.min, 0, {}, hashlib.sha256().hexdigest())
+        return 'rebuilt'
+
+    def _load_cells(self) -> dict:
+        cells = {}
+        for year, month, name, currency, cost, tags, number, first_seq, last_date in self.db.execute(
+                'SELECT * FROM rollup'):
+            cells[(year, month, name, currency, cost, tags)] = [Decimal(number), first_seq, last_date]
+        return cells
+
+    def _fold(self, cells: dict, entries: data.Entries, options: dict, files: dict,
+              last_date: datetime.date, seq: int, known_files: dict, known_padding: str) -> bool:
+        """Add transactions dated after last_date to cells and save them with files.
+
+        Returns False, saving nothing, if a directive dated on or before
+        last_date is not in the part of its file that was already folded, or
+        if the padding transactions dated by then no longer hash to
+        known_padding.
+        """
+        known_lines = {filename: lines for filename, (_, lines, _) in known_files.items()}
+        folded_padding = hashlib.sha256()
+        padding = hashlib.sha256()
+        transactions = []
+        for entry in entries:
+            is_transaction = isinstance(entry, data.Transaction)
+            if is_transaction and entry.flag == flags.FLAG_PADDING:
+                padding.update(padding_key(entry))
+                if entry.date <= last_date:
+                    folded_padding.update(padding_key(entry))
+            if entry.date <= last_date:
+                filename = entry.meta.get('filename')
+                # Other directives generated by plugins follow from the checked ones
+                if not is_transaction and (filename is None or filename.startswith('<')):
+                    continue
+                if entry.meta.get('lineno', 0) > known_lines.get(filename, -1):
+                    return False
+            elif is_transaction:
+                transactions.append(entry)
+        if folded_padding.hexdigest() != known_padding:
+            return False
+
+        changed = set()
+        cost_keys = {}
+        newest = last_date
+        for entry in transactions:
+            newest = entry.date
+            tags = ' '.join(sorted(entry.tags)) if entry.tags else ''
+            date = entry.date.isoformat()
+            for posting in entry.postings:
+                cost = cost_keys.get(posting.cost)
+                if cost is None:
+                    cost = cost_keys[posting.cost] = encode_cost(posting.cost)
+                key = (entry.date.year, entry.date.month, posting.account, posting.units.currency, cost, tags)
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = [posting.units.number, seq, date]
+                else:
+                    cell[0] += posting.units.number
+                    cell[2] = date
+                changed.add(key)
+                seq += 1
+
+        with self.db:
+            if not known_files:
+                self.db.execute('DELETE FROM rollup')
+            self.db.executemany(
+                'INSERT OR REPLACE INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(*key, str(cells[key][0]), cells[key][1], cells[key][2]) for key in changed],
+            )
+            meta = {
+                'version': STORE_VERSION,
+                'closure': closure_key(options),
+                'files': files,
+                'last_date': newest.isoformat(),
+                'next_seq': seq,
+                'padding': padding.hexdigest(),
+            }
+            self.db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                [(key, json.dumps(value)) for key, value in meta.items()])
+        self._cells = None
+        return True
+
+    def cells(self) -> list[tuple]:
+        """All cells as (year, month, account, currency, cost, tags, number, last_date), in ledger order."""
+        if self._cells is None:
+            self._cells = [
+                (year, month, name, currency, decode_cost(cost), frozenset(tags.split()),
+                 Decimal(number), datetime.date.fromisoformat(last_date))
+                for year, month, name, currency, cost, tags, number, _, last_date in self.db.execute(
+                    'SELECT * FROM rollup ORDER BY first_seq')
+            ]
+        return self._cells
+
+    def aggregate(self, query) -> dict:
+        """Evaluate a batch_queries.CompiledQuery; return key -> [Inventory, last date].
+
+        The query's keys must all be among year, month, account, root(account, N)
+        and currency (see answerable()).
+        """
+        groups = {}
+        accepted = {}
+        for year, month, name, currency, cost, tags, number, last_date in self.cells():
+            ok = accepted.get(name)
+            if ok is None:
+                ok = accepted[name] = query.accepts_account(name)
+            if not ok or (query.tag_filters and not query.accepts_tags(tags)):
+                continue
+            key = tuple(
+                year if spec[0] == 'year' else month if spec[0] == 'month'
+                else name if spec[0] == 'account' else currency if spec[0] == 'currency'
+                else account.root(spec[1], name)
+                for spec in query.keys
+            )
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [inventory.Inventory(), last_date]
+            if number != ZERO:
+                group[0].add_amount(Amount(number, currency), cost)
+            group[1] = max(group[1], last_date)
+        return groups
+
+    @staticmethod
+    def answerable(query) -> bool:
+        """Whether a CompiledQuery only groups by columns the rollups keep."""
+        return all(spec[0] in ('year', 'month', 'account', 'root', 'currency') for spec in query.keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the monthly rollups of a journal")
+    parser.add_argument('journal_file', help='Path to the beancount journal')
+    parser.add_argument('--store', type=Path, default=STORE_DIR, help='Directory holding rollup stores')
+    args = parser.parse_args()
+
+    import snapshot
+
+    entries, errors, options = snapshot.load_file(args.journal_file)
+    if errors:
+        print(f"{len(errors)} error(s) loading {args.journal_file}", file=sys.stderr)
+    store = RollupStore(args.store / f'{closure_key(options)[:16]}.sqlite')
+    status = store.refresh(entries, options)
+    count = store.db.execute('SELECT COUNT(*) FROM rollup').fetchone()[0]
+    print(f"Rollups {status}: {count} cells in {os.path.relpath(store.path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Snapshots of loaded journals, so scripts start without parsing them.
+
+Usage (from repo root):
+    python scripts/snapshot.py JOURNAL [JOURNAL ...] [--check]
+
+load_file() returns what beancount's loader.load_file() returns - the
+(entries, errors, options) of a journal after booking, plugins and
+validation - from a snapshot in .cache/snapshots/ when one is current, and
+loads the journal and writes its snapshot otherwise. archive.py,
+validate_all.py, rollups.py and profile_dashboards.py load through it.
+
+A snapshot is current when its key still matches: a hash of the content of
+every file in the journal's include closure and of every plugin module the
+journal ran, the plugin names, and the beancount and Python versions. Unlike beancount's own
+pickle cache, editing an in-repo plugin invalidates it, and the key is
+checked from a small header before any of the ledger is decoded. Loads
+with a LoadError (a plugin that failed to import or to run, an include glob
+matching nothing) depend on more than that closure and are never written.
+
+The ledger itself is a pickle written for fast decoding. Before writing,
+every account, currency, date, number and tag is interned to one object, as
+are identical amounts and tolerance maps, so pickle stores each once and
+refers back to it; the loaded ledger shares those objects too and takes
+less memory than a parsed one. Named tuples are rebuilt with tuple.__new__
+in C rather than their Python constructors, and the file is decoded
+straight from an mmap with the garbage collector paused, which is most of
+the difference: unpickling hundreds of thousands of containers otherwise
+triggers a collection every few hundred allocations.
+
+The mmap saves a copy of the file, and its pages are shared in the page
+cache by every process reading the same snapshot; the decoded entries are
+still built in each process's own memory.
+
+With --check, reports whether each journal's snapshot is current without
+writing one.
+"""
+
+import argparse
+import contextlib
+import datetime
+import gc
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SNAPSHOT_DIR = REPO_ROOT / '.cache' / 'snapshots'
+
+# Bump whenever the snapshot layout changes
+FORMAT = b'beancount-snapshot 2\n'
+_HEADER_LENGTH = struct.Struct('<Q')
+
+
+def snapshot_path(journal: str, snapshot_dir: Path = SNAPSHOT_DIR) -> Path:
+    """Where the snapshot of journal is kept."""
+    journal = os.path.abspath(journal)
+    digest = hashlib.sha256(journal.encode()).hexdigest()[:16]
+    return snapshot_dir / f'{Path(journal).stem}-{digest}.snapshot'
+
+
+def plugin_files(options: dict) -> list[str]:
+    """Source files of the plugin modules a loaded journal ran.
+
+    Modules this process has not imported, as when the journal came from a
+    snapshot, are looked up where the loader would import them from.
+    """
+    import importlib.util
+
+    search_path = list(sys.path)
+    if options.get('insert_pythonpath') and options.get('filename'):
+        search_path.insert(0, os.path.dirname(options['filename']))
+    files = []
+    for name, _ in options['plugin']:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path is None:
+            saved_path, sys.path[:] = list(sys.path), search_path
+            try:
+                path = importlib.util.find_spec(name).origin
+            except (AttributeError, ImportError, ValueError):
+                pass
+            finally:
+                sys.path[:] = saved_path
+        if path:
+            files.append(path)
+    return sorted(set(files))
+
+
+def closure_key(include: list[str], plugin_names: list[str], plugins: list[str]) -> str:
+    """Hash of the content of a journal's include closure and plugin modules."""
+    from beancount import __version__ as beancount_version
+
+    digest = hashlib.sha256(FORMAT)
+    digest.update(f'{beancount_version} {sys.version_info[:2]}'.encode())
+    digest.update(json.dumps(plugin_names).encode())
+    for path in sorted(include) + [''] + plugins:
+        digest.update(path.encode() + b'\0')
+        try:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+
+def intern_values(entries: list, errors: list) -> tuple[list, list]:
+    """Copy entries and errors with every equal immutable value shared.
+
+    Values that compare equal but print differently (1.0 and 1.00) are kept
+    apart, and objects that were shared before, like an error's entry, stay
+    shared.
+    """
+    from beancount.utils.defdict import ImmutableDictWithDefault
+
+    values = {}
+    copies = {}
+
+    def intern(obj):
+        copy = copies.get(id(obj))
+        if copy is not None:
+            return copy
+        cls = type(obj)
+        if cls is str or cls is int or cls is bool or cls is datetime.date or obj is None:
+            copy = values.setdefault((cls, obj), obj)
+        elif cls is Decimal:
+            copy = values.setdefault((cls, obj.as_tuple()), obj)
+        elif cls is frozenset:
+            items = [intern(item) for item in obj]
+            copy = values.setdefault((cls, frozenset(map(id, items))), frozenset(items))
+        elif cls is list:
+            copy = [intern(item) for item in obj]
+        elif cls is dict:
+            copy = {intern(key): intern(value) for key, value in obj.items()}
+        elif cls is ImmutableDictWithDefault:
+            items = [(intern(key), intern(value)) for key, value in obj.items()]
+            key = (cls, id(intern(obj.default)), tuple((id(key), id(value)) for key, value in items))
+            copy = values.setdefault(key, obj)
+        elif cls is tuple or (isinstance(obj, tuple) and hasattr(cls, '_fields')):
+            fields = [intern(field) for field in obj]
+            copy = values.setdefault((cls, tuple(map(id, fields))), tuple.__new__(cls, fields))
+        else:
+            copy = obj
+        copies[id(obj)] = copy
+        return copy
+
+    return intern(entries), intern(errors)
+
+
+class _Pickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # Named tuples otherwise unpickle through their Python __new__
+        cls = type(obj)
+        if isinstance(obj, tuple) and cls is not tuple and hasattr(cls, '_fields'):
+            return tuple.__new__, (cls, tuple(obj))
+        return NotImplemented
+
+
+def write(journal: str, result: tuple, snapshot_dir: Path = SNAPSHOT_DIR) -> Path:
+    """Write the snapshot of a journal's loaded (entries, errors, options)."""
+    entries, errors, options = result
+    plugin_names = [name for name, _ in options['plugin']]
+    plugins = plugin_files(options)
+    header = json.dumps({
+        'journal': os.path.abspath(journal),
+        'include': list(options['include']),
+        'plugin_names': plugin_names,
+        'plugins': plugins,
+        'key': closure_key(options['include'], plugin_names, plugins),
+    }).encode()
+
+    path = snapshot_path(journal, snapshot_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Readers only ever see a complete snapshot: it is renamed into place once written
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(FORMAT + _HEADER_LENGTH.pack(len(header)) + header)
+            _Pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump((*intern_values(entries, errors), options))
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
+        raise
+    return path
+
+
+def _decode(view) -> tuple | None:
+    """The ledger in a mapped snapshot, or None if its key is stale; raises if it is corrupt."""
+    start = len(FORMAT) + _HEADER_LENGTH.size
+    if view[:len(FORMAT)] != FORMAT:
+        return None
+    (length,) = _HEADER_LENGTH.unpack(view[len(FORMAT):start])
+    header = json.loads(view[start:start + length])
+    if header['key'] != closure_key(header['include'], header['plugin_names'], header['plugins']):
+        return None
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with memoryview(view)[start + length:] as body:
+            return pickle.loads(body)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read(journal: str, snapshot_dir: Path = SNAPSHOT_DIR) -> tuple | None:
+    """A journal's (entries, errors, options) from its snapshot, or None if it is not current.
+
+    A truncated or corrupt snapshot counts as missing and is removed.
+    """
+    path = snapshot_path(journal, snapshot_dir)
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return _decode(view)
+    except Exception:
+        # Empty files fail to map, and a cut-off header or pickle, or one from
+        # an incompatible version, decodes to a variety of errors
+        with contextlib.suppress(OSError):
+            path.unlink()
+        return None
+
+
+def cacheable(result: tuple) -> bool:
+    """Whether a load depends only on what closure_key() hashes."""
+    from beancount import loader
+
+    return not any(isinstance(error, loader.LoadError) for error in result[1])
+
+
+def load_file(journal: str, snapshot_dir: Path = SNAPSHOT_DIR) -> tuple:
+    """Like beancount's loader.load_file(), from a current snapshot when there is one."""
+    result = read(journal, snapshot_dir)
+    if result is None:
+        from beancount import loader
+
+        result = loader.load_file(journal)
+        if not cacheable(result):
+            return result
+        try:
+            write(journal, result, snapshot_dir)
+        except OSError as exc:
+            print(f"Could not write snapshot of {journal}: {exc}", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write or check snapshots of loaded journals")
+    parser.add_argument('journals', nargs='+', help='Journal files')
+    parser.add_argument('--check', action='store_true', help='Only report whether each snapshot is current')
+    args = parser.parse_args()
+
+    stale = False
+    for journal in args.journals:
+        start = time.perf_counter()
+        result = read(journal)
+        read_ms = (time.perf_counter() - start) * 1000
+        if result is not None:
+            print(f"{journal}: current, {len(result[0])} entries loaded in {read_ms:.1f} ms")
+            continue
+        stale = True
+        if args.check:
+            print(f"{journal}: no current snapshot")
+            continue
+
+        from beancount import loader
+
+        start = time.perf_counter()
+        result = loader.load_file(journal)
+        load_ms = (time.perf_counter() - start) * 1000
+        if not cacheable(result):
+            print(f"{journal}: loaded in {load_ms:.1f} ms with load errors, no snapshot written")
+            continue
+        path = write(journal, result)
+        print(f"{journal}: loaded in {load_ms:.1f} ms, snapshot written to {os.path.relpath(path)}")
+    if args.check and stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,39 @@
 """Validate all beancount example folders parse correctly.
 
 Usage (from repo root):
-    python scripts/validate_all.py
+    python scripts/validate_all.py [--jobs N] [--force] [--no-daemon]
+
+Journals are validated in parallel, one process per core by default. Source
+files shared between journals (src/*.beancount, common/src) are parsed once
+and cached in .cache/parse. Journals whose include closure and plugin modules
+are unchanged since the last clean run, under the same beancount version, are
+skipped; pass --force to check everything. A journal
+whose files and plugins are unchanged since it was last loaded is read from
+its snapshot (see snapshot.py) rather than parsed.
+
+If the ledger daemon (scripts/ledgerd.py) is running, journals are validated
+by it instead, from the ledgers it keeps loaded, without importing beancount
+here; pass --no-daemon to validate locally regardless.
 """
 
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import ledgerd
+import snapshot
+
+CACHE_DIR = Path(__file__).parent.parent / '.cache'
+PARSE_CACHE_DIR = CACHE_DIR / 'parse'
+MANIFEST_PATH = CACHE_DIR / 'validate-manifest.json'
+
+
 def find_journal_files(examples_dir: Path) -> list[Path]:
     """Find all journal entry points (not includes in src/)."""
     journals = []
@@ -27,18 +54,133 @@ def find_journal_files(examples_dir: Path) -> list[Path]:
     return journals
 
 
-def main():
-    examples_dir = Path(__file__).parent.parent
+def beancount_version() -> str | None:
+    """The installed beancount's version, read without importing it."""
+    try:
+        spec = importlib.util.find_spec('beancount')
+        with open(Path(spec.origin).parent / 'VERSION') as f:
+            return f.read().strip()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def file_signature(path: str) -> dict:
+    """Return the mtime, size and content hash recorded for a source file."""
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_digest(path)}
+
+
+def closure_unchanged(recorded_closure: dict | None) -> bool:
+    """Return True if every file of a recorded closure is unchanged, and beancount too.
 
-    # Try to import beancount
+    Files are compared by mtime and size first and only hashed when those
+    differ, so touching a file does not force a re-check.
+    """
+    if not recorded_closure or recorded_closure.get('beancount') != beancount_version():
+        return False
+    for path, recorded in recorded_closure['files'].items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_mtime_ns == recorded['mtime_ns'] and stat.st_size == recorded['size']:
+            continue
+        if stat.st_size != recorded['size'] or file_digest(path) != recorded['sha256']:
+            return False
+    return True
+
+
+def load_manifest() -> dict:
     try:
-        from beancount import loader
-    except ImportError:
-        print("beancount not installed. Run manually with bean-check:\n")
-        for journal in find_journal_files(examples_dir):
-            rel_path = journal.relative_to(examples_dir)
-            print(f"  bean-check {rel_path}")
-        sys.exit(0)
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def install_parse_cache(parser, cache_dir: Path):
+    """Cache beancount's per-file parse results on disk.
+
+    The loader parses every included file through parser.parse_file, so a
+    source shared by several journals is only parsed once; later loads
+    unpickle a fresh copy of the result as long as the file is unchanged.
+    """
+    original = parser.parse_file
+    if getattr(original, 'cached', False):
+        return
+    # Parse results depend on the parser, not on plugins, which run after it
+    version = beancount_version()
+
+    def parse_file(file, *args, **kwargs):
+        if not isinstance(file, str) or args or set(kwargs) - {'encoding'}:
+            return original(file, *args, **kwargs)
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size, kwargs.get('encoding'), version)
+        cache_path = cache_dir / (hashlib.sha256(path.encode()).hexdigest() + '.pickle')
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_stamp, result = pickle.load(f)
+            if cached_stamp == stamp:
+                return result
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+        result = original(file, *args, **kwargs)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((stamp, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        return result
+
+    parse_file.cached = True
+    parser.parse_file = parse_file
+
+
+def validate_journal(journal: str) -> tuple[list[str], list[str]]:
+    """Load one journal; return its error messages and its include closure and plugin files."""
+    from beancount.parser import parser
+
+    install_parse_cache(parser, PARSE_CACHE_DIR)
+    entries, load_errors, options = snapshot.load_file(journal)
+    return [err.message for err in load_errors], list(options['include']) + snapshot.plugin_files(options)
+
+
+def validate_with_daemon(journals: list[Path]) -> dict | None:
+    """Validate journals in the running ledger daemon; None if it is not running or declines one."""
+    results = {}
+    for journal in journals:
+        response = ledgerd.request({'command': 'validate', 'journal': str(journal.resolve())})
+        if response is None or 'declined' in response:
+            return None
+        results[journal] = response['errors'], response['include'] + response['plugins']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate all example journals")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Journals to validate in parallel (default: one per core)')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-check journals even if unchanged since the last clean run')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Validate here even if the ledger daemon is running')
+    args = parser.parse_args()
+
+    examples_dir = Path(__file__).parent.parent
 
     # Find all journal files
     journals = find_journal_files(examples_dir)
@@ -47,21 +189,53 @@ def main():
         print("No journal files found!")
         sys.exit(1)
 
+    manifest = {} if args.force else load_manifest()
+    pending = [
+        journal for journal in journals
+        if not closure_unchanged(manifest.get(str(journal.relative_to(examples_dir))))
+    ]
+    results = None if args.no_daemon or not pending else validate_with_daemon(pending)
+
+    if results is None:
+        # Try to import beancount
+        try:
+            from beancount import loader  # noqa: F401
+        except ImportError:
+            print("beancount not installed. Run manually with bean-check:\n")
+            for journal in journals:
+                rel_path = journal.relative_to(examples_dir)
+                print(f"  bean-check {rel_path}")
+            sys.exit(0)
+
     print(f"Validating {len(journals)} journal files...\n")
 
+    if results is None:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = dict(zip(pending, pool.map(validate_journal, [str(journal) for journal in pending])))
+
     errors = []
     for journal in journals:
         rel_path = journal.relative_to(examples_dir)
-        entries, load_errors, options = loader.load_file(str(journal))
+        if journal not in results:
+            print(f"✓ {rel_path} (unchanged)")
+            continue
 
+        load_errors, files = results[journal]
         if load_errors:
             errors.append((rel_path, load_errors))
+            manifest.pop(str(rel_path), None)
             print(f"✗ {rel_path}")
-            for err in load_errors:
-                print(f"    {err.message}")
+            for message in load_errors:
+                print(f"    {message}")
         else:
+            manifest[str(rel_path)] = {
+                'beancount': beancount_version(),
+                'files': {path: file_signature(path) for path in files},
+            }
             print(f"✓ {rel_path}")
 
+    save_manifest(manifest)
+
     print()
     if errors:
         print(f"{len(errors)} file(s) with errors")